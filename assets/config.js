@@ -5,15 +5,15 @@
 const API_CONFIG = {
   // News API URL
   NEWS_API_URL: window.location.hostname === 'localhost' || window.location.hostname === '127.0.0.1'
-    ? 'http://localhost:5001/api/news'
+    ? 'http://localhost:5000/api/news'
     : 'assets/data/news.json', // Static JSON file in production
   
   // Admin API URL (only works on localhost)
-  ADMIN_API_URL: 'http://localhost:5001/api/news',
+  ADMIN_API_URL: 'http://localhost:5000/api/news',
   
   // Image base URL
   IMAGE_BASE_URL: window.location.hostname === 'localhost' || window.location.hostname === '127.0.0.1'
-    ? 'http://localhost:5001'
+    ? 'http://localhost:5000'
     : '' // Use relative paths in production (images in assets/uploads/news/)
 };
 
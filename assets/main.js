@@ -132,8 +132,8 @@ langButtons.forEach(button => {
   });
 });
 
-// Load saved language preference or default to English
-const savedLanguage = localStorage.getItem('preferredLanguage') || 'en';
+// Pre-rendered pages (pages/<lang>/...) open in their own language; otherwise the saved preference or English
+const savedLanguage = document.documentElement.getAttribute('data-prerendered') || localStorage.getItem('preferredLanguage') || 'en';
 switchLanguage(savedLanguage);
 
 // Ensure elements exist before adding event listeners
@@ -903,7 +903,8 @@ Please reply directly to: ${email}`;
 // Projects renderer: load from API (dev) or fallback to static JSON (prod) and inject into .projects-grid
 document.addEventListener('DOMContentLoaded', function() {
   const API_BASE = (location.hostname === 'localhost' || location.hostname === '127.0.0.1') ? 'http://127.0.0.1:5000' : '';
-  const projectsGrid = document.querySelector('.projects-grid');
+  // projects.html fills its own related grid (present early when the project is inlined)
+  const projectsGrid = document.querySelector('.projects-grid:not(#related-grid)');
   if (!projectsGrid) return;
   const isAllProjectsPage = (document.body && document.body.getAttribute('data-page') === 'projects-list');
 
@@ -946,6 +947,10 @@ document.addEventListener('DOMContentLoaded', function() {
   }
 
   function loadProjects() {
+    // Pre-rendered pages carry the list inline; no request needed
+    if (window.__SCCF_DATA__ && Array.isArray(window.__SCCF_DATA__.projects)) {
+      return Promise.resolve(window.__SCCF_DATA__.projects);
+    }
     if (API_BASE) {
       return fetchWithTimeout(`${API_BASE}/api/projects`).then(r => r.json()).catch(() => null);
     }
@@ -953,7 +958,11 @@ document.addEventListener('DOMContentLoaded', function() {
   }
 
   function loadProjectsFallback() {
-    return fetch('assets/projects.json').then(r => r.json()).catch(() => []);
+    // The list index has everything the cards need; projects.json is the full (larger) fallback
+    return fetch('assets/projects/index.json')
+      .then(r => r.ok ? r.json() : Promise.reject())
+      .catch(() => fetch('assets/projects.json').then(r => r.json()))
+      .catch(() => []);
   }
 
   loadProjects()
@@ -1018,7 +1027,10 @@ document.addEventListener('DOMContentLoaded', function() {
 
       const sorted = withIndex.map(x => x.p);
       const list = isAllProjectsPage ? sorted : sorted.slice(0, homepageLimit);
+      // Replace the server-rendered cards with the configured order
+      if (projectsGrid.hasAttribute('data-prerendered')) projectsGrid.innerHTML = '';
       list.forEach(proj => {
+        const href = proj.page || `projects.html?id=${encodeURIComponent(proj.id)}`;
         const rawMain = (proj.main_image || proj.image || '') || '';
         const rawGallery0 = (Array.isArray(proj.gallery_images) && proj.gallery_images.length) ? (proj.gallery_images[0] || '') : '';
   // Choose primary/alternate sources
@@ -1051,7 +1063,7 @@ document.addEventListener('DOMContentLoaded', function() {
             <div class="project-overlay">
               <div class="project-overlay-content">
                 <h3 data-en="${escapeHtml(proj.title?.en || proj.title)}" data-si="${escapeHtml(proj.title?.si || '')}" data-ta="${escapeHtml(proj.title?.ta || '')}">${escapeHtml(proj.title?.en || proj.title)}</h3>
-                <a href="projects.html?id=${encodeURIComponent(proj.id)}" class="btn-overlay" data-en="Learn More" data-si="තව දැනගන්න" data-ta="மேலும் அறிக">Learn More</a>
+                <a href="${escapeHtml(href)}" class="btn-overlay" data-en="Learn More" data-si="තව දැනගන්න" data-ta="மேலும் அறிக">Learn More</a>
               </div>
             </div>
           </div>
@@ -1072,7 +1084,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 <span class="stat-label" data-en="${escapeHtml(proj.stat2?.label?.en || '')}" data-si="${escapeHtml(proj.stat2?.label?.si || '')}" data-ta="${escapeHtml(proj.stat2?.label?.ta || '')}">${escapeHtml(proj.stat2?.label?.en || '')}</span>
               </div>
             </div>
-            <a href="projects.html?id=${encodeURIComponent(proj.id)}" class="project-link" data-en="Learn More">Learn More</a>
+            <a href="${escapeHtml(href)}" class="project-link" data-en="Learn More">Learn More</a>
           </div>
         `;
 
@@ -1582,7 +1594,7 @@ document.addEventListener('DOMContentLoaded', function() {
       // Try API first (for localhost), then fallback to static JSON
       const isLocal = location.hostname === 'localhost' || location.hostname === '127.0.0.1';
       const apiUrl = isLocal ? 'http://127.0.0.1:5000/api/projects' : null;
-      const staticUrl = 'assets/projects.json';
+      const staticUrl = 'assets/projects/index.json';
       
       let projects = [];
       
@@ -1,15 +1,29 @@
 // SCCF News Hub JavaScript
 
 // Configuration - Uses config.js for API URLs
-const NEWS_API_URL = typeof API_CONFIG !== 'undefined' ? API_CONFIG.NEWS_API_URL : 'http://localhost:5001/api/news';
-const IMAGE_BASE_URL = typeof API_CONFIG !== 'undefined' ? API_CONFIG.IMAGE_BASE_URL : 'http://localhost:5001';
+const NEWS_API_URL = typeof API_CONFIG !== 'undefined' ? API_CONFIG.NEWS_API_URL : 'http://localhost:5000/api/news';
+const IMAGE_BASE_URL = typeof API_CONFIG !== 'undefined' ? API_CONFIG.IMAGE_BASE_URL : 'http://localhost:5000';
 let allNews = [];
 let currentPage = 1;
 const newsPerPage = 9;
 let currentCategory = 'all';
+// Pre-rendered pages (pages/<lang>/news...) inline the list, or one article with its body
+const PRERENDERED = window.__SCCF_DATA__ || {};
+
+// Title/excerpt in the visitor's language when the server stored a translation
+function localized(news, field) {
+  const lang = localStorage.getItem('preferredLanguage') || 'en';
+  const translated = lang !== 'en' && news.translations && news.translations[lang] && news.translations[lang][field];
+  return translated || news[field];
+}
 
 // Initialize news page
 document.addEventListener('DOMContentLoaded', function() {
+  if (PRERENDERED.article) {
+    // the article is already in the page
+    initializeNewsletterForm();
+    return;
+  }
   loadNews();
   initializeFilters();
   initializeNewsletterForm();
@@ -17,6 +31,13 @@ document.addEventListener('DOMContentLoaded', function() {
 
 // Load news from API
 async function loadNews() {
+  if (Array.isArray(PRERENDERED.news)) {
+    // already sorted newest first; replaces the server-rendered cards as they were
+    allNews = PRERENDERED.news.slice();
+    displayFeaturedNews();
+    displayNews();
+    return;
+  }
   try {
     showLoading();
     const response = await fetch(NEWS_API_URL);
@@ -54,7 +75,7 @@ function displayFeaturedNews() {
       <div class="featured-news-image">
         <span class="featured-badge">Featured</span>
         <img src="${IMAGE_BASE_URL}${featuredNews.image || 'assets/images/placeholder-news.jpg'}" 
-             alt="${featuredNews.title}"
+             alt="${localized(featuredNews, 'title')}"
              onerror="this.src='https://picsum.photos/800/600?random=1'">
       </div>
       <div class="featured-news-content">
@@ -62,9 +83,9 @@ function displayFeaturedNews() {
           <span class="news-category">${featuredNews.category}</span>
           <span class="news-date">${formatDate(featuredNews.date)}</span>
         </div>
-        <h2>${featuredNews.title}</h2>
-        <p>${featuredNews.excerpt || truncateText(featuredNews.content, 200)}</p>
-        <a href="#" class="read-more-btn" onclick="event.stopPropagation(); openNewsDetail('${featuredNews.id}'); return false;">
+        <h2>${localized(featuredNews, 'title')}</h2>
+        <p>${localized(featuredNews, 'excerpt') || truncateText(featuredNews.content, 200)}</p>
+        <a href="${featuredNews.page || '#'}" class="read-more-btn" onclick="event.stopPropagation(); openNewsDetail('${featuredNews.id}'); return false;">
           Read Full Story
         </a>
       </div>
@@ -104,16 +125,16 @@ function displayNews() {
       <div class="news-card-image">
         <span class="news-card-category">${news.category}</span>
         <img src="${IMAGE_BASE_URL}${news.image || 'assets/images/placeholder-news.jpg'}" 
-             alt="${news.title}"
+             alt="${localized(news, 'title')}"
              onerror="this.src='https://picsum.photos/400/300?random=' + Math.random()">
       </div>
       <div class="news-card-content">
         <div class="news-card-date">${formatDate(news.date)}</div>
-        <h3>${news.title}</h3>
-        <p class="news-card-excerpt">${news.excerpt || truncateText(news.content, 150)}</p>
+        <h3>${localized(news, 'title')}</h3>
+        <p class="news-card-excerpt">${localized(news, 'excerpt') || truncateText(news.content, 150)}</p>
         <div class="news-card-footer">
           <span class="news-card-author">${news.author || 'SCCF Team'}</span>
-          <a href="#" class="news-card-link" onclick="openNewsDetail('${news.id}'); return false;">
+          <a href="${news.page || '#'}" class="news-card-link" onclick="openNewsDetail('${news.id}'); return false;">
             Read More
           </a>
         </div>
@@ -187,11 +208,29 @@ function initializeNewsletterForm() {
 }
 
 // Open news detail in modal
-function openNewsDetail(newsId) {
+async function openNewsDetail(newsId) {
   const news = allNews.find(n => n.id === newsId);
   
   if (!news) return;
   
+  // A pre-rendered list has no bodies; its articles have their own pages
+  if (news.content === undefined && news.page) {
+    location.href = news.page;
+    return;
+  }
+  
+  // The server's list can leave out article bodies; fetch this one on demand
+  if (news.content === undefined && NEWS_API_URL.startsWith('http')) {
+    try {
+      const response = await fetch(`${NEWS_API_URL}/${encodeURIComponent(newsId)}`);
+      if (response.ok) {
+        news.content = (await response.json()).content;
+      }
+    } catch (error) {
+      console.error('Error loading article:', error);
+    }
+  }
+  
   // Prepare additional images HTML
   let additionalImagesHTML = '';
   if (news.images && Array.isArray(news.images) && news.images.length > 0) {
@@ -218,7 +257,7 @@ function openNewsDetail(newsId) {
       <button class="news-modal-close" onclick="closeNewsModal()" aria-label="Close">&times;</button>
       <div class="news-modal-header">
         <img src="${IMAGE_BASE_URL}${news.image || 'assets/images/placeholder-news.jpg'}" 
-             alt="${news.title}"
+             alt="${localized(news, 'title')}"
              onerror="this.src='https://picsum.photos/1200/600?random=1'">
       </div>
       <div class="news-modal-body">
@@ -226,12 +265,12 @@ function openNewsDetail(newsId) {
           <span class="news-category">${news.category}</span>
           <span class="news-date">${formatDate(news.date)}</span>
         </div>
-        <h1>${news.title}</h1>
+        <h1>${localized(news, 'title')}</h1>
         <div class="news-author-info">
           <span>By ${news.author || 'SCCF Team'}</span>
         </div>
         <div class="news-full-content">
-          ${news.content.replace(/\n/g, '<br><br>')}
+          ${(news.content || '').replace(/\n/g, '<br><br>')}
         </div>
         ${additionalImagesHTML}
       </div>
@@ -266,6 +305,7 @@ function formatDate(dateString) {
 }
 
 function truncateText(text, maxLength) {
+  if (!text) return '';
   if (text.length <= maxLength) return text;
   return text.substr(0, maxLength).trim() + '...';
 }
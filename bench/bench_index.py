@@ -0,0 +1,81 @@
+"""Lookup/mutation latency of the id index versus the old linear scan.
+
+Usage: python bench/bench_index.py [--sizes 100,1000,10000,100000]
+
+Persistence is disabled so the numbers isolate the in-memory index cost (the
+lock file is still taken, as in production); the linear column reproduces the ``str(p.get('id')) == str(proj_id)`` scan the
+handlers used before.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+
+from repository import JsonRepository  # noqa: E402
+
+
+class _MemoryRepository(JsonRepository):
+    def _refresh(self):
+        pass
+
+    def _persist(self, upserts=(), deletes=()):
+        pass
+
+
+def _records(n):
+    return [{'id': f'project-{i}', 'published': False, 'priority': 0} for i in range(n)]
+
+
+def _per_op_us(fn, ops):
+    start = time.perf_counter()
+    for arg in ops:
+        fn(arg)
+    return (time.perf_counter() - start) / len(ops) * 1e6
+
+
+def run(sizes, ops=2000):
+    rows = []
+    tmp = tempfile.TemporaryDirectory()
+    for n in sizes:
+        records = _records(n)
+        repo = _MemoryRepository(path=os.path.join(tmp.name, f'{n}.json'))
+        repo._set(records, None)
+        ids = [f'project-{random.randrange(n)}' for _ in range(ops)]
+
+        def linear(proj_id):
+            for p in records:
+                if str(p.get('id')) == str(proj_id):
+                    return p
+
+        linear_ops = ids[:max(10, min(ops, 2_000_000 // n))]
+        fresh = [{'id': f'new-{i}'} for i in range(ops)]
+        rows.append({
+            'records': n,
+            'get_us': _per_op_us(repo.get, ids),
+            'update_us': _per_op_us(lambda i: repo.update(i, {'published': True}), ids),
+            'insert_us': _per_op_us(repo.insert, fresh),
+            'delete_us': _per_op_us(lambda r: repo.delete(r['id']), fresh),
+            'linear_scan_us': _per_op_us(linear, linear_ops),
+        })
+    tmp.cleanup()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100,1000,10000,100000')
+    parser.add_argument('--ops', type=int, default=2000)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    cols = ['records', 'get_us', 'update_us', 'insert_us', 'delete_us', 'linear_scan_us']
+    print(''.join(f'{c:>16}' for c in cols))
+    for row in run(sizes, args.ops):
+        print(''.join(f'{row[c]:>16}' if c == 'records' else f'{row[c]:>16.2f}' for c in cols))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,512 @@
+"""Latency, throughput and publish-time benchmarks for the admin server.
+
+Usage:
+  python bench/bench_server.py [--sizes 100,10000,100000] [--out bench/results.json]
+  python bench/bench_server.py --out bench/baseline.json          # record a new baseline
+  python bench/bench_server.py --compare bench/baseline.json      # run, then flag regressions
+  python bench/bench_server.py --compare bench/baseline.json --against bench/results.json
+
+For every size a fresh process builds a synthetic trilingual data set
+(fixtures.py) in a temporary directory, points the server at it through the
+``SCCF_*`` settings and measures:
+
+- ``client``: p50/p99/mean latency and requests per second of every GET route
+  through the Flask test client (no sockets, single thread)
+- ``server``: the same routes against a real local server (uvicorn running
+  asgi.py, or the Flask dev server with ``--server flask``) from
+  ``--concurrency`` keep-alive connections
+- ``upload``: ``POST /admin/upload`` with a main image and a 15-image gallery,
+  through both, plus the time the background jobs need to render the image
+  variants afterwards
+- ``publish``: the ``POST /admin/republish`` request, a full regeneration of
+  the public bundle, and ``copy_uploads`` from scripts/publish_assets.py on a
+  fresh and on an up-to-date target
+
+GET routes missing from ``ROUTES`` are listed on stderr and in the results
+(``unmapped_routes``), so new endpoints are not silently left out.
+
+``--compare`` reports every metric that got worse than the baseline by more
+than ``--threshold`` (latencies up, throughput down) and exits with status 1
+if there is one. Latency differences under ``--min-ms`` are treated as noise.
+Numbers are only comparable on the same machine. The 100k data set needs a
+few GB of memory, since the benchmark process and the server each load it.
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+SERVER_DIR = os.path.join(ROOT, 'server')
+sys.path.insert(0, BENCH_DIR)
+
+import fixtures  # noqa: E402
+
+GALLERY_IMAGES = 15
+# Sample URLs per GET rule; callables get the data set and return a list of URLs
+ROUTES = {
+    '/': ['/'],
+    '/admin': ['/admin'],
+    '/admin/manage': ['/admin/manage'],
+    '/admin/news': ['/admin/news'],
+    '/admin/status': ['/admin/status'],
+    '/admin/jobs': ['/admin/jobs'],
+    '/admin/blobs': ['/admin/blobs'],
+    '/admin/bulk/<collection>.ndjson': ['/admin/bulk/projects.ndjson', '/admin/bulk/news.ndjson'],
+    '/admin/jobs/<int:job_id>': lambda ds: [f"/admin/jobs/{ds['job_id']}"] if ds['job_id'] else [],
+    '/admin/republish/plan': ['/admin/republish/plan'],
+    '/metrics': ['/metrics'],
+    '/api/changes': ['/api/changes', '/api/changes?since=0&limit=100'],
+    '/api/projects': ['/api/projects', '/api/projects?limit=50&sort=-priority&fields=id,title,summary,main_image',
+                      '/api/projects?category=education&published=1&limit=20'],
+    '/api/projects/<proj_id>': lambda ds: [f'/api/projects/{i}' for i in ds['project_ids']],
+    '/api/search': ['/api/search?q=school', '/api/search?q=%E0%B6%B4%E0%B7%8F%E0%B7%83',   # පාස (prefix)
+                    '/api/search?q=library+children&published=1', '/api/search?q=water&type=projects'],
+    '/api/gallery': ['/api/gallery', '/api/gallery?limit=100&category=health'],
+    '/api/news': ['/api/news', '/api/news?limit=20&sort=-date'],
+    '/api/news/<news_id>': lambda ds: [f'/api/news/{i}' for i in ds['news_ids']],
+    '/api/news/search': ['/api/news/search?q=water', '/api/news/search?q=%E0%AE%AA%E0%AE%B3%E0%AF%8D'],  # பள்
+    '/uploads/<path:filename>': ['/uploads/projects/bench-000000/photo-0.jpg'],
+    '/uploads/news/<path:filename>': ['/uploads/news/bench-000.jpg'],
+}
+# Not benchmarked: blocks for seconds, streams forever, or reads every upload, by design
+SKIP_ROUTES = {'/admin/profile', '/api/changes/stream', '/admin/bulk/backup.tar'}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[k]
+
+
+def summarize(latencies, wall):
+    s = sorted(latencies)
+    return {
+        'n': len(s),
+        'p50_ms': round(percentile(s, 50) * 1e3, 3),
+        'p99_ms': round(percentile(s, 99) * 1e3, 3),
+        'mean_ms': round(sum(s) / len(s) * 1e3, 3),
+        'rps': round(len(s) / wall, 1) if wall > 0 else None,
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    out = io.BytesIO()
+    for name, value in fields.items():
+        out.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, data in files:
+        out.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                  f'Content-Type: image/jpeg\r\n\r\n'.encode())
+        out.write(data)
+        out.write(b'\r\n')
+    out.write(f'--{boundary}--\r\n'.encode())
+    return f'multipart/form-data; boundary={boundary}', out.getvalue()
+
+
+# --- measurements (run inside the per-size child process) -------------------
+
+def bench_client(client, urls, requests, seconds):
+    latencies = []
+    for url in urls[:2]:
+        client.get(url)   # warm the caches
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    i = 0
+    while i < requests and (i < 3 or time.perf_counter() < deadline):
+        url = urls[i % len(urls)]
+        t = time.perf_counter()
+        resp = client.get(url)
+        resp.get_data()
+        latencies.append(time.perf_counter() - t)
+        resp.close()
+        i += 1
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def bench_http(port, urls, requests, seconds, concurrency):
+    lock = threading.Lock()
+    latencies = []
+    issued = [0]
+    clock = {}
+
+    def go():
+        clock['start'] = time.perf_counter()
+        clock['deadline'] = clock['start'] + seconds
+
+    ready = threading.Barrier(concurrency + 1, action=go)
+
+    def worker():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+        try:
+            conn.connect()
+        finally:
+            ready.wait()
+        try:
+            while True:
+                with lock:
+                    i = issued[0]
+                    if i >= requests or (i >= 3 and time.perf_counter() >= clock['deadline']):
+                        return
+                    issued[0] += 1
+                t = time.perf_counter()
+                conn.request('GET', urls[i % len(urls)])
+                conn.getresponse().read()
+                elapsed = time.perf_counter() - t
+                with lock:
+                    latencies.append(elapsed)
+        finally:
+            conn.close()
+
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+    conn.request('GET', urls[0])   # warm the caches
+    conn.getresponse().read()
+    conn.close()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    ready.wait()
+    for t in threads:
+        t.join()
+    return summarize(latencies, time.perf_counter() - clock['start'])
+
+
+def _upload_form(n, images):
+    fields = {'id': f'bench-upload-{n}-{uuid.uuid4().hex[:8]}', 'title_en': 'Benchmark upload',
+              'title_si': 'පරීක්ෂණය', 'title_ta': 'சோதனை', 'category': 'education', 'tags': 'bench'}
+    files = [('image', 'main.jpg', images[0])]
+    files += [('gallery_images', f'g{k}.jpg', images[(k + 1) % len(images)]) for k in range(GALLERY_IMAGES)]
+    return fields, files
+
+
+def bench_uploads(post, count, images):
+    latencies = []
+    start = time.perf_counter()
+    for n in range(count):
+        fields, files = _upload_form(n, images)
+        t = time.perf_counter()
+        status = post(fields, files)
+        latencies.append(time.perf_counter() - t)
+        if status >= 400:
+            raise RuntimeError(f'upload failed with HTTP {status}')
+    wall = time.perf_counter() - start
+    result = summarize(latencies, wall)
+    result.pop('rps')
+    nbytes = sum(len(d) for _, _, d in _upload_form(0, images)[1]) * count
+    result['uploads_per_s'] = round(count / wall, 2)
+    result['mb_per_s'] = round(nbytes / wall / 2 ** 20, 2)
+    return result
+
+
+def _drain(jobs, timeout=600):
+    """Wait until no job is queued or running; returns the seconds waited."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        counts = jobs.counts()
+        if not counts.get('queued') and not counts.get('running'):
+            break
+        time.sleep(0.05)
+    return time.perf_counter() - start
+
+
+class LiveServer:
+    def __init__(self, kind, env):
+        self.port = _free_port()
+        env = dict(env, SCCF_PORT=str(self.port))
+        if kind == 'asgi':
+            cmd = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(self.port),
+                   '--log-level', 'warning', '--no-access-log']
+        else:
+            cmd = [sys.executable, 'main.py']
+        self.proc = subprocess.Popen(cmd, cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL)
+
+    def __enter__(self):
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError('benchmark server exited during startup')
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+                conn.request('GET', '/admin/status')
+                conn.getresponse().read()
+                conn.close()
+                return self
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError('benchmark server did not start within 60s')
+
+    def __exit__(self, *exc):
+        self.proc.terminate()
+        try:
+            self.proc.wait(15)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+    def post(self, fields, files):
+        content_type, body = _multipart(fields, files)
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=300)
+        try:
+            conn.request('POST', '/admin/upload', body=body, headers={'Content-Type': content_type})
+            resp = conn.getresponse()
+            resp.read()
+            return resp.status
+        finally:
+            conn.close()
+
+
+def run_size(records, args):
+    """Benchmark one data-set size; runs in its own process (see ``main``)."""
+    root = tempfile.mkdtemp(prefix=f'sccf-bench-{records}-')
+    try:
+        return _run_size(root, records, args)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def _run_size(root, records, args):
+    t = time.perf_counter()
+    projects, articles = fixtures.build(root, records, images=args.images)
+    fixture_seconds = time.perf_counter() - t
+    env = fixtures.environ(root)
+    os.environ.update(env)
+    sys.path.insert(0, SERVER_DIR)
+
+    from main import create_app
+    from services import JOBS
+
+    app = create_app()
+    client = app.test_client()
+    rng = random.Random(records)
+    first = JOBS.enqueue('publish_uploads', dedupe_key='publish_uploads')
+    _drain(JOBS)
+    dataset = {
+        'project_ids': [p['id'] for p in rng.sample(projects, min(20, len(projects)))],
+        'news_ids': [a['id'] for a in rng.sample(articles, min(20, len(articles)))],
+        'job_id': first,
+    }
+
+    rules = sorted({r.rule for r in app.url_map.iter_rules() if 'GET' in r.methods and r.endpoint != 'static'})
+    unmapped = [r for r in rules if r not in ROUTES and r not in SKIP_ROUTES]
+    for r in unmapped:
+        print(f'[warn] no benchmark URL for GET {r}', file=sys.stderr)
+    routes = {}
+    for rule in rules:
+        spec = ROUTES.get(rule)
+        urls = spec(dataset) if callable(spec) else spec
+        if urls:
+            routes[rule] = urls
+
+    result = {'records': records, 'fixture_seconds': round(fixture_seconds, 2),
+              'unmapped_routes': unmapped, 'client': {}, 'server': {}}
+    for rule, urls in routes.items():
+        print(f'[{records}] client GET {rule}', file=sys.stderr)
+        result['client'][f'GET {rule}'] = bench_client(client, urls, args.requests, args.route_seconds)
+
+    # uploads come last: the image variants they queue keep the CPU busy for a while,
+    # and each mode drains its jobs before the next measurement starts
+    images = [fixtures.image_bytes(rng) for _ in range(4)]
+    upload = {}
+    if args.server != 'none':
+        with LiveServer(args.server, os.environ) as server:
+            for rule, urls in routes.items():
+                print(f'[{records}] {args.server} GET {rule}', file=sys.stderr)
+                result['server'][f'GET {rule}'] = bench_http(server.port, urls, args.requests,
+                                                             args.route_seconds, args.concurrency)
+            print(f'[{records}] {args.server} uploads', file=sys.stderr)
+            upload['server'] = bench_uploads(server.post, args.uploads, images)
+            # drain while the server is up: it runs some of the jobs and must not die holding them
+            upload['server']['derivatives_drain_ms'] = round(_drain(JOBS) * 1e3, 1)
+
+    def client_post(fields, files):
+        data = dict(fields)
+        for name, filename, body in files:
+            data.setdefault(name, []).append((io.BytesIO(body), filename))
+        return client.post('/admin/upload', data=data, content_type='multipart/form-data').status_code
+
+    print(f'[{records}] client uploads', file=sys.stderr)
+    upload['client'] = bench_uploads(client_post, args.uploads, images)
+    upload['client']['derivatives_drain_ms'] = round(_drain(JOBS) * 1e3, 1)
+    result['upload'] = upload
+
+    print(f'[{records}] publish', file=sys.stderr)
+    JOBS.stop()   # keep the debounced jobs from running while we time things
+    result['publish'] = bench_publish(client, env, full_bundle=records <= args.full_bundle_max)
+    return result
+
+
+def bench_publish(client, env, full_bundle=True):
+    import app as projects_app
+    from services import PROJECTS
+
+    sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+    import publish_assets
+    from pathlib import Path
+
+    t = time.perf_counter()
+    client.post('/admin/republish')
+    republish_request = time.perf_counter() - t
+
+    bundle = None
+    if full_bundle:
+        t = time.perf_counter()
+        projects_app._write_public_projects(PROJECTS.records())
+        bundle = time.perf_counter() - t
+
+    publish_assets.SERVER_UPLOADS = Path(env['SCCF_UPLOAD_ROOT'])
+    publish_assets.ASSETS_UPLOADS = Path(env['SCCF_PUBLIC_UPLOADS_ROOT'] + '-bench')
+    publish_assets.PUBLISH_MANIFEST = Path(env['SCCF_DATA_DIR']) / 'bench-manifest.json'
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(2):   # first run copies everything, second finds nothing to do
+            t = time.perf_counter()
+            publish_assets.copy_uploads()
+            timings.append(time.perf_counter() - t)
+    return {
+        'republish_request_ms': round(republish_request * 1e3, 2),
+        'public_bundle_ms': round(bundle * 1e3, 2) if bundle is not None else None,
+        'copy_uploads_cold_ms': round(timings[0] * 1e3, 2),
+        'copy_uploads_warm_ms': round(timings[1] * 1e3, 2),
+    }
+
+
+# --- results and comparison ---------------------------------------------------
+
+def flatten(results):
+    """``{'<size>/<group>/<name>': {metric: value}}`` for every measured row."""
+    rows = {}
+    for size, res in results['sizes'].items():
+        for group in ('client', 'server'):
+            for name, metrics in res.get(group, {}).items():
+                rows[f'{size}/{group}/{name}'] = metrics
+        for name, metrics in res.get('upload', {}).items():
+            rows[f'{size}/upload/{name}'] = metrics if isinstance(metrics, dict) else {name: metrics}
+        rows[f'{size}/publish'] = res.get('publish', {})
+    return rows
+
+
+def compare(baseline, current, threshold, min_ms):
+    """Return ``[(row, metric, old, new, change)]`` for metrics that regressed."""
+    regressions = []
+    old_rows = flatten(baseline)
+    for row, metrics in flatten(current).items():
+        old = old_rows.get(row)
+        if not old:
+            continue
+        for metric, new in metrics.items():
+            prev = old.get(metric)
+            if not isinstance(new, (int, float)) or not isinstance(prev, (int, float)) or prev <= 0:
+                continue
+            if metric.endswith('_ms'):
+                if new - prev < min_ms:
+                    continue
+                change = new / prev - 1
+            elif metric == 'rps' or metric.endswith('_per_s'):
+                change = prev / new - 1 if new > 0 else float('inf')
+            else:
+                continue
+            if change > threshold:
+                regressions.append((row, metric, prev, new, change))
+    return regressions
+
+
+def _meta(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'server': args.server,
+        'concurrency': args.concurrency,
+        'storage_backend': os.environ.get('SCCF_STORAGE_BACKEND', 'json'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100,10000,100000')
+    parser.add_argument('--requests', type=int, default=200, help='max requests per route')
+    parser.add_argument('--route-seconds', type=float, default=3.0, help='time budget per route')
+    parser.add_argument('--concurrency', type=int, default=8, help='connections against the real server')
+    parser.add_argument('--uploads', type=int, default=3, help='uploads per client/server run')
+    parser.add_argument('--images', type=int, default=300, help='upload files in each data set')
+    parser.add_argument('--full-bundle-max', type=int, default=10000,
+                        help='largest size whose public bundle is fully regenerated (one shard per project)')
+    default_server = 'asgi'
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        default_server = 'flask'
+    parser.add_argument('--server', choices=('asgi', 'flask', 'none'), default=default_server)
+    parser.add_argument('--out', default=os.path.join(BENCH_DIR, 'results.json'))
+    parser.add_argument('--compare', metavar='BASELINE', help='flag regressions against this results file')
+    parser.add_argument('--against', metavar='RESULTS', help='with --compare: compare this file instead of running')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative slowdown')
+    parser.add_argument('--min-ms', type=float, default=0.5, help='ignore latency changes smaller than this')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        json.dump(run_size(args.child, args), sys.stdout)
+        sys.stdout.flush()
+        # the job queue's worker threads are daemons; skip interpreter teardown
+        os._exit(0)
+
+    if args.against:
+        with open(args.against, encoding='utf-8') as f:
+            results = json.load(f)
+    else:
+        results = {'meta': _meta(args), 'sizes': {}}
+        passthrough = ['--requests', str(args.requests), '--route-seconds', str(args.route_seconds),
+                       '--concurrency', str(args.concurrency), '--uploads', str(args.uploads),
+                       '--images', str(args.images), '--full-bundle-max', str(args.full_bundle_max),
+                       '--server', args.server]
+        for size in [int(s) for s in args.sizes.split(',') if s.strip()]:
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', str(size)] + passthrough,
+                                  stdout=subprocess.PIPE, check=True)
+            results['sizes'][str(size)] = json.loads(proc.stdout)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f'[done] results written to {args.out}')
+        for row, metrics in flatten(results).items():
+            print(f'{row:<60} ' + '  '.join(f'{k}={v}' for k, v in metrics.items() if k != 'n'))
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold, args.min_ms)
+        for row, metric, old, new, change in regressions:
+            print(f'[regression] {row} {metric}: {old} -> {new} ({change:+.0%})')
+        if regressions:
+            sys.exit(1)
+        print(f'[ok] no regressions over {args.threshold:.0%} against {args.compare}')
+
+
+if __name__ == '__main__':
+    main()
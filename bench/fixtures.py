@@ -0,0 +1,156 @@
+"""Synthetic trilingual data and image fixtures for the benchmarks.
+
+Usage: python bench/fixtures.py OUT_DIR [--records 10000] [--images 200]
+
+Writes a self-contained data root laid out like the real one (see
+``environ``): projects and news JSON with English, Sinhala and Tamil text,
+and JPEG fixtures under the upload folders. Generation is seeded, so the same
+arguments always produce the same files.
+"""
+import argparse
+import io
+import json
+import os
+import random
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow not installed: images are tiny fixed PNGs
+    Image = None
+
+CATEGORIES = ('education', 'health', 'environment', 'community', 'relief')
+STATUSES = ('ongoing', 'completed', 'planned')
+TAGS = ('youth', 'schools', 'water', 'trees', 'medical', 'books', 'flood', 'elders', 'women', 'sports')
+WORDS = {
+    'en': ('school', 'library', 'children', 'village', 'water', 'health', 'clinic', 'books', 'trees',
+           'volunteers', 'community', 'support', 'project', 'families', 'education', 'relief', 'donation'),
+    'si': ('පාසල', 'පුස්තකාලය', 'ළමයින්', 'ගම', 'ජලය', 'සෞඛ්\u200dය', 'සායනය', 'පොත්', 'ගස්',
+           'ස්වේච්ඡා', 'ප්\u200dරජාව', 'සහාය', 'ව්\u200dයාපෘතිය', 'පවුල්', 'අධ්\u200dයාපනය', 'සහන', 'පරිත්\u200dයාග'),
+    'ta': ('பள்ளி', 'நூலகம்', 'குழந்தைகள்', 'கிராமம்', 'நீர்', 'சுகாதாரம்', 'மருத்துவமனை', 'புத்தகங்கள்',
+           'மரங்கள்', 'தன்னார்வலர்கள்', 'சமூகம்', 'ஆதரவு', 'திட்டம்', 'குடும்பங்கள்', 'கல்வி', 'நிவாரணம்'),
+}
+LANGS = ('en', 'si', 'ta')
+# 1x1 PNG used when Pillow is missing
+_PNG = bytes.fromhex('89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+                     '1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082')
+
+
+def environ(root):
+    """``SCCF_*`` settings that point the server at a fixture root."""
+    return {
+        'SCCF_DATA_DIR': os.path.join(root, 'server', 'data'),
+        'SCCF_UPLOAD_ROOT': os.path.join(root, 'server', 'uploads'),
+        'SCCF_NEWS_JSON': os.path.join(root, 'data', 'news.json'),
+        'SCCF_NEWS_UPLOAD_DIR': os.path.join(root, 'uploads', 'news'),
+        'SCCF_PUBLIC_PROJECTS_JSON': os.path.join(root, 'assets', 'projects.json'),
+        'SCCF_PUBLIC_UPLOADS_ROOT': os.path.join(root, 'assets', 'uploads'),
+    }
+
+
+def _text(rng, lang, words):
+    return ' '.join(rng.choice(WORDS[lang]) for _ in range(words))
+
+
+def _trilingual(rng, words):
+    return {lang: _text(rng, lang, words) for lang in LANGS}
+
+
+def project(rng, i, images=3):
+    slug = f'bench-{i:06d}'
+    urls = [f'/uploads/projects/{slug}/photo-{n}.jpg' for n in range(images)]
+    return {
+        'id': slug,
+        'title': _trilingual(rng, 5),
+        'summary': _trilingual(rng, 10),
+        'longDescription': _trilingual(rng, 25),
+        'category': rng.choice(CATEGORIES),
+        'status': rng.choice(STATUSES),
+        'featured': rng.random() < 0.1,
+        'priority': rng.randrange(10),
+        'main_image': urls[0],
+        'gallery_images': urls[1:],
+        'tags': rng.sample(TAGS, 3),
+        'published': rng.random() < 0.8,
+        'stat1': {'number': str(rng.randrange(1000)), 'label': _trilingual(rng, 2)},
+        'stat2': {'number': str(rng.randrange(1000)), 'label': _trilingual(rng, 2)},
+    }
+
+
+def news(rng, i):
+    lang = LANGS[i % 3]
+    return {
+        'id': f'bench-news-{i:06d}',
+        'title': _text(rng, lang, 8),
+        'content': _text(rng, lang, 60),
+        'excerpt': _text(rng, lang, 15),
+        'category': rng.choice(CATEGORIES).title(),
+        'author': 'SCCF Team',
+        'date': f'2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}T10:00:00',
+        'image': f'/uploads/news/bench-{i % 50:03d}.jpg',
+    }
+
+
+def image_bytes(rng, width=1600, height=1200):
+    """A JPEG of roughly camera-upload size (noise compresses poorly, like photos)."""
+    if Image is None:
+        return _PNG
+    img = Image.frombytes('RGB', (width // 8, height // 8), rng.randbytes(width // 8 * height // 8 * 3))
+    buf = io.BytesIO()
+    img.resize((width, height)).save(buf, 'JPEG', quality=85)
+    return buf.getvalue()
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def build(root, records, images=200, seed=1):
+    """Write ``records`` projects and news articles plus ``images`` upload files under ``root``.
+
+    Only the first ``images // 3`` projects get real files, which is enough
+    for the upload routes and the publish step; every record still references
+    its images. Returns ``(projects, news)``.
+    """
+    rng = random.Random(seed)
+    env = environ(root)
+    projects = [project(rng, i) for i in range(records)]
+    articles = [news(rng, i) for i in range(records)]
+    write_json(os.path.join(env['SCCF_DATA_DIR'], 'projects.json'), projects)
+    write_json(env['SCCF_NEWS_JSON'], articles)
+
+    pool = [image_bytes(rng) for _ in range(8)]
+    written = 0
+    for p in projects:
+        if written >= images:
+            break
+        for url in [p['main_image']] + p['gallery_images']:
+            path = os.path.join(env['SCCF_UPLOAD_ROOT'], *url.split('/')[2:])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(pool[written % len(pool)])
+            written += 1
+            if written >= images:
+                break
+    os.makedirs(env['SCCF_NEWS_UPLOAD_DIR'], exist_ok=True)
+    for n in range(min(50, records)):
+        with open(os.path.join(env['SCCF_NEWS_UPLOAD_DIR'], f'bench-{n:03d}.jpg'), 'wb') as f:
+            f.write(pool[n % len(pool)])
+    return projects, articles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('out_dir')
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    build(args.out_dir, args.records, args.images, args.seed)
+    for k, v in environ(os.path.abspath(args.out_dir)).items():
+        print(f'{k}={v}')
+
+
+if __name__ == '__main__':
+    main()
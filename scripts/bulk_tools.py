@@ -0,0 +1,127 @@
+"""Bulk NDJSON export/import and full backups of projects and news (server/bulk.py).
+
+  python scripts/bulk_tools.py export projects > projects.ndjson
+  python scripts/bulk_tools.py import news news.ndjson [--mode insert] [--dry-run]
+  python scripts/bulk_tools.py backup sccf-backup.tar
+  python scripts/bulk_tools.py restore sccf-backup.tar [--mode insert] [--dry-run]
+
+Works on the data files directly, through the same locked, versioned writes
+as the admin server, so the server may keep running. ``-`` (the default)
+means stdin/stdout. Follow-up work (public bundle, mirroring uploads to
+assets/uploads) is queued for the server's job workers.
+"""
+import argparse
+import json
+import sys
+import tarfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'server'))
+
+import bulk  # noqa: E402
+from changes import COLLECTIONS  # noqa: E402
+
+
+def _open(path, mode):
+    if path == '-':
+        return (sys.stdin if 'r' in mode else sys.stdout).buffer
+    return open(path, mode)
+
+
+def _write_all(chunks, path):
+    out = _open(path, 'wb')
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+        out.flush()
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+
+def _print_errors(errors):
+    for e in errors:
+        where = ' '.join(f'{k} {e[k]}' for k in ('member', 'line') if k in e)
+        print(f"[error] {where}: {e['error']}", file=sys.stderr)
+
+
+def _print_result(collection, result):
+    print(f"[import] {collection}: {result['inserted']} inserted, {result['replaced']} replaced, "
+          f"{len(result['skipped'])} skipped (id taken)", file=sys.stderr)
+
+
+def export(collection, path):
+    _write_all(bulk.export_lines(collection), path)
+    print(f"[export] {collection} -> {path}", file=sys.stderr)
+
+
+def import_records(collection, path, mode, dry_run):
+    source = _open(path, 'rb')
+    try:
+        records, errors = bulk.read_records(source, collection)
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+    if errors:
+        _print_errors(errors)
+        print(f"[import] {collection}: nothing written", file=sys.stderr)
+        return 1
+    if dry_run:
+        print(f"[import] {collection}: {len(records)} valid records (dry run)", file=sys.stderr)
+        return 0
+    _print_result(collection, bulk.commit(collection, records, mode))
+    return 0
+
+
+def backup(path):
+    _write_all(bulk.backup_chunks(), path)
+    print(f"[backup] -> {path}", file=sys.stderr)
+
+
+def restore(path, mode, dry_run):
+    source = _open(path, 'rb')
+    try:
+        report = bulk.restore(source, mode, dry_run)
+    except tarfile.TarError as e:
+        print(f"[error] {path}: not a tar archive ({e})", file=sys.stderr)
+        return 1
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+    _print_errors(report['errors'])
+    print(f"[restore] {report['files']} upload files{' checked' if dry_run else ''}, records: "
+          f"{json.dumps(report['records'])}", file=sys.stderr)
+    for collection, result in report.get('committed', {}).items():
+        _print_result(collection, result)
+    if not report['ok']:
+        print("[restore] no records written", file=sys.stderr)
+    return 0 if report['ok'] else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk NDJSON export/import and backups')
+    sub = parser.add_subparsers(dest='command', required=True)
+    export_cmd = sub.add_parser('export', help='write one collection as NDJSON')
+    export_cmd.add_argument('collection', choices=COLLECTIONS)
+    export_cmd.add_argument('path', nargs='?', default='-')
+    import_cmd = sub.add_parser('import', help='import NDJSON records in one write')
+    import_cmd.add_argument('collection', choices=COLLECTIONS)
+    import_cmd.add_argument('path', nargs='?', default='-')
+    backup_cmd = sub.add_parser('backup', help='write a tar of both collections and their upload files')
+    backup_cmd.add_argument('path', nargs='?', default='-')
+    restore_cmd = sub.add_parser('restore', help='restore a tar written by backup')
+    restore_cmd.add_argument('path', nargs='?', default='-')
+    for cmd in (import_cmd, restore_cmd):
+        cmd.add_argument('--mode', choices=bulk.MODES, default='upsert',
+                         help='upsert replaces records with the same id; insert skips them')
+        cmd.add_argument('--dry-run', action='store_true', help='validate only')
+    args = parser.parse_args()
+    if args.command == 'export':
+        export(args.collection, args.path)
+    elif args.command == 'import':
+        sys.exit(import_records(args.collection, args.path, args.mode, args.dry_run))
+    elif args.command == 'backup':
+        backup(args.path)
+    else:
+        sys.exit(restore(args.path, args.mode, args.dry_run))
@@ -0,0 +1,38 @@
+"""Pre-render the public project and news pages per language (server/prerender.py).
+
+  python scripts/prerender_pages.py             # render the pages whose records changed
+  python scripts/prerender_pages.py --force     # render every page
+  python scripts/prerender_pages.py --dry-run   # list the pages that would be rendered or removed
+
+Reads the data stores directly, like the admin server's ``prerender`` job,
+and writes pages/<lang>/... (SCCF_PRERENDER_DIR) next to the site's HTML.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'server'))
+
+import prerender  # noqa: E402
+from config import Config  # noqa: E402
+from services import NEWS, PROJECTS  # noqa: E402
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-render project and news pages into static HTML')
+    parser.add_argument('--force', action='store_true', help='render every page, not only changed ones')
+    parser.add_argument('--dry-run', action='store_true', help='only list the pages to render and remove')
+    parser.add_argument('--workers', type=int, default=prerender.PRERENDER_WORKERS, help='render processes')
+    args = parser.parse_args()
+    news = [NEWS.expand(r) for r in NEWS.records()]
+    report = prerender.build(PROJECTS.records(), news, Config.BASE_DIR, Config.PRERENDER_DIR,
+                             Config.PRERENDER_MANIFEST, dry_run=args.dry_run, force=args.force,
+                             workers=args.workers)
+    verb = 'would render' if args.dry_run else 'render'
+    for rel in report['pages']['render']:
+        print(f"[{verb}] {rel}")
+    for rel in report['pages']['remove']:
+        print(f"[{'would remove' if args.dry_run else 'remove'}] {rel}")
+    print(f"[info] {report['rendered']} pages {'to render' if args.dry_run else 'rendered'}, "
+          f"{report['unchanged']} unchanged, {report['removed']} {'to remove' if args.dry_run else 'removed'} "
+          f"-> {Config.PRERENDER_DIR}")
@@ -1,29 +1,32 @@
+import argparse
 import json
-import os
-import shutil
+import sys
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[1]
 SERVER_UPLOADS = ROOT / 'server' / 'uploads'
 ASSETS_UPLOADS = ROOT / 'assets' / 'uploads'
 PROJECTS_JSON = ROOT / 'assets' / 'projects.json'
+NEWS_JSON = ROOT / 'assets' / 'data' / 'news.json'
+PUBLISH_MANIFEST = ROOT / 'server' / 'data' / 'publish-manifest.json'
 
-# Copy server/uploads -> assets/uploads (mirror)
-def copy_uploads():
+sys.path.insert(0, str(ROOT / 'server'))
+import publisher  # noqa: E402
+
+# Copy new/changed files server/uploads -> assets/uploads (incremental mirror)
+def copy_uploads(dry_run=False, link=True):
     if not SERVER_UPLOADS.exists():
         print(f"[warn] No server/uploads found at {SERVER_UPLOADS}")
         return
-    for src_dir, _, files in os.walk(SERVER_UPLOADS):
-        rel = os.path.relpath(src_dir, SERVER_UPLOADS)
-        dst_dir = ASSETS_UPLOADS / rel
-        dst_dir.mkdir(parents=True, exist_ok=True)
-        for f in files:
-            s = Path(src_dir) / f
-            d = dst_dir / f
-            # Only copy if newer or missing
-            if not d.exists() or s.stat().st_mtime > d.stat().st_mtime:
-                shutil.copy2(s, d)
-                print(f"[copy] {s} -> {d}")
+    report = publisher.publish(str(SERVER_UPLOADS), str(ASSETS_UPLOADS), str(PUBLISH_MANIFEST),
+                               dry_run=dry_run, link=link)
+    verb = 'would copy' if dry_run else 'copy'
+    for rel in report['files']['copy']:
+        print(f"[{verb}] {SERVER_UPLOADS / rel} -> {ASSETS_UPLOADS / rel}")
+    for rel in report['files']['prune']:
+        print(f"[{'would prune' if dry_run else 'prune'}] {ASSETS_UPLOADS / rel}")
+    print(f"[info] {report['copied']} files / {report['copied_bytes']} bytes to transfer, "
+          f"{report['pruned']} files / {report['pruned_bytes']} bytes pruned, {report['unchanged']} unchanged")
 
 # Rewrite paths in projects.json from /uploads to assets/uploads
 
@@ -47,14 +50,41 @@ def rewrite_projects_json():
             proj['image'] = map_url(proj['image'])
         if 'gallery_images' in proj and isinstance(proj['gallery_images'], list):
             proj['gallery_images'] = [map_url(x) for x in proj['gallery_images']]
+        if isinstance(proj.get('image_variants'), dict):
+            variants = {}
+            for url, meta in proj['image_variants'].items():
+                for v in meta.get('variants', []):
+                    v['url'] = map_url(v.get('url'))
+                variants[map_url(url)] = meta
+            proj['image_variants'] = variants
     if changed:
-        PROJECTS_JSON.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
         print(f"[update] Rewrote paths in {PROJECTS_JSON}")
     else:
         print("[info] No paths to rewrite in projects.json")
+    # Always (re)emit the minified + precompressed bundle and per-project shards
+    index = publisher.write_projects_bundle(data, str(PROJECTS_JSON.parent))
+    print(f"[bundle] {len(index)} projects -> {PROJECTS_JSON.parent / 'projects'}")
+
+# Minify and precompress the static news feed
+
+def compress_news_json():
+    if not NEWS_JSON.exists():
+        print(f"[warn] No {NEWS_JSON}")
+        return
+    data = json.loads(NEWS_JSON.read_text(encoding='utf-8-sig'))
+    if publisher.write_precompressed(str(NEWS_JSON), publisher.dump_min(data)):
+        print(f"[bundle] Wrote minified {NEWS_JSON} (+ .gz/.br)")
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Publish server/uploads and projects.json for the static site')
+    parser.add_argument('--dry-run', action='store_true', help='only report files and bytes to transfer')
+    parser.add_argument('--copy', action='store_true', help='always copy files instead of hardlinking')
+    args = parser.parse_args()
+    if args.dry_run:
+        copy_uploads(dry_run=True)
+        sys.exit(0)
     ASSETS_UPLOADS.mkdir(parents=True, exist_ok=True)
-    copy_uploads()
+    copy_uploads(link=not args.copy)
     rewrite_projects_json()
+    compress_news_json()
     print('[done] publish assets complete')
@@ -0,0 +1,82 @@
+"""Maintenance commands for the SQLite and news segment storage backends.
+
+  python scripts/store_tools.py migrate   # one-shot import of the JSON files into SQLite
+  python scripts/store_tools.py export    # write assets/projects.json and its bundle from the SQLite store
+  python scripts/store_tools.py export-news  # write assets/data/news.json from the segment store
+
+The database path follows the apps: SCCF_SQLITE_PATH, or sccf.sqlite3 next
+to each collection's JSON file.
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'server'))
+
+import publisher  # noqa: E402
+from storage import JsonStore, open_store  # noqa: E402
+
+PROJECTS_JSON = ROOT / 'server' / 'data' / 'projects.json'
+NEWS_JSON = ROOT / 'data' / 'news.json'
+PUBLIC_PROJECTS_JSON = ROOT / 'assets' / 'projects.json'
+PUBLIC_NEWS_JSON = ROOT / 'assets' / 'data' / 'news.json'
+
+COLLECTIONS = {
+    'projects': PROJECTS_JSON,
+    'news': NEWS_JSON,
+}
+
+
+def _sqlite_store(collection):
+    os.environ['SCCF_STORAGE_BACKEND'] = 'sqlite'
+    return open_store(str(COLLECTIONS[collection]), collection)
+
+
+def migrate(force=False):
+    for collection, json_path in COLLECTIONS.items():
+        if not json_path.exists():
+            print(f"[skip] No {json_path}")
+            continue
+        store = _sqlite_store(collection)
+        existing, _ = store.load()
+        if existing and not force:
+            print(f"[skip] {collection}: SQLite table already has {len(existing)} records (use --force to replace)")
+            continue
+        records, _ = JsonStore(str(json_path)).load()
+        version = store.save(records)
+        print(f"[migrate] {collection}: {len(records)} records from {json_path} -> {store.path} (version {version})")
+
+
+def export():
+    store = _sqlite_store('projects')
+    published = store.query('published = 1')
+    # the same bundle the app's publish job writes: minified projects.json, index and shards (+ .gz/.br)
+    publisher.write_projects_bundle(published, str(PUBLIC_PROJECTS_JSON.parent))
+    print(f"[export] {len(published)} published projects -> {PUBLIC_PROJECTS_JSON} (+ projects/index.json)")
+
+
+def export_news():
+    # with SCCF_NEWS_STORAGE=segments data/news.json is no longer written; the static site reads this copy
+    from segment_store import SegmentStore
+    articles, _ = SegmentStore(str(NEWS_JSON)).load_full()
+    PUBLIC_NEWS_JSON.parent.mkdir(parents=True, exist_ok=True)
+    publisher.write_precompressed(str(PUBLIC_NEWS_JSON), publisher.dump_min(articles))
+    print(f"[export] {len(articles)} news articles -> {PUBLIC_NEWS_JSON}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Storage backend maintenance')
+    sub = parser.add_subparsers(dest='command', required=True)
+    migrate_cmd = sub.add_parser('migrate', help='import server/data/projects.json and data/news.json')
+    migrate_cmd.add_argument('--force', action='store_true', help='replace tables that already have data')
+    sub.add_parser('export', help='write published projects to assets/projects.json and assets/projects/')
+    sub.add_parser('export-news', help='write news from the segment store to assets/data/news.json')
+    args = parser.parse_args()
+    if args.command == 'migrate':
+        migrate(force=args.force)
+    elif args.command == 'export-news':
+        export_news()
+    else:
+        export()
@@ -1,221 +1,345 @@
-from flask import Flask, request, render_template, redirect, url_for, jsonify, send_from_directory
-from werkzeug.utils import secure_filename
-from flask_cors import CORS
+from flask import Blueprint, request, render_template, redirect, url_for, jsonify
 import os
-import json
-
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))
-DATA_DIR = os.path.join(BASE_DIR, 'server', 'data')
-UPLOAD_ROOT = os.path.join(BASE_DIR, 'server', 'uploads')
-PROJECTS_JSON = os.path.join(DATA_DIR, 'projects.json')
-PUBLIC_PROJECTS_JSON = os.path.join(BASE_DIR, 'assets', 'projects.json')
-PUBLIC_UPLOADS_ROOT = os.path.join(BASE_DIR, 'assets', 'uploads')
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(UPLOAD_ROOT, exist_ok=True)
-os.makedirs(PUBLIC_UPLOADS_ROOT, exist_ok=True)
-
-app = Flask(__name__)
-# Allow local static previews to call these APIs in dev (8000, 5500, 5501)
-CORS(app, resources={
-    r"/api/*": {
-        "origins": [
-            "http://127.0.0.1:8000",
-            "http://localhost:8000",
-            "http://127.0.0.1:5500",
-            "http://localhost:5500",
-            "http://127.0.0.1:5501",
-            "http://localhost:5501"
-        ]
-    }
-})
-app.config['MAX_CONTENT_LENGTH'] = 25 * 1024 * 1024  # 25 MB
+
+import images
+import publisher
+from config import Config
+from http_cache import conditional, json_response
+from query import GALLERY_FILTERS, GALLERY_SORTS, PROJECT_FILTERS, PROJECT_SORTS, is_list_query, list_response
+from search import NEWS_FIELDS, PROJECT_FIELDS, search_response
+from services import (BLOBS, CHANGES, JOBS, NEWS, PROJECTS, SEARCH, TRANSLATOR, record_blobs, schedule_prerender,
+                      schedule_translation)
+from static_files import send_upload
+from translation import PROJECT_LANG_FIELDS, lang_dict, with_langs
+from uploads import allowed_file
+
+UPLOAD_ROOT = Config.UPLOAD_ROOT
+PUBLIC_PROJECTS_JSON = Config.PUBLIC_PROJECTS_JSON
+PUBLIC_UPLOADS_ROOT = Config.PUBLIC_UPLOADS_ROOT
+PUBLISH_MANIFEST = Config.PUBLISH_MANIFEST
+PUBLIC_DEBOUNCE = 2.0     # seconds of quiet before the public bundle is rewritten
+PUBLIC_MAX_DELAY = 10.0   # ...but never later than this after the first edit
+BATCH_FIELDS = ('published', 'featured', 'priority')
+
+bp = Blueprint('projects', __name__)
 
 def _load_projects():
-    if not os.path.exists(PROJECTS_JSON):
-        return []
-    try:
-        with open(PROJECTS_JSON, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return []
+    """Return the cached project list (shared; do not mutate in place)."""
+    return PROJECTS.records()
 
 def _save_projects(projects):
     """Persist full project list to local data store only."""
-    with open(PROJECTS_JSON, 'w', encoding='utf-8') as f:
-        json.dump(projects, f, ensure_ascii=False, indent=2)
+    PROJECTS.save(projects)
 
 
-def _write_public_projects(projects):
-    """Write only published projects to the public JSON used by the static site."""
-    try:
-        assets_dir = os.path.join(BASE_DIR, 'assets')
-        os.makedirs(assets_dir, exist_ok=True)
-        published = [p for p in projects if p.get('published')]
-        with open(PUBLIC_PROJECTS_JSON, 'w', encoding='utf-8') as pf:
-            json.dump(published, pf, ensure_ascii=False, indent=2)
-    except Exception:
-        pass
+def _write_public_projects(projects, changed=None):
+    """Write only published projects to the public JSON bundle used by the static site."""
+    assets_dir = os.path.dirname(PUBLIC_PROJECTS_JSON)
+    os.makedirs(assets_dir, exist_ok=True)
+    published = [p for p in projects if p.get('published')]
+    publisher.write_projects_bundle(published, assets_dir, changed=changed)
 
-def _mirror_to_public(source_abs_path: str, relative_upload_path: str):
-    """Copy a file saved under server/uploads/* into assets/uploads/* for static site deployments.
-    relative_upload_path should be the part after '/uploads/', e.g. 'projects/slug/file.jpg'.
-    """
-    try:
-        target_abs = os.path.join(PUBLIC_UPLOADS_ROOT, relative_upload_path.replace('\\', '/'))
-        target_dir = os.path.dirname(target_abs)
-        os.makedirs(target_dir, exist_ok=True)
-        # Copy binary content
-        with open(source_abs_path, 'rb') as rf, open(target_abs, 'wb') as wf:
-            wf.write(rf.read())
-    except Exception:
-        # Best-effort; don't fail the request on mirror issues
-        pass
+def _publish_uploads(dry_run=False):
+    """Incrementally mirror server/uploads/* into assets/uploads/* for static site deployments."""
+    return publisher.publish(UPLOAD_ROOT, PUBLIC_UPLOADS_ROOT, PUBLISH_MANIFEST, dry_run=dry_run)
 
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+def _merge_dirty(waiting, new):
+    if waiting.get('all') or new.get('all'):
+        return {'all': True}
+    return {'ids': sorted(set(waiting.get('ids', [])) | set(new.get('ids', [])))}
 
 
-@app.route('/admin')
+def _schedule_public_projects(ids=None):
+    """Mark projects dirty and queue a debounced regeneration of the public bundle.
+
+    Edits within PUBLIC_DEBOUNCE seconds of each other (up to PUBLIC_MAX_DELAY)
+    share one regeneration, which re-serializes only the dirty projects.
+    ``ids=None`` rebuilds everything.
+    """
+    payload = {'all': True} if ids is None else {'ids': [str(i) for i in ids]}
+    return JOBS.enqueue('public_projects', payload, dedupe_key='public_projects',
+                        delay=PUBLIC_DEBOUNCE, max_delay=PUBLIC_MAX_DELAY, merge=_merge_dirty)
+
+
+def _schedule_publish_uploads():
+    return JOBS.enqueue('publish_uploads', dedupe_key='publish_uploads')
+
+
+def _queue_derivatives(proj_id, urls):
+    """Render responsive variants of freshly uploaded images in the background."""
+    if not images.available():
+        return
+    for url in dict.fromkeys(urls):  # the same blob may fill several slots
+        if url and url.startswith('/uploads/'):
+            JOBS.enqueue('image_derivatives', {'project_id': proj_id, 'url': url})
+
+
+@JOBS.register('public_projects')
+def _run_public_projects(payload):
+    changed = None if payload.get('all') else set(payload.get('ids', []))
+    _write_public_projects(_load_projects(), changed=changed)
+    # the pages are rebuilt from the same published projects
+    schedule_prerender()
+    return {'projects': 'all' if changed is None else len(changed)}
+
+
+@JOBS.register('publish_uploads')
+def _run_publish_uploads(payload):
+    report = _publish_uploads()
+    return {k: v for k, v in report.items() if k != 'files'}
+
+
+@JOBS.register('image_derivatives')
+def _run_image_derivatives(payload):
+    proj_id, url = payload['project_id'], payload['url']
+    src = os.path.join(UPLOAD_ROOT, url[len('/uploads/'):])
+    if not os.path.isfile(src):
+        return {'skipped': 'source missing'}
+    # a blob already rendered for another record keeps its variants
+    meta = BLOBS.variants(url) if BLOBS.owns(url) else None
+    if meta is None:
+        meta = images.render(src, url)
+        if BLOBS.owns(url):
+            BLOBS.set_variants(url, meta)
+    updated = PROJECTS.update(proj_id, lambda p: {'image_variants': {**(p.get('image_variants') or {}), url: meta}})
+    if updated is not None:
+        CHANGES.record('projects', proj_id)
+    _schedule_publish_uploads()
+    if updated is not None and updated.get('published'):
+        _schedule_public_projects([proj_id])
+    return {'variants': len(meta['variants'])}
+
+
+@JOBS.register('translate_projects')
+def _run_translate_projects(payload):
+    """Fill the empty si/ta texts of the given projects, one provider call per language for all of them."""
+    if TRANSLATOR is None:
+        return {'skipped': 'translation is off'}
+    fields = {}
+    for proj_id in payload.get('ids', []):
+        project = PROJECTS.get(proj_id)
+        for path in PROJECT_LANG_FIELDS if project is not None else ():
+            langs = lang_dict(project, path)
+            if langs is not None:
+                fields[(proj_id, path)] = langs
+    filled = {}
+    for (proj_id, path), langs in TRANSLATOR.fill(fields).items():
+        filled.setdefault(proj_id, []).append((path, langs))
+
+    def apply(items):
+        def changes(current):
+            out = {}
+            for path, langs in items:
+                out.update(with_langs({**current, **out}, path, langs))
+            return out
+        return changes
+
+    results = PROJECTS.update_many({proj_id: apply(items) for proj_id, items in filled.items()})
+    updated = [proj_id for proj_id, record in results.items() if record is not None]
+    if updated:
+        CHANGES.record('projects', updated)
+        published = [proj_id for proj_id in updated if results[proj_id].get('published')]
+        if published:
+            _schedule_public_projects(published)
+    return {'projects': len(updated), 'texts': sum(len(items) for items in filled.values())}
+
+
+@bp.route('/admin')
 def admin_index():
     """Render a simple upload form for adding projects."""
     return render_template('upload.html')
 
 
-@app.route('/')
+@bp.route('/')
 def index_redirect():
     """Redirect root to the admin UI to avoid confusion when visiting the base URL."""
-    from flask import redirect
     return redirect('/admin')
 
 
-@app.route('/api/projects', methods=['GET'])
+@bp.route('/api/projects', methods=['GET'])
 def api_projects():
-    return jsonify(_load_projects())
+    def build():
+        if is_list_query(request.args, PROJECT_FILTERS):
+            return list_response(_load_projects(), PROJECT_FILTERS, PROJECT_SORTS, cache=PROJECTS.derived)
+        return json_response(PROJECTS.json_bytes())
+    return conditional(PROJECTS, 'projects', build)
 
 
-@app.route('/api/projects/<proj_id>', methods=['GET'])
+@bp.route('/api/projects/<proj_id>', methods=['GET'])
 def api_project_detail(proj_id):
-    for p in _load_projects():
-        if str(p.get('id')) == str(proj_id):
+    def build():
+        p = PROJECTS.get(proj_id)
+        if p is not None:
             return jsonify(p)
-    return jsonify({'error': 'Not found'}), 404
+        return jsonify({'error': 'Not found'}), 404
+    return conditional(PROJECTS, 'projects', build)
+
+
+@bp.route('/api/search', methods=['GET'])
+def api_search():
+    """Ranked full-text search over projects and news articles (all languages).
+
+    ``?type=projects`` or ``?type=news`` limits the results to one collection;
+    ``?published=1`` leaves out unpublished projects.
+    """
+    def build():
+        SEARCH.sync('projects', PROJECTS, PROJECT_FIELDS)
+        SEARCH.sync('news', NEWS, NEWS_FIELDS)
+        match = None
+        if request.args.get('published', '').strip().lower() in ('1', 'true', 'yes', 'on'):
+            match = lambda collection, r: collection != 'projects' or bool(r.get('published'))
+        return search_response(SEARCH, ('projects', 'news'), match=match)
+    return conditional((PROJECTS, NEWS), 'search', build)
 
 
-@app.route('/admin/manage')
+@bp.route('/admin/manage')
 def admin_manage():
     """Simple management page to publish/unpublish projects."""
-    projects = _load_projects()
     # sort newest first by id string for now
-    projects = list(projects)
+    projects = list(_load_projects())
     projects.sort(key=lambda x: str(x.get('id', '')), reverse=True)
     return render_template('manage.html', projects=projects)
 
 
-@app.route('/admin/publish/<proj_id>', methods=['POST'])
+@bp.route('/admin/publish/<proj_id>', methods=['POST'])
 def admin_publish(proj_id):
-    projects = _load_projects()
-    updated = False
-    for p in projects:
-        if str(p.get('id')) == str(proj_id):
-            p['published'] = True
-            updated = True
-            break
-    if updated:
-        _save_projects(projects)
-        _write_public_projects(projects)
-    return redirect(url_for('admin_manage'))
+    if PROJECTS.update(proj_id, {'published': True}) is not None:
+        CHANGES.record('projects', proj_id)
+        _schedule_public_projects([proj_id])
+    return redirect(url_for('.admin_manage'))
 
 
-@app.route('/admin/unpublish/<proj_id>', methods=['POST'])
+@bp.route('/admin/unpublish/<proj_id>', methods=['POST'])
 def admin_unpublish(proj_id):
-    projects = _load_projects()
-    updated = False
-    for p in projects:
-        if str(p.get('id')) == str(proj_id):
-            p['published'] = False
-            updated = True
-            break
-    if updated:
-        _save_projects(projects)
-        _write_public_projects(projects)
-    return redirect(url_for('admin_manage'))
+    if PROJECTS.update(proj_id, {'published': False}) is not None:
+        CHANGES.record('projects', proj_id)
+        _schedule_public_projects([proj_id])
+    return redirect(url_for('.admin_manage'))
 
 
-@app.route('/admin/republish', methods=['POST'])
+@bp.route('/admin/republish', methods=['POST'])
 def admin_republish():
-    projects = _load_projects()
-    _write_public_projects(projects)
-    # Best-effort: mirror all files from server/uploads to assets/uploads so static site can access
-    try:
-        for root, _, files in os.walk(UPLOAD_ROOT):
-            for fn in files:
-                src = os.path.join(root, fn)
-                # compute relative path after UPLOAD_ROOT
-                rel = os.path.relpath(src, UPLOAD_ROOT)
-                _mirror_to_public(src, rel)
-    except Exception:
-        pass
-    return redirect(url_for('admin_manage'))
+    _schedule_public_projects()
+    # Copy new/changed files from server/uploads to assets/uploads so static site can access
+    _schedule_publish_uploads()
+    return redirect(url_for('.admin_manage'))
+
 
+@bp.route('/admin/republish/plan', methods=['GET'])
+def admin_republish_plan():
+    """Dry run: report which upload files and how many bytes a republish would transfer."""
+    return jsonify(_publish_uploads(dry_run=True))
 
-@app.route('/admin/update/<proj_id>', methods=['POST'])
+
+@bp.route('/admin/update/<proj_id>', methods=['POST'])
 def admin_update(proj_id):
     """Update simple ordering metadata (featured, priority) for a project."""
-    projects = _load_projects()
-    updated = False
-    for p in projects:
-        if str(p.get('id')) == str(proj_id):
-            # Featured checkbox
-            p['featured'] = bool(request.form.get('featured'))
-            # Priority as integer, default 0
-            prw = (request.form.get('priority') or '').strip()
-            try:
-                p['priority'] = int(prw) if prw != '' else 0
-            except Exception:
-                p['priority'] = 0
-            updated = True
-            break
+    # Featured checkbox
+    changes = {'featured': bool(request.form.get('featured'))}
+    # Priority as integer, default 0
+    prw = (request.form.get('priority') or '').strip()
+    try:
+        changes['priority'] = int(prw) if prw != '' else 0
+    except Exception:
+        changes['priority'] = 0
 
+    updated = PROJECTS.update(proj_id, changes) is not None
     if updated:
-        _save_projects(projects)
-        _write_public_projects(projects)
+        CHANGES.record('projects', proj_id)
+        _schedule_public_projects([proj_id])
     # If request prefers JSON (AJAX), return a JSON result; otherwise redirect back
     wants_json = ('application/json' in (request.headers.get('Accept') or '')) or (request.args.get('ajax') == '1')
     if wants_json:
         return jsonify({'ok': updated})
-    return redirect(url_for('admin_manage'))
+    return redirect(url_for('.admin_manage'))
 
 
-@app.route('/api/gallery', methods=['GET'])
+@bp.route('/admin/batch', methods=['POST'])
+def admin_batch():
+    """Apply many publish/featured/priority changes in one write.
+
+    Body: ``{"updates": [{"id": "...", "published": true, "featured": false, "priority": 5}, ...]}``;
+    each entry may set any subset of those fields. The public bundle is
+    regenerated once afterwards.
+    """
+    body = request.get_json(silent=True) or {}
+    updates = body.get('updates')
+    if not isinstance(updates, list):
+        return jsonify({'error': 'expected {"updates": [...]}'}), 400
+    changes_by_id = {}
+    for u in updates:
+        if not isinstance(u, dict) or not str(u.get('id') or '').strip():
+            return jsonify({'error': 'every update needs an id'}), 400
+        changes = {}
+        for field in BATCH_FIELDS:
+            if field not in u:
+                continue
+            if field == 'priority':
+                try:
+                    changes['priority'] = int(u['priority'] or 0)
+                except (TypeError, ValueError):
+                    return jsonify({'error': f"invalid priority for {u['id']!r}"}), 400
+            else:
+                changes[field] = bool(u[field])
+        # later entries for the same id win, field by field
+        changes_by_id.setdefault(str(u['id']).strip(), {}).update(changes)
+
+    results = PROJECTS.update_many(changes_by_id)
+    updated = [pid for pid, record in results.items() if record is not None]
+    missing = [pid for pid, record in results.items() if record is None]
+    if updated:
+        CHANGES.record('projects', updated)
+        _schedule_public_projects(updated)
+    return jsonify({'ok': not missing, 'updated': updated, 'missing': missing})
+
+
+@bp.route('/api/gallery', methods=['GET'])
 def api_gallery():
-    items = []
-    for p in _load_projects():
-        if p.get('main_image'):
-            items.append({
-                'url': p['main_image'],
-                'category': p.get('category', ''),
-                'tags': p.get('tags', []),
-                'projectId': p.get('id'),
-            })
-        for url in p.get('gallery_images', []) or []:
-            items.append({
-                'url': url,
-                'category': p.get('category', ''),
-                'tags': p.get('tags', []),
-                'projectId': p.get('id'),
-            })
-    return jsonify(items)
-
-
-@app.route('/uploads/<path:filename>')
+    def build():
+        if is_list_query(request.args, GALLERY_FILTERS):
+            return list_response(PROJECTS.gallery(), GALLERY_FILTERS, GALLERY_SORTS)
+        return json_response(PROJECTS.gallery_json_bytes())
+    return conditional(PROJECTS, 'gallery', build)
+
+
+@bp.route('/admin/jobs', methods=['GET'])
+def admin_jobs():
+    """Recent background jobs (``?status=queued|running|done|failed``, ``?limit=``) and counts."""
+    try:
+        limit = min(max(int(request.args.get('limit') or 50), 1), 500)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    return jsonify({'counts': JOBS.counts(), 'jobs': JOBS.list(request.args.get('status'), limit)})
+
+
+@bp.route('/admin/jobs/<int:job_id>', methods=['GET'])
+def admin_job(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify(job)
+
+
+@bp.route('/admin/blobs', methods=['GET'])
+def admin_blobs():
+    """Blob store totals: stored blobs, bytes, references and unreferenced blobs."""
+    return jsonify(BLOBS.stats())
+
+
+@bp.route('/admin/blobs/gc', methods=['POST'])
+def admin_blobs_gc():
+    """Queue a collection of unreferenced blobs now (instead of after the usual delay)."""
+    job_id = JOBS.enqueue('blob_gc', dedupe_key='blob_gc')
+    return jsonify({'queued': True, 'job_id': job_id}), 202
+
+
+@bp.route('/uploads/<path:filename>')
 def serve_uploads(filename):
-    return send_from_directory(UPLOAD_ROOT, filename)
+    return send_upload(UPLOAD_ROOT, filename)
 
 
-@app.route('/admin/upload', methods=['POST'])
+@bp.route('/admin/upload', methods=['POST'])
 def upload_project():
     # Basic form parsing
     proj_id = (request.form.get('id') or request.form.get('proj_id') or request.form.get('project_id') or '').strip()
@@ -256,49 +380,23 @@ def upload_project():
     if not proj_id:
         return 'Missing project id (form field name: id).', 400
 
-    projects = _load_projects()
-    if any(str(p.get('id')) == proj_id for p in projects):
+    if proj_id in PROJECTS:
         return f"Project with id '{proj_id}' already exists.", 400
 
-    # Create per-project upload dir
-    proj_dir = os.path.join(UPLOAD_ROOT, 'projects', secure_filename(proj_id))
-    os.makedirs(proj_dir, exist_ok=True)
-
-    # main image
-    main_image_url = ''
+    # main image plus additional gallery images (up to 15), streamed into the blob store
+    # concurrently; mirroring to assets/uploads happens in a background job
     image = request.files.get('image')
-    if image and allowed_file(image.filename):
-        filename = secure_filename(image.filename)
-        base, ext = os.path.splitext(filename)
-        dest_path = os.path.join(proj_dir, filename)
-        i = 1
-        while os.path.exists(dest_path):
-            filename = f"{base}-{i}{ext}"
-            dest_path = os.path.join(proj_dir, filename)
-            i += 1
-        image.save(dest_path)
-        main_image_url = f"/uploads/projects/{secure_filename(proj_id)}/{filename}"
-        # Mirror to assets/uploads for static site
-        _mirror_to_public(dest_path, f"projects/{secure_filename(proj_id)}/{filename}")
+    has_main = bool(image and allowed_file(image.filename))
+    files = [image] if has_main else []
+    files += [gf for gf in request.files.getlist('gallery_images')[:15] if gf and allowed_file(gf.filename)]
+    saved = BLOBS.put_many(files)
+    urls = list(saved)
+
+    if has_main:
+        main_image_url = urls.pop(0)
     else:
         main_image_url = request.form.get('image_url', '').strip()
-
-    # additional gallery images (up to 15)
-    gallery_urls = []
-    gallery_files = request.files.getlist('gallery_images')
-    for gf in gallery_files[:15]:
-        if gf and allowed_file(gf.filename):
-            gfn = secure_filename(gf.filename)
-            base, ext = os.path.splitext(gfn)
-            dest_path = os.path.join(proj_dir, gfn)
-            j = 1
-            while os.path.exists(dest_path):
-                gfn = f"{base}-{j}{ext}"
-                dest_path = os.path.join(proj_dir, gfn)
-                j += 1
-            gf.save(dest_path)
-            gallery_urls.append(f"/uploads/projects/{secure_filename(proj_id)}/{gfn}")
-            _mirror_to_public(dest_path, f"projects/{secure_filename(proj_id)}/{gfn}")
+    gallery_urls = urls
 
     new_project = {
         'id': proj_id,
@@ -319,16 +417,22 @@ def upload_project():
     if long_en or long_si or long_ta:
         new_project['longDescription'] = {'en': long_en, 'si': long_si, 'ta': long_ta}
 
-    projects.append(new_project)
-    _save_projects(projects)
+    if not PROJECTS.insert(new_project):
+        return f"Project with id '{proj_id}' already exists.", 400
+    BLOBS.set_refs(f'project:{proj_id}', record_blobs(new_project))
+    CHANGES.record('projects', proj_id)
+    SEARCH.add('projects', new_project, PROJECT_FIELDS)
+    if saved:
+        _schedule_publish_uploads()
+    _queue_derivatives(proj_id, ([main_image_url] if has_main else []) + gallery_urls)
+    schedule_translation('projects', [proj_id])
     if publish_now:
-        _write_public_projects(projects)
+        _schedule_public_projects([proj_id])
 
-    return redirect(url_for('admin_index'))
+    return redirect(url_for('.admin_index'))
 
 
 if __name__ == '__main__':
-    # Run on localhost port 5000 for admin use only
-    # Use debug=False and disable the reloader to avoid subprocesses that
-    # can make the server unreachable when launched in background.
-    app.run(host='127.0.0.1', port=5000, debug=False, use_reloader=False)
+    # The projects and news blueprints are served together by main.py
+    import runpy
+    runpy.run_module('main', run_name='__main__')
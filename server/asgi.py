@@ -0,0 +1,514 @@
+"""ASGI entry point for serving the admin apps under an async server.
+
+The public read endpoints (the plain project, gallery and news lists, single
+records) and the upload files are answered directly on the event loop:
+repository lookups run on a small thread pool, and bodies are written
+asynchronously, so a slow client holds a socket but not a thread. Files are
+planned by static_files.py (cached metadata, Range, precompressed and WebP
+copies) and go out through the server's ``http.response.pathsend`` /
+``zerocopysend`` extension (sendfile) when it offers one, otherwise as chunks
+read off the loop. The change
+feed's event stream (feed.py) is held open on the loop too, fed by one
+``ChangeHub`` per process, so idle subscribers cost no thread. Every
+other request (list queries, search, admin pages, uploads) is passed to the
+unchanged Flask app on the same thread pool, so behavior and data stay shared;
+its response is pulled from the WSGI iterator one chunk at a time on the
+pool and sent as it comes, so streamed bodies (NDJSON exports, backups) keep
+constant memory.
+
+Run from the server/ directory:
+
+  uvicorn asgi:app --port 5000
+  gunicorn -c gunicorn.conf.py asgi:app
+
+``SCCF_ASGI_THREADS`` sizes the thread pool (default 8).
+"""
+import asyncio
+import contextvars
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import metrics
+from feed import (HEARTBEAT, MAX_LIMIT, SSE_HEADERS, FeedError, parse_args, sse_event, sse_preamble,
+                  sse_reset)
+from http_cache import dataset_etag, is_fresh, store_validators, validator_headers
+from static_files import FILES, Plan
+
+ASGI_THREADS = int(os.environ.get('SCCF_ASGI_THREADS', '8'))
+FILE_CHUNK = 256 * 1024
+BODY_SPOOL = 1024 * 1024   # request bodies above this are spooled to disk for the WSGI app
+EXPOSE_HEADERS = 'X-Next-Cursor, Link'
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix='asgi')
+
+
+def _run(fn, *args):
+    return asyncio.get_running_loop().run_in_executor(_EXECUTOR, fn, *args)
+
+
+def _header_map(scope):
+    return {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+
+
+async def _respond(send, status, headers, body=b'', head=False):
+    raw = [(k.lower().encode('latin-1'), str(v).encode('latin-1')) for k, v in headers.items()]
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw})
+    await send({'type': 'http.response.body', 'body': b'' if head else body})
+
+
+class AsgiApp:
+    """Fast paths for hot GET routes in front of a Flask (WSGI) app.
+
+    ``datasets`` maps a path regex and route label to ``(repo, etag name,
+    build)`` where ``build(match)`` returns ``(status, body bytes)``; it only
+    serves requests without a query string. ``files`` maps a path regex and
+    route label to an upload root; the first group is the file path below it.
+    The route labels are the Flask rules of the same endpoints, so fast-path
+    requests are counted under the same route in the metrics. ``cors`` maps a
+    path regex to the allowed origins (a list, or ``'*'``); the first match
+    applies. ``streams`` maps a path regex and route label to a ``ChangeHub``
+    whose entries are sent as Server-Sent Events.
+    """
+
+    def __init__(self, flask_app, datasets, files, cors, streams=()):
+        self.flask_app = flask_app
+        self.datasets = [(re.compile(p), route, spec) for p, route, spec in datasets]
+        self.files = [(re.compile(p), route, root) for p, route, root in files]
+        self.cors = [(re.compile(p), origins) for p, origins in cors]
+        self.streams = [(re.compile(p), route, hub) for p, route, hub in streams]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        method = scope['method']
+        path = scope['path']
+        if method in ('GET', 'HEAD'):
+            started = time.perf_counter()
+            headers = _header_map(scope)
+            for pattern, route, root in self.files:
+                m = pattern.match(path)
+                if m:
+                    status = await self._send_file(scope, send, root, m.group(1), headers)
+                    metrics.observe_request(method, route, status, time.perf_counter() - started)
+                    return
+            for pattern, route, hub in self.streams:
+                if pattern.match(path):
+                    status = await self._send_stream(scope, receive, send, hub, headers)
+                    metrics.observe_request(method, route, status, time.perf_counter() - started)
+                    return
+            if not scope.get('query_string'):
+                for pattern, route, spec in self.datasets:
+                    m = pattern.match(path)
+                    if m:
+                        status = await self._send_dataset(send, spec, m, path, headers, method == 'HEAD')
+                        metrics.observe_request(method, route, status, time.perf_counter() - started)
+                        return
+        await self._call_wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _cors(self, path, headers, req_headers):
+        origin = req_headers.get('origin')
+        if not origin:
+            return
+        allowed = next((origins for pattern, origins in self.cors if pattern.match(path)), ())
+        if allowed == '*':
+            headers['Access-Control-Allow-Origin'] = '*'
+        elif origin in allowed:
+            headers['Access-Control-Allow-Origin'] = origin
+            headers['Vary'] = 'Origin'
+        else:
+            return
+        headers['Access-Control-Expose-Headers'] = EXPOSE_HEADERS
+
+    async def _send_dataset(self, send, spec, match, path, req_headers, head):
+        repo, name, build = spec
+
+        def work():
+            version, last_modified = store_validators(repo.store)
+            # same validator as the Flask handlers (request.full_path ends with '?')
+            etag = dataset_etag(name, version, path + '?')
+            headers = validator_headers(etag, last_modified)
+            if is_fresh(req_headers.get('if-none-match'), req_headers.get('if-modified-since'),
+                        etag, last_modified):
+                return 304, headers, b''
+            status, body = build(match)
+            if status != 200:
+                headers = {}
+            headers['Content-Type'] = 'application/json'
+            headers['Content-Length'] = str(len(body))
+            return status, headers, body
+
+        status, headers, body = await _run(work)
+        self._cors(path, headers, req_headers)
+        await _respond(send, status, headers, body, head)
+        return status
+
+    async def _send_file(self, scope, send, root, rel, req_headers):
+        head = scope['method'] == 'HEAD'
+        plan = await _run(FILES.plan, root, rel, req_headers)
+        extensions = scope.get('extensions') or {}
+        pathsend = plan.status == 200 and 'http.response.pathsend' in extensions
+        f = None
+        if plan.path is not None and not head and not pathsend:
+            try:
+                f = await _run(open, plan.path, 'rb')
+            except OSError:  # removed since its metadata was cached
+                FILES.forget(root, rel)
+                plan = Plan(404, {'Content-Type': 'text/plain'})
+        if plan.status == 404:
+            await _respond(send, 404, plan.headers, b'Not Found', head)
+            return 404
+        raw = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in plan.headers.items()]
+        await send({'type': 'http.response.start', 'status': plan.status, 'headers': raw})
+        if pathsend and not head:
+            await send({'type': 'http.response.pathsend', 'path': plan.path})
+            return plan.status
+        if f is None:
+            await send({'type': 'http.response.body', 'body': b''})
+            return plan.status
+        try:
+            if 'http.response.zerocopysend' in extensions:
+                await send({'type': 'http.response.zerocopysend', 'file': f.fileno(),
+                            'offset': plan.offset, 'count': plan.length})
+                return plan.status
+            await _run(f.seek, plan.offset)
+            remaining = plan.length
+            while remaining > 0:
+                chunk = await _run(f.read, min(FILE_CHUNK, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            await _run(f.close)
+        return plan.status
+
+    async def _send_stream(self, scope, receive, send, hub, req_headers):
+        args = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        try:
+            since, _, collection = parse_args(args, req_headers.get('last-event-id'))
+        except FeedError as e:
+            body = _json_body(self.flask_app, {'error': str(e)})
+            await _respond(send, 400, {'Content-Type': 'application/json', 'Content-Length': len(body)}, body)
+            return 400
+        headers = {'Content-Type': 'text/event-stream', **SSE_HEADERS}
+        self._cors(scope['path'], headers, req_headers)
+        if scope['method'] == 'HEAD':
+            await _respond(send, 200, headers, head=True)
+            return 200
+
+        await hub.subscribe()
+        disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+        try:
+            raw = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers.items()]
+            await send({'type': 'http.response.start', 'status': 200, 'headers': raw})
+            await send({'type': 'http.response.body', 'body': sse_preamble(), 'more_body': True})
+            position = hub.latest if since is None else since
+            while not disconnected.done():
+                changed = hub.changed
+                entries = hub.entries_after(position)
+                if entries is None:  # further back than the hub's buffer
+                    entries, latest, complete = await _run(hub.log.since, position, MAX_LIMIT, collection)
+                    if not complete:
+                        await send({'type': 'http.response.body', 'body': sse_reset(latest), 'more_body': True})
+                        position = latest
+                        continue
+                    position = entries[-1]['seq'] if len(entries) == MAX_LIMIT else latest
+                else:
+                    position = max(position, hub.latest)
+                body = b''.join(sse_event(e) for e in entries if collection in (None, e['collection']))
+                if body:
+                    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+                    continue
+                waiter = asyncio.ensure_future(changed.wait())
+                done, _ = await asyncio.wait({waiter, disconnected}, timeout=HEARTBEAT,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if not done:
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+        except OSError:  # client went away mid-send
+            pass
+        finally:
+            disconnected.cancel()
+            hub.unsubscribe()
+        return 200
+
+    async def _call_wsgi(self, scope, receive, send):
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return
+            chunk = message.get('body', b'')
+            if chunk:
+                await _run(body.write, chunk)
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+        # every step of one response runs in the same context, whichever pool thread takes it
+        ctx = contextvars.copy_context()
+        result = None
+        try:
+            status, headers, written, result = await _run(ctx.run, _run_wsgi, self.flask_app,
+                                                          _environ(scope, body))
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            while True:
+                while written:    # from the iterator or the app's ``write`` callable
+                    await send({'type': 'http.response.body', 'body': written.pop(0), 'more_body': True})
+                chunk = await _run(ctx.run, next, result, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    written.append(chunk)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                await _run(ctx.run, result.close)
+            body.close()
+
+
+async def _wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class ChangeHub:
+    """Fans new change log entries out to every event stream of this process.
+
+    A single poller task reads new entries once, woken at once by writes made
+    in this process and otherwise every ``poll`` seconds for the other
+    workers' writes, then wakes all subscribers together. Subscribers are
+    coroutines waiting on ``changed``; the newest ``backlog`` entries are kept
+    so they rarely need the database themselves. The poller only runs while
+    someone is subscribed.
+    """
+
+    def __init__(self, log, poll=1.0, backlog=1000):
+        self.log = log
+        self.poll = poll
+        self.recent = deque(maxlen=backlog)
+        self.latest = 0
+        self.changed = None
+        self._subscribers = 0
+        self._task = None
+        self._loop = None
+        self._wake = None
+        self._ready = None
+
+    def _on_write(self, seq):
+        # called by ChangeLog.record on whichever thread wrote
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake.set)
+
+    async def subscribe(self):
+        """Register a stream; returns once ``latest`` is current. Pair with ``unsubscribe``."""
+        self._subscribers += 1
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self.changed = asyncio.Event()
+            self._ready = self._loop.create_future()
+            self._task = asyncio.ensure_future(self._run())
+        try:
+            await asyncio.shield(self._ready)
+        except BaseException:
+            self._subscribers -= 1
+            raise
+
+    def unsubscribe(self):
+        self._subscribers -= 1
+
+    def entries_after(self, seq):
+        """Buffered entries after ``seq``, or None when the buffer does not reach back that far."""
+        if seq == self.latest:
+            return []
+        if seq > self.latest:  # from another log, or ahead of this poller: ask the database
+            return None
+        if self.recent and self.recent[0]['seq'] <= seq + 1:
+            return [e for e in self.recent if e['seq'] > seq]
+        return None
+
+    async def _run(self):
+        try:
+            self.recent.clear()
+            self.latest = await _run(self.log.latest)
+            self.log.add_listener(self._on_write)
+            self._ready.set_result(None)
+            while self._subscribers > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                entries, latest, complete = await _run(self.log.since, self.latest, MAX_LIMIT)
+                if not complete:
+                    self.recent.clear()
+                else:
+                    self.recent.extend(entries)
+                    if len(entries) == MAX_LIMIT:
+                        latest = entries[-1]['seq']
+                        self._wake.set()
+                if latest != self.latest:
+                    self.latest = latest
+                    changed, self.changed = self.changed, asyncio.Event()
+                    changed.set()
+        except Exception as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+            raise
+        finally:
+            self.log.remove_listener(self._on_write)
+            self._task = None
+
+
+def _environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': None,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            key = name
+        else:
+            key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _run_wsgi(wsgi_app, environ):
+    """Start ``wsgi_app``: ``(status, headers, chunks so far, body iterator)``.
+
+    Iterates only until ``start_response`` has been called (an app may defer
+    it to its first chunk); the rest of the body is left in the iterator, which
+    the caller must close.
+    """
+    environ['wsgi.errors'] = sys.stderr
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        return lambda data: chunks.append(data)
+
+    chunks = []
+    result = wsgi_app(environ, start_response)
+    body = iter(result)
+    try:
+        while 'status' not in started:
+            data = next(body, None)
+            if data is None:
+                break
+            if data:
+                chunks.append(data)
+    except BaseException:
+        if hasattr(result, 'close'):
+            result.close()
+        raise
+    return started['status'], started['headers'], chunks, _Body(body, result)
+
+
+class _Body:
+    """A WSGI response iterator that keeps the ``close`` of the original result."""
+
+    def __init__(self, body, result):
+        self._body = body
+        self._result = result
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._body)
+
+    def close(self):
+        if hasattr(self._result, 'close'):
+            self._result.close()
+
+
+def _json_body(flask_app, obj):
+    # byte-identical to Flask's jsonify, so both paths agree under one ETag
+    return (flask_app.json.dumps(obj) + '\n').encode('utf-8')
+
+
+def create_asgi_app(flask_app=None):
+    """Wrap the unified Flask app (main.create_app) with the async fast paths."""
+    from main import create_app
+    from services import CHANGES, NEWS, PROJECTS
+
+    flask_app = flask_app or create_app()
+    config = flask_app.config
+
+    def project_detail(m):
+        record = PROJECTS.get(m.group(1))
+        if record is None:
+            return 404, _json_body(flask_app, {'error': 'Not found'})
+        return 200, _json_body(flask_app, record)
+
+    def news_detail(m):
+        article = NEWS.get_full(m.group(1))
+        if not article:
+            return 404, _json_body(flask_app, {'error': 'Article not found'})
+        return 200, _json_body(flask_app, article)
+
+    return AsgiApp(
+        flask_app,
+        datasets=[
+            (r'^/api/projects$', '/api/projects', (PROJECTS, 'projects', lambda m: (200, PROJECTS.json_bytes()))),
+            (r'^/api/projects/([^/]+)$', '/api/projects/<proj_id>', (PROJECTS, 'projects', project_detail)),
+            (r'^/api/gallery$', '/api/gallery', (PROJECTS, 'gallery', lambda m: (200, PROJECTS.gallery_json_bytes()))),
+            (r'^/api/news$', '/api/news', (NEWS, 'news', lambda m: (200, NEWS.json_bytes()))),
+            (r'^/api/news/(?!search$)([^/]+)$', '/api/news/<news_id>', (NEWS, 'news', news_detail)),
+        ],
+        # most specific first: news uploads live outside UPLOAD_ROOT
+        files=[
+            (r'^/uploads/news/(.+)$', '/uploads/news/<path:filename>', config['NEWS_UPLOAD_DIR']),
+            (r'^/uploads/(.+)$', '/uploads/<path:filename>', config['UPLOAD_ROOT']),
+        ],
+        cors=[
+            (r'^/api/news', '*'),
+            (r'^/api/', config['CORS_ORIGINS']),
+        ],
+        streams=[
+            (r'^/api/changes/stream$', '/api/changes/stream', ChangeHub(CHANGES)),
+        ],
+    )
+
+
+app = create_asgi_app()
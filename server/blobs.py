@@ -0,0 +1,276 @@
+"""Content-addressed upload storage shared by the projects and news apps.
+
+Each uploaded file is hashed (SHA-256) while it streams in and stored once as
+``<h[:2]>/<hash>.<ext>`` under the blob root, which lives in the upload root
+and is served at ``/uploads/blobs/...``. The same photo used by several
+projects or articles is one file on disk and is mirrored to assets/uploads
+once. Uploads up to ``SPOOL_BYTES`` stay in memory until the hash is known,
+so a duplicate of one is never written; bigger ones spill to a temporary
+file that is dropped if the blob already exists.
+
+A blob URL names its content, so it never changes meaning and is served with
+a one-year immutable ``Cache-Control``. The records that use a blob are
+tracked as ``(blob, owner)`` rows in SQLite, with owners such as
+``project:<id>`` or ``news:<id>``. A blob's refcount is its number of owners.
+``gc`` deletes blobs with no owner, together with their image variants, once
+they have not been uploaded for ``GC_GRACE`` seconds. A blob saved by a request
+that has not stored its record yet is therefore never collected.
+"""
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+import metrics
+from images import DERIVED_DIR
+from storage import atomic_write_bytes
+from uploads import CHUNK_SIZE, save_many
+
+SPOOL_BYTES = 8 * 1024 * 1024
+GC_GRACE = 3600          # unreferenced blobs younger than this are kept
+_EXT_ALIASES = {'jpeg': 'jpg'}
+_BLOB_NAME = re.compile(r'^([0-9a-f]{64})\.[a-z0-9]+$')
+
+PUTS = metrics.counter('sccf_blob_puts_total', 'Uploaded files by outcome (stored/duplicate).', ('result',))
+
+
+def blob_urls(value, prefix):
+    """Every string under ``prefix`` found anywhere in a record (nested lists/dicts included)."""
+    if isinstance(value, str):
+        if value.startswith(prefix):
+            yield value
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            yield from blob_urls(k, prefix)
+            yield from blob_urls(v, prefix)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from blob_urls(v, prefix)
+
+
+class BlobStore:
+    def __init__(self, root, url_prefix, db_path):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip('/') + '/'
+        self.path = db_path
+        os.makedirs(root, exist_ok=True)
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        self._conn().executescript('''
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                ext TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                seen REAL NOT NULL,
+                variants TEXT
+            );
+            CREATE TABLE IF NOT EXISTS blob_refs (
+                hash TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                PRIMARY KEY (hash, owner)
+            );
+            CREATE INDEX IF NOT EXISTS blob_refs_owner ON blob_refs(owner);
+        ''')
+
+    def _rel(self, digest, ext):
+        return f'{digest[:2]}/{digest}.{ext}'
+
+    def url(self, digest, ext):
+        return self.url_prefix + self._rel(digest, ext)
+
+    def owns(self, url):
+        return isinstance(url, str) and url.startswith(self.url_prefix)
+
+    def _hash_of(self, url):
+        """The blob hash in a blob URL; None for anything else (variants, other uploads)."""
+        if not self.owns(url):
+            return None
+        m = _BLOB_NAME.match(url.rsplit('/', 1)[-1])
+        return m.group(1) if m else None
+
+    def is_blob(self, url):
+        """Whether ``url`` names a stored blob itself (not one of its variants)."""
+        return self._hash_of(url) is not None
+
+    def local_path(self, url):
+        """Absolute path of a blob URL."""
+        return os.path.join(self.root, *url[len(self.url_prefix):].split('/'))
+
+    def put(self, file_storage, filename):
+        """Store an uploaded file; returns its URL (the existing blob's URL for a duplicate)."""
+        return self.put_stream(file_storage.stream, filename)
+
+    def put_stream(self, stream, filename):
+        """Store the bytes read from ``stream``, named like ``filename``; returns the blob URL."""
+        ext = ''.join(c for c in filename.rsplit('.', 1)[-1].lower() if c.isascii() and c.isalnum())
+        ext = _EXT_ALIASES.get(ext, ext) if '.' in filename and ext else 'bin'
+        digest = hashlib.sha256()
+        buffered, size = [], 0
+        spill = spill_path = None
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                if spill is None and size > SPOOL_BYTES:
+                    spill_path = os.path.join(self.root, f'.{uuid.uuid4().hex}.part')
+                    spill = open(spill_path, 'wb')
+                    spill.writelines(buffered)
+                    buffered = []
+                if spill is None:
+                    buffered.append(chunk)
+                else:
+                    spill.write(chunk)
+            if spill is not None:
+                spill.flush()
+                os.fsync(spill.fileno())
+                spill.close()
+            return self._commit(digest.hexdigest(), ext, size, b''.join(buffered), spill_path)
+        finally:
+            if spill is not None:
+                spill.close()
+                try:
+                    os.remove(spill_path)
+                except OSError:
+                    pass
+
+    def _commit(self, digest, ext, size, data, spill_path):
+        now = time.time()
+        conn = self._conn()
+        # held while the file is written, so gc can't remove a blob we are about to reuse
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT ext FROM blobs WHERE hash = ?', (digest,)).fetchone()
+            if row is not None:
+                ext = row['ext']
+            path = os.path.join(self.root, *self._rel(digest, ext).split('/'))
+            duplicate = os.path.isfile(path)
+            if not duplicate:
+                if spill_path is not None:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(spill_path, path)
+                else:
+                    atomic_write_bytes(path, data)
+            conn.execute(
+                'INSERT INTO blobs (hash, ext, size, created, seen) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(hash) DO UPDATE SET seen = excluded.seen',
+                (digest, ext, size, now, now))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        PUTS.inc('duplicate' if duplicate else 'stored')
+        return self.url(digest, ext)
+
+    def put_many(self, files):
+        """Store several uploads concurrently; returns their URLs in order."""
+        return save_many(((f, f.filename) for f in files), save=self.put)
+
+    def set_refs(self, owner, urls):
+        """Make ``owner`` reference exactly the blob URLs among ``urls``."""
+        return self.set_refs_many({owner: urls})
+
+    def set_refs_many(self, refs_by_owner):
+        """``set_refs`` for every ``{owner: urls}`` item in one transaction; returns the reference count."""
+        total = 0
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for owner, urls in refs_by_owner.items():
+                hashes = {self._hash_of(u) for u in urls} - {None}
+                conn.execute('DELETE FROM blob_refs WHERE owner = ?', (owner,))
+                conn.executemany('INSERT OR IGNORE INTO blob_refs (hash, owner) VALUES (?, ?)',
+                                 ((h, owner) for h in hashes))
+                total += len(hashes)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return total
+
+    def release(self, owner):
+        """Drop every reference held by ``owner``; returns how many there were."""
+        return self._conn().execute('DELETE FROM blob_refs WHERE owner = ?', (owner,)).rowcount
+
+    def refcount(self, url):
+        return self._conn().execute('SELECT COUNT(*) FROM blob_refs WHERE hash = ?',
+                                    (self._hash_of(url),)).fetchone()[0]
+
+    def variants(self, url):
+        """Image variant metadata rendered earlier for this blob, or None."""
+        row = self._conn().execute('SELECT variants FROM blobs WHERE hash = ?', (self._hash_of(url),)).fetchone()
+        return json.loads(row['variants']) if row is not None and row['variants'] else None
+
+    def set_variants(self, url, meta):
+        self._conn().execute('UPDATE blobs SET variants = ? WHERE hash = ?',
+                             (json.dumps(meta, ensure_ascii=False), self._hash_of(url)))
+
+    def stats(self):
+        row = self._conn().execute(
+            'SELECT COUNT(*) AS blobs, COALESCE(SUM(size), 0) AS bytes, '
+            'COALESCE(SUM(CASE WHEN NOT EXISTS (SELECT 1 FROM blob_refs r WHERE r.hash = blobs.hash) '
+            'THEN 1 ELSE 0 END), 0) AS unreferenced FROM blobs').fetchone()
+        refs = self._conn().execute('SELECT COUNT(*) FROM blob_refs').fetchone()[0]
+        return {'blobs': row['blobs'], 'bytes': row['bytes'], 'unreferenced': row['unreferenced'],
+                'references': refs}
+
+    def gc(self, grace=GC_GRACE, keep=()):
+        """Delete unreferenced blobs not uploaded within ``grace`` seconds.
+
+        URLs in ``keep`` survive even without a reference row (a safety net
+        for records edited outside the apps). Returns counts of what was removed.
+        """
+        keep = {self._hash_of(u) for u in keep} - {None}
+        cutoff = time.time() - grace
+        removed = freed = 0
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                'SELECT hash, ext, size FROM blobs WHERE seen < ? AND NOT EXISTS '
+                '(SELECT 1 FROM blob_refs r WHERE r.hash = blobs.hash)', (cutoff,)).fetchall()
+            for row in rows:
+                if row['hash'] in keep:
+                    continue
+                self._remove_files(row['hash'], row['ext'])
+                conn.execute('DELETE FROM blobs WHERE hash = ?', (row['hash'],))
+                removed += 1
+                freed += row['size']
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return {'removed': removed, 'bytes': freed}
+
+    def _remove_files(self, digest, ext):
+        path = os.path.join(self.root, *self._rel(digest, ext).split('/'))
+        # images.render names variants '<name with dots as underscores>-<width>.<format>',
+        # plus '<name with dots as underscores>.webp' at full size
+        stem = os.path.basename(path).replace('.', '_')
+        pattern = os.path.join(glob.escape(os.path.join(os.path.dirname(path), DERIVED_DIR)), stem + '[-.]*')
+        for p in [path] + glob.glob(pattern):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
@@ -0,0 +1,397 @@
+"""Bulk NDJSON export and import of projects and news, and full backups.
+
+Creating records one form at a time rewrites the whole data file for every
+record, so restoring a few thousand of them is quadratic. These endpoints
+move many records at once:
+
+  GET  /admin/bulk/<collection>.ndjson   one JSON record per line (news with content)
+  POST /admin/bulk/<collection>.ndjson   import such a body (?mode=upsert|insert, ?dry_run=1)
+  GET  /admin/bulk/backup.tar            every referenced /uploads/... file, then both collections
+  POST /admin/bulk/backup.tar            restore such an archive (same parameters)
+
+Exports stream from the cached records one line at a time. Imports are read
+line by line and validated ``BATCH_SIZE`` records at a time. Nothing is
+written unless every line is valid. Each collection is then written in one
+locked store write (one file rewrite or one SQLite transaction), followed by
+one change-log append and one blob-reference update.
+
+An archive lists the upload files before the NDJSON members, so a restore
+has the files in place before the records that use them are committed.
+Blob files are hashed again on the way in, and one whose content does not
+match its name is rejected. scripts/bulk_tools.py runs the same code from
+the command line.
+"""
+import json
+import os
+import tarfile
+import tempfile
+import time
+import uuid
+
+from flask import Blueprint, Response, jsonify, request
+from werkzeug.security import safe_join
+from werkzeug.wsgi import get_input_stream
+
+from blobs import blob_urls
+from changes import COLLECTIONS
+from config import Config
+from repository import normalize_id
+from services import (BLOBS, CHANGES, JOBS, NEWS, PROJECTS, record_blobs, schedule_blob_gc, schedule_prerender,
+                      schedule_translation)
+from uploads import CHUNK_SIZE
+
+bp = Blueprint('bulk', __name__)
+
+BATCH_SIZE = 500
+MAX_ERRORS = 100          # an import stops reading once this many problems were found
+MODES = ('upsert', 'insert')
+NDJSON_MIMETYPE = 'application/x-ndjson'
+UPLOADS_PREFIX = '/uploads/'
+NEWS_UPLOADS_PREFIX = '/uploads/news/'
+_REPOS = {'projects': PROJECTS, 'news': NEWS}
+_OWNERS = {'projects': 'project', 'news': 'news'}
+_NONE = type(None)
+# accepted types per field; other fields pass through untouched
+_FIELDS = {
+    'projects': {'id': str, 'title': (dict, str), 'summary': (dict, str), 'category': str, 'status': str,
+                 'featured': bool, 'priority': int, 'published': bool, 'main_image': (str, _NONE),
+                 'gallery_images': list, 'tags': list, 'stat1': dict, 'stat2': dict,
+                 'longDescription': dict, 'image_variants': dict},
+    'news': {'id': str, 'title': str, 'category': str, 'content': str, 'author': str, 'excerpt': str,
+             'image': (str, _NONE), 'images': list, 'date': str, 'image_variants': dict},
+}
+# required and non-empty, as the admin forms require them
+_REQUIRED = {'projects': ('id',), 'news': ('id', 'title', 'category', 'content')}
+# image URLs must name a stored upload: jobs later read, mirror and delete the files behind them
+_IMAGE_FIELDS = {'projects': ('main_image', 'image', 'gallery_images'), 'news': ('image', 'images')}
+
+
+class BulkError(ValueError):
+    pass
+
+
+def parse_options(args):
+    """``(mode, dry_run)`` from query args; raises BulkError."""
+    mode = args.get('mode') or 'upsert'
+    if mode not in MODES:
+        raise BulkError(f"mode must be one of {', '.join(MODES)}")
+    return mode, args.get('dry_run') in ('1', 'true', 'yes')
+
+
+def _dump_line(record):
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def export_records(collection):
+    """Yield the records of ``collection`` as stored, news with its ``content``."""
+    repo = _REPOS[collection]
+    for record in repo.records():
+        yield NEWS.expand(record) if repo is NEWS else record
+
+
+def export_lines(collection):
+    """``export_records`` as NDJSON lines (bytes)."""
+    return (_dump_line(r) for r in export_records(collection))
+
+
+def _problem(collection, record):
+    """What is wrong with one parsed record, or None."""
+    if not isinstance(record, dict):
+        return 'expected a JSON object'
+    for field in _REQUIRED[collection]:
+        value = record.get(field)
+        if not isinstance(value, str) or not value.strip():
+            return f'{field} is required'
+    for field, types in _FIELDS[collection].items():
+        value = record.get(field)
+        if field in record and (not isinstance(value, types) or (types is int and isinstance(value, bool))):
+            return f'{field} has the wrong type'
+    for field in _IMAGE_FIELDS[collection]:
+        value = record.get(field)
+        for url in value if isinstance(value, list) else [value]:
+            if url and not (isinstance(url, str) and (BLOBS.is_blob(url) or upload_local_path(url))):
+                return f'{field} must be an /uploads/ URL inside the upload folders'
+    return None
+
+
+def _validate(collection, batch, seen, records, errors):
+    for line_no, record in batch:
+        problem = _problem(collection, record)
+        if problem is None:
+            record['id'] = normalize_id(record['id'])
+            if record['id'] in seen:
+                problem = f"duplicate id {record['id']!r}"
+        if problem is not None:
+            errors.append({'line': line_no, 'error': problem})
+            continue
+        seen.add(record['id'])
+        records.append(record)
+
+
+def read_records(lines, collection):
+    """Parse and validate NDJSON ``lines`` (bytes or str); returns ``(records, errors)``.
+
+    Blank lines are ignored. Reading stops early once ``MAX_ERRORS``
+    problems were found.
+    """
+    records, errors, seen, batch = [], [], set(), []
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            batch.append((line_no, json.loads(line)))
+        except ValueError as e:
+            errors.append({'line': line_no, 'error': f'invalid JSON: {e}'})
+        if len(batch) >= BATCH_SIZE:
+            _validate(collection, batch, seen, records, errors)
+            batch = []
+        if len(errors) >= MAX_ERRORS:
+            break
+    _validate(collection, batch, seen, records, errors)
+    errors.sort(key=lambda e: e['line'])
+    return records, errors[:MAX_ERRORS]
+
+
+def commit(collection, records, mode='upsert'):
+    """Write validated ``records`` in one store write, then do the follow-up bookkeeping once.
+
+    Returns ``{'inserted': n, 'replaced': n, 'skipped': [ids]}``; ``insert``
+    mode skips ids that already exist instead of replacing them.
+    """
+    inserted, replaced, skipped = _REPOS[collection].upsert_many(records, replace=mode == 'upsert')
+    written = inserted + replaced
+    if written:
+        CHANGES.record(collection, written)
+        taken = set(skipped)
+        BLOBS.set_refs_many({f"{_OWNERS[collection]}:{r['id']}": list(record_blobs(r))
+                             for r in records if r['id'] not in taken})
+        JOBS.enqueue('publish_uploads', dedupe_key='publish_uploads')
+        schedule_translation(collection, written)
+        if collection == 'projects':
+            # replaces any waiting partial regeneration
+            JOBS.enqueue('public_projects', {'all': True}, dedupe_key='public_projects')
+        else:
+            schedule_prerender()
+        if replaced:
+            schedule_blob_gc()
+            if collection == 'news' and hasattr(NEWS.store, 'compact'):
+                JOBS.enqueue('news_compact', dedupe_key='news_compact')
+    return {'inserted': len(inserted), 'replaced': len(replaced), 'skipped': skipped}
+
+
+def upload_local_path(url):
+    """Where the file behind an ``/uploads/...`` URL lives, or None if it is outside the upload roots."""
+    if url.startswith(NEWS_UPLOADS_PREFIX):
+        return safe_join(Config.NEWS_UPLOAD_DIR, url[len(NEWS_UPLOADS_PREFIX):])
+    if url.startswith(UPLOADS_PREFIX):
+        return safe_join(Config.UPLOAD_ROOT, url[len(UPLOADS_PREFIX):])
+    return None
+
+
+def restore_file(url, stream):
+    """Store the upload file for ``url`` from ``stream``; raises BulkError.
+
+    Blobs go straight into the blob store: they are named by their content, so
+    an extra one replaces nothing. Any other file is only staged next to its
+    target; the ``(staged path, target path)`` returned is moved into place by
+    ``install_files`` (None for blobs).
+    """
+    if BLOBS.is_blob(url):
+        if BLOBS.put_stream(stream, url) != url:
+            raise BulkError('content does not match the blob name')
+        return None
+    path = upload_local_path(url)
+    if path is None:
+        raise BulkError('not an upload path')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{uuid.uuid4().hex[:8]}.part'
+    try:
+        with open(tmp, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                out.write(chunk)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return tmp, path
+
+
+def install_files(staged):
+    """Move files staged by ``restore_file`` over their targets."""
+    for tmp, path in staged:
+        os.replace(tmp, path)
+    staged.clear()
+
+
+def discard_files(staged):
+    for tmp, _ in staged:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+    staged.clear()
+
+
+def _tar_entry(name, f, size, mtime):
+    """Header, ``size`` bytes of ``f`` and padding of one archive member."""
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(mtime)
+    info.mode = 0o644
+    yield info.tobuf(format=tarfile.PAX_FORMAT)
+    left = size
+    while left > 0:
+        chunk = f.read(min(CHUNK_SIZE, left))
+        if not chunk:
+            # the file shrank after its size was taken: keep the archive readable
+            yield b'\0' * left
+            break
+        left -= len(chunk)
+        yield chunk
+    yield b'\0' * (-size % tarfile.BLOCKSIZE)
+
+
+def _upload_entry(url):
+    path = upload_local_path(url)
+    try:
+        f = open(path, 'rb') if path else None
+    except OSError:
+        f = None
+    if f is None:
+        return   # e.g. variants that were never rendered: the record still restores
+    with f:
+        st = os.fstat(f.fileno())
+        yield from _tar_entry(url[1:], f, st.st_size, st.st_mtime)
+
+
+def backup_chunks():
+    """Yield a tar archive: every upload file the records reference, then ``<collection>.ndjson`` each.
+
+    The records are spooled to temporary files while their uploads are
+    streamed out, because a tar header needs a member's size up front.
+    """
+    seen, spools = set(), []
+    try:
+        for collection in COLLECTIONS:
+            spool = tempfile.TemporaryFile()
+            spools.append((collection, spool))
+            for record in export_records(collection):
+                spool.write(_dump_line(record))
+                for url in blob_urls(record, UPLOADS_PREFIX):
+                    if url not in seen:
+                        seen.add(url)
+                        yield from _upload_entry(url)
+        for collection, spool in spools:
+            size = spool.tell()
+            spool.seek(0)
+            yield from _tar_entry(f'{collection}.ndjson', spool, size, time.time())
+        yield b'\0' * (2 * tarfile.BLOCKSIZE)
+    finally:
+        for _, spool in spools:
+            spool.close()
+
+
+def restore(fileobj, mode='upsert', dry_run=False):
+    """Restore an archive from ``backup_chunks``, read from ``fileobj`` as a stream.
+
+    Upload files are stored as they arrive (unless ``dry_run``), but files
+    other than blobs replace the live ones only when the records are
+    committed at the end, and only if no member had a problem; otherwise the
+    staged copies are dropped. Raises ``tarfile.TarError`` for something that
+    is not a tar archive.
+    """
+    staged = []
+    try:
+        return _restore(fileobj, mode, dry_run, staged)
+    finally:
+        discard_files(staged)   # whatever was not installed
+
+
+def _restore(fileobj, mode, dry_run, staged):
+    pending, errors, files = {}, [], 0
+    with tarfile.open(fileobj=fileobj, mode='r|*') as tar:
+        for member in tar:
+            name = member.name
+            collection = name[:-len('.ndjson')] if name.endswith('.ndjson') else None
+            if member.isdir():
+                continue
+            if not member.isfile():
+                errors.append({'member': name, 'error': 'not a regular file'})
+            elif collection in COLLECTIONS:
+                records, problems = read_records(tar.extractfile(member), collection)
+                pending[collection] = records
+                errors += [{'member': name, **p} for p in problems]
+            elif name.startswith(UPLOADS_PREFIX[1:]):
+                try:
+                    if not dry_run:
+                        staged_file = restore_file('/' + name, tar.extractfile(member))
+                        if staged_file is not None:
+                            staged.append(staged_file)
+                    files += 1
+                except BulkError as e:
+                    errors.append({'member': name, 'error': str(e)})
+            else:
+                errors.append({'member': name, 'error': 'unexpected member'})
+            if len(errors) >= MAX_ERRORS:
+                break
+    report = {'ok': not errors, 'files': files, 'records': {c: len(r) for c, r in pending.items()},
+              'errors': errors[:MAX_ERRORS]}
+    if errors or dry_run:
+        return report
+    install_files(staged)
+    report['committed'] = {c: commit(c, records, mode) for c, records in pending.items()}
+    if files:
+        JOBS.enqueue('publish_uploads', dedupe_key='publish_uploads')
+    return report
+
+
+def _body_stream():
+    # the whole point is bodies bigger than MAX_CONTENT_LENGTH, which is meant for form uploads
+    return get_input_stream(request.environ)
+
+
+@bp.route('/admin/bulk/<collection>.ndjson', methods=['GET'])
+def export_ndjson(collection):
+    if collection not in COLLECTIONS:
+        return jsonify({'error': 'Not found'}), 404
+    return Response(export_lines(collection), mimetype=NDJSON_MIMETYPE,
+                    headers={'Content-Disposition': f'attachment; filename={collection}.ndjson'})
+
+
+@bp.route('/admin/bulk/<collection>.ndjson', methods=['POST'])
+def import_ndjson(collection):
+    if collection not in COLLECTIONS:
+        return jsonify({'error': 'Not found'}), 404
+    try:
+        mode, dry_run = parse_options(request.args)
+    except BulkError as e:
+        return jsonify({'error': str(e)}), 400
+    records, errors = read_records(_body_stream(), collection)
+    if errors:
+        return jsonify({'ok': False, 'records': len(records), 'errors': errors}), 400
+    if dry_run:
+        return jsonify({'ok': True, 'records': len(records)})
+    return jsonify({'ok': True, 'records': len(records), **commit(collection, records, mode)})
+
+
+@bp.route('/admin/bulk/backup.tar', methods=['GET'])
+def export_backup():
+    return Response(backup_chunks(), mimetype='application/x-tar',
+                    headers={'Content-Disposition': 'attachment; filename=sccf-backup.tar'})
+
+
+@bp.route('/admin/bulk/backup.tar', methods=['POST'])
+def import_backup():
+    try:
+        mode, dry_run = parse_options(request.args)
+        report = restore(_body_stream(), mode, dry_run)
+    except BulkError as e:
+        return jsonify({'error': str(e)}), 400
+    except tarfile.TarError as e:
+        return jsonify({'error': f'not a tar archive: {e}'}), 400
+    return jsonify(report), 200 if report['ok'] else 400
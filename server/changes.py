@@ -0,0 +1,119 @@
+"""Append-only log of record changes, so clients can sync by delta.
+
+Every admin write appends ``(seq, collection, id, op)`` to a SQLite table,
+where ``seq`` only ever increases and ``op`` is ``upsert`` or ``delete``.
+A client that remembers the last ``seq`` it saw asks for what happened after
+it (``GET /api/changes?since=<seq>``, see feed.py) instead of downloading
+whole datasets again, or keeps a Server-Sent Events stream open to be told
+as soon as there is something new.
+
+The table is shared by all processes, like the job queue. Only the newest
+``RETENTION`` entries are kept. A ``since`` older than that cannot be
+answered as a delta, and the client is told to reload everything instead.
+Listeners registered with ``add_listener`` are called with the new ``seq``
+after each write in this process. Writes from other processes are noticed
+by polling ``latest()``.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+RETENTION = 10000        # newest entries kept
+PRUNE_EVERY = 256        # writes between pruning passes
+COLLECTIONS = ('projects', 'news')
+OPS = ('upsert', 'delete')
+
+
+class ChangeLog:
+    def __init__(self, db_path, retention=RETENTION):
+        self.path = db_path
+        self.retention = retention
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._local = threading.local()
+        self._listeners = []
+        self._init_schema()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        self._conn().executescript('''
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                collection TEXT NOT NULL,
+                record_id TEXT NOT NULL,
+                op TEXT NOT NULL
+            );
+        ''')
+
+    def add_listener(self, fn):
+        """Call ``fn(seq)`` after every write made by this process."""
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn):
+        try:
+            self._listeners.remove(fn)
+        except ValueError:
+            pass
+
+    def record(self, collection, record_ids, op='upsert'):
+        """Append one entry per id (a single id or an iterable); returns the last ``seq``."""
+        if collection not in COLLECTIONS or op not in OPS:
+            raise ValueError(f'unknown change {collection!r}/{op!r}')
+        if isinstance(record_ids, str):
+            record_ids = [record_ids]
+        now = time.time()
+        rows = [(now, collection, str(rid), op) for rid in record_ids]
+        if not rows:
+            return self.latest()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT INTO changes (ts, collection, record_id, op) VALUES (?, ?, ?, ?)', rows)
+            seq = conn.execute('SELECT MAX(seq) FROM changes').fetchone()[0]
+            if seq // PRUNE_EVERY != (seq - len(rows)) // PRUNE_EVERY:
+                conn.execute('DELETE FROM changes WHERE seq <= ?', (seq - self.retention,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        for fn in list(self._listeners):
+            fn(seq)
+        return seq
+
+    def latest(self):
+        """The newest ``seq`` (0 before the first change)."""
+        return self._conn().execute('SELECT COALESCE(MAX(seq), 0) FROM changes').fetchone()[0]
+
+    def since(self, seq, limit=500, collection=None):
+        """Entries after ``seq``, oldest first, at most ``limit`` of them.
+
+        Returns ``(entries, latest, complete)``. ``complete`` is False when
+        entries after ``seq`` were already pruned (or ``seq`` is from a log
+        that was reset), so the caller has to reload in full.
+        """
+        conn = self._conn()
+        row = conn.execute('SELECT COALESCE(MIN(seq), 0) AS oldest, COALESCE(MAX(seq), 0) AS latest '
+                           'FROM changes').fetchone()
+        latest = row['latest']
+        if seq > latest or (seq < row['oldest'] - 1 and seq < latest):
+            return [], latest, False
+        sql = 'SELECT seq, ts, collection, record_id, op FROM changes WHERE seq > ?'
+        args = [seq]
+        if collection:
+            sql += ' AND collection = ?'
+            args.append(collection)
+        sql += ' ORDER BY seq LIMIT ?'
+        args.append(limit)
+        entries = [{'seq': r['seq'], 'ts': r['ts'], 'collection': r['collection'],
+                    'id': r['record_id'], 'op': r['op']} for r in conn.execute(sql, args)]
+        return entries, latest, True
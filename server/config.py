@@ -0,0 +1,66 @@
+"""Settings for the admin server.
+
+All paths are absolute, derived from the repository root, so the server
+behaves the same whatever the working directory. Each setting can be
+overridden with an ``SCCF_<NAME>`` environment variable. ``create_app`` loads
+this into ``app.config``; the shared data layer (services.py) reads it at
+import.
+"""
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env(name, default):
+    return os.environ.get(f'SCCF_{name}', default)
+
+
+def _path(name, default):
+    return os.path.abspath(_env(name, default))
+
+
+class Config:
+    BASE_DIR = BASE_DIR
+    DATA_DIR = _path('DATA_DIR', os.path.join(BASE_DIR, 'server', 'data'))
+    UPLOAD_ROOT = _path('UPLOAD_ROOT', os.path.join(BASE_DIR, 'server', 'uploads'))
+    PROJECTS_JSON = _path('PROJECTS_JSON', os.path.join(DATA_DIR, 'projects.json'))
+    # news has always lived at the repository root (data/, uploads/news/)
+    NEWS_JSON = _path('NEWS_JSON', os.path.join(BASE_DIR, 'data', 'news.json'))
+    NEWS_UPLOAD_DIR = _path('NEWS_UPLOAD_DIR', os.path.join(BASE_DIR, 'uploads', 'news'))
+    JOBS_DB = _path('JOBS_DB', os.path.join(DATA_DIR, 'jobs.sqlite3'))
+    # content-addressed uploads of both apps (see blobs.py); must stay under UPLOAD_ROOT to be served
+    BLOB_DIR = os.path.join(UPLOAD_ROOT, 'blobs')
+    BLOB_URL_PREFIX = '/uploads/blobs/'
+    BLOBS_DB = _path('BLOBS_DB', os.path.join(DATA_DIR, 'blobs.sqlite3'))
+    CHANGES_DB = _path('CHANGES_DB', os.path.join(DATA_DIR, 'changes.sqlite3'))
+    # empty si/ta fields are machine-translated after uploads when a provider is set (stub, gemini)
+    TRANSLATION_PROVIDER = _env('TRANSLATION_PROVIDER', '')
+    GEMINI_API_KEY = _env('GEMINI_API_KEY', os.environ.get('GEMINI_API_KEY', ''))
+    TRANSLATIONS_DB = _path('TRANSLATIONS_DB', os.path.join(DATA_DIR, 'translations.sqlite3'))
+    TRANSLATION_CACHE_ENTRIES = int(_env('TRANSLATION_CACHE_ENTRIES', 50000))
+    PUBLISH_MANIFEST = _path('PUBLISH_MANIFEST', os.path.join(DATA_DIR, 'publish-manifest.json'))
+    PUBLIC_PROJECTS_JSON = _path('PUBLIC_PROJECTS_JSON', os.path.join(BASE_DIR, 'assets', 'projects.json'))
+    PUBLIC_UPLOADS_ROOT = _path('PUBLIC_UPLOADS_ROOT', os.path.join(BASE_DIR, 'assets', 'uploads'))
+    # static per-language project and news pages (prerender.py); must stay inside BASE_DIR
+    PRERENDER_DIR = _path('PRERENDER_DIR', os.path.join(BASE_DIR, 'pages'))
+    PRERENDER_MANIFEST = _path('PRERENDER_MANIFEST', os.path.join(DATA_DIR, 'prerender-manifest.json'))
+
+    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+    MAX_CONTENT_LENGTH = int(_env('MAX_CONTENT_LENGTH', 25 * 1024 * 1024))  # 25 MB
+
+    # Allow local static previews to call the APIs in dev (8000, 5500, 5501)
+    CORS_ORIGINS = [
+        "http://127.0.0.1:8000",
+        "http://localhost:8000",
+        "http://127.0.0.1:5500",
+        "http://localhost:5500",
+        "http://127.0.0.1:5501",
+        "http://localhost:5501"
+    ]
+    CORS_EXPOSE_HEADERS = ['X-Next-Cursor', 'Link']
+
+    # GET /admin/profile samples the live process; off unless asked for
+    PROFILING = _env('PROFILING', '') in ('1', 'true', 'yes')
+
+    HOST = _env('HOST', '127.0.0.1')
+    PORT = int(_env('PORT', 5000))
@@ -0,0 +1,154 @@
+"""Change feed endpoints over the change log (changes.py).
+
+``GET /api/changes?since=<seq>`` returns what changed after ``seq``, with the
+current version of every created or updated record, so a client can patch
+its copy of /api/projects or /api/news instead of downloading it again:
+
+  {"since": 41, "latest": 45, "more": false, "reset": false,
+   "changes": [{"seq": 44, "collection": "projects", "id": "water-2025",
+                "op": "upsert", "record": {...}},
+               {"seq": 45, "collection": "news", "id": "...", "op": "delete"}]}
+
+A record changed several times is listed once, at its newest ``seq``.
+``more`` means ``limit`` cut the page short: ask again from the last
+``seq``. ``reset`` means the log no longer reaches back to ``since``: reload
+the full lists and continue from ``latest``. Without ``since`` only
+``latest`` is returned, which is where a new client starts.
+``collection=projects|news`` narrows the feed.
+
+``GET /api/changes/stream`` is a Server-Sent Events stream of the same
+entries without the records (``id:`` is the ``seq``, so a reconnecting
+browser resumes from ``Last-Event-ID``). Under the ASGI server it is served
+on the event loop (asgi.py); the Flask route here is for the development
+server and holds a thread per connection.
+"""
+import json
+import time
+
+from flask import Blueprint, Response, jsonify, request
+
+from changes import COLLECTIONS
+from http_cache import dataset_etag, is_fresh, validator_headers
+from services import CHANGES, NEWS, PROJECTS
+
+bp = Blueprint('feed', __name__)
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 1000
+HEARTBEAT = 15.0          # seconds between keep-alive comments on an idle stream
+STREAM_POLL = 1.0         # Flask fallback only
+RETRY_MS = 3000
+_REPOS = {'projects': PROJECTS, 'news': NEWS}
+
+
+class FeedError(ValueError):
+    pass
+
+
+def parse_args(args, last_event_id=None):
+    """``(since or None, limit, collection or None)`` from query args; raises FeedError."""
+    raw = args.get('since') or last_event_id
+    try:
+        since = int(raw) if raw not in (None, '') else None
+        limit = min(max(int(args.get('limit') or DEFAULT_LIMIT), 1), MAX_LIMIT)
+    except ValueError:
+        raise FeedError('since and limit must be integers')
+    if since is not None and since < 0:
+        raise FeedError('since must not be negative')
+    collection = args.get('collection') or None
+    if collection is not None and collection not in COLLECTIONS:
+        raise FeedError(f"collection must be one of {', '.join(COLLECTIONS)}")
+    return since, limit, collection
+
+
+def delta(since, limit=DEFAULT_LIMIT, collection=None):
+    """The /api/changes body for ``since``."""
+    if since is None:
+        return {'since': None, 'latest': CHANGES.latest(), 'more': False, 'reset': False, 'changes': []}
+    entries, latest, complete = CHANGES.since(since, limit, collection)
+    if not complete:
+        return {'since': since, 'latest': latest, 'more': False, 'reset': True, 'changes': []}
+    newest = {}
+    for e in entries:
+        newest.pop((e['collection'], e['id']), None)
+        newest[(e['collection'], e['id'])] = e
+    changes = []
+    for (coll, record_id), e in newest.items():
+        change = {'seq': e['seq'], 'collection': coll, 'id': record_id, 'op': e['op']}
+        if e['op'] == 'upsert':
+            record = _REPOS[coll].get(record_id)
+            if record is None:  # deleted since; a later entry may be past this page
+                change['op'] = 'delete'
+            else:
+                change['record'] = record
+        changes.append(change)
+    more = len(entries) == limit
+    return {'since': since, 'latest': entries[-1]['seq'] if more else latest,
+            'more': more, 'reset': False, 'changes': changes}
+
+
+def sse_event(entry):
+    """One SSE message for a change log entry."""
+    data = json.dumps({k: entry[k] for k in ('seq', 'collection', 'id', 'op')}, ensure_ascii=False)
+    return f"id: {entry['seq']}\nevent: change\ndata: {data}\n\n".encode('utf-8')
+
+
+def sse_reset(latest):
+    """Tells a stream client its position is gone from the log: reload, then continue from ``latest``."""
+    return f"id: {latest}\nevent: reset\ndata: {json.dumps({'latest': latest})}\n\n".encode('utf-8')
+
+
+def sse_preamble():
+    return f'retry: {RETRY_MS}\n\n'.encode('utf-8')
+
+
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+@bp.route('/api/changes', methods=['GET'])
+def api_changes():
+    try:
+        since, limit, collection = parse_args(request.args)
+    except FeedError as e:
+        return jsonify({'error': str(e)}), 400
+    # cacheable per (query, latest seq): an edge cache can answer pollers until something changes
+    etag = dataset_etag('changes', CHANGES.latest())
+    headers = validator_headers(etag, None)
+    if is_fresh(request.headers.get('If-None-Match'), None, etag, None):
+        return Response(status=304, headers=headers)
+    resp = jsonify(delta(since, limit, collection))
+    resp.headers.update(headers)
+    return resp
+
+
+@bp.route('/api/changes/stream', methods=['GET'])
+def api_changes_stream():
+    try:
+        since, _, collection = parse_args(request.args, request.headers.get('Last-Event-ID'))
+    except FeedError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def events(position):
+        yield sse_preamble()
+        if position is None:
+            position = CHANGES.latest()
+        idle_since = time.monotonic()
+        while True:
+            entries, latest, complete = CHANGES.since(position, MAX_LIMIT, collection)
+            if not complete:
+                yield sse_reset(latest)
+                position = latest
+            elif entries:
+                for e in entries:
+                    yield sse_event(e)
+                position = entries[-1]['seq'] if len(entries) == MAX_LIMIT else latest
+                idle_since = time.monotonic()
+                continue
+            else:
+                position = latest
+            if time.monotonic() - idle_since >= HEARTBEAT:
+                yield b': keepalive\n\n'
+                idle_since = time.monotonic()
+            time.sleep(STREAM_POLL)
+
+    return Response(events(since), mimetype='text/event-stream', headers=SSE_HEADERS)
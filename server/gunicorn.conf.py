@@ -0,0 +1,29 @@
+"""Production launcher settings for the ASGI entry point (see asgi.py).
+
+  cd server && gunicorn -c gunicorn.conf.py asgi:app
+
+Each worker is one process running an event loop (uvicorn), which keeps idle
+keep-alive connections without a thread apiece; blocking work (data loads,
+the Flask fallback) runs on that worker's SCCF_ASGI_THREADS pool. One worker
+per core is enough for a small VM. Every setting can be overridden from the
+environment.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('SCCF_BIND', '127.0.0.1:5000')
+workers = int(os.environ.get('SCCF_WORKERS', max(2, multiprocessing.cpu_count())))
+worker_class = 'uvicorn.workers.UvicornWorker'
+# thread pool per worker for repository reads and Flask requests (read by asgi.py)
+raw_env = [f"SCCF_ASGI_THREADS={os.environ.get('SCCF_ASGI_THREADS', '8')}"]
+
+backlog = int(os.environ.get('SCCF_BACKLOG', '2048'))
+keepalive = int(os.environ.get('SCCF_KEEPALIVE', '75'))   # seconds an idle keep-alive connection stays open
+timeout = int(os.environ.get('SCCF_TIMEOUT', '60'))
+graceful_timeout = 30
+# recycle workers now and then to bound memory growth
+max_requests = int(os.environ.get('SCCF_MAX_REQUESTS', '20000'))
+max_requests_jitter = 2000
+
+accesslog = os.environ.get('SCCF_ACCESS_LOG') or None
+errorlog = '-'
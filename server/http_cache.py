@@ -0,0 +1,108 @@
+"""HTTP validators for the JSON APIs and cache headers for uploads.
+
+API responses carry a strong ETag built from the dataset's version counter
+and, for file-backed stores, the data file's signature (mtime and size), plus
+the request path and query, since those select the body. Last-Modified is the
+later of the store's last save and the data file's mtime. The signature is
+what makes hand edits and git pulls, which reload the data but leave the
+version alone, change the validators too. Conditional requests are answered
+from these stats alone, so a 304 never loads or serializes the data.
+"""
+import re
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+
+from flask import Response, request
+
+API_CACHE_CONTROL = 'public, no-cache'
+UPLOAD_CACHE_CONTROL = 'public, max-age=86400'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# URLs that never change content: blob store files and their variants (named by
+# hash), and legacy news uploads stored as '<uuid4 hex>_<name>'
+_CONTENT_ADDRESSED = re.compile(r'(^|/)blobs/|(^|/)[0-9a-f]{32}_[^/]+$')
+
+
+def dataset_etag(name, version, full_path=None):
+    """ETag for ``name`` at ``version``; ``full_path`` defaults to Flask's ``request.full_path``."""
+    if full_path is None:
+        full_path = request.full_path
+    variant = zlib.crc32(full_path.encode('utf-8'))
+    return f'"{name}-{version}-{variant:08x}"'
+
+
+def store_validators(store):
+    """``(version tag, last modified)`` of a store, for ``dataset_etag`` and ``validator_headers``."""
+    tag = store.version()
+    last_modified = store.last_modified()
+    signature = store.signature()
+    if isinstance(signature, tuple):  # (mtime_ns, size) of a data file; SQLite's is its version
+        mtime_ns, size = signature
+        tag = f'{tag}.{zlib.crc32(f"{mtime_ns}:{size}".encode("ascii")):08x}'
+        if last_modified is None or mtime_ns / 1e9 > last_modified:
+            last_modified = mtime_ns / 1e9
+    return tag, last_modified
+
+
+def is_fresh(if_none_match, if_modified_since, etag, last_modified):
+    """Whether a request with these validator headers can be answered with 304."""
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    return _not_modified_since(if_modified_since, last_modified)
+
+
+def validator_headers(etag, last_modified):
+    headers = {'ETag': etag, 'Cache-Control': API_CACHE_CONTROL}
+    if last_modified is not None:
+        headers['Last-Modified'] = formatdate(last_modified, usegmt=True)
+    return headers
+
+
+def upload_cache_control(filename):
+    return IMMUTABLE_CACHE_CONTROL if _CONTENT_ADDRESSED.search(filename) else UPLOAD_CACHE_CONTROL
+
+
+def _etag_matches(header, etag):
+    if header.strip() == '*':
+        return True
+    return etag in [t.strip() for t in header.split(',')]
+
+
+def _not_modified_since(header, last_modified):
+    if last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(last_modified) <= since
+
+
+def conditional(repo, name, build_response):
+    """Return 304 if the client's copy is current, else ``build_response()`` with validators.
+
+    ``repo`` may be a tuple of repositories for a response built from several;
+    the validators then change when any of them does.
+    """
+    repos = repo if isinstance(repo, tuple) else (repo,)
+    validators = [store_validators(r.store) for r in repos]
+    version = '_'.join(str(tag) for tag, _ in validators)
+    last_modified = max((lm for _, lm in validators if lm is not None), default=None)
+    etag = dataset_etag(name, version)
+
+    if is_fresh(request.headers.get('If-None-Match'), request.headers.get('If-Modified-Since'),
+                etag, last_modified):
+        resp = Response(status=304)
+    else:
+        resp = build_response()
+        if isinstance(resp, tuple):
+            return resp
+        if resp.status_code != 200:
+            return resp
+    resp.headers.update(validator_headers(etag, last_modified))
+    return resp
+
+
+def json_response(body: bytes):
+    """Response for an already serialized JSON body."""
+    return Response(body, mimetype='application/json')
@@ -0,0 +1,114 @@
+"""Responsive image derivatives generated after upload.
+
+For every uploaded photo a fixed set of narrower widths is rendered in the
+modern formats Pillow can encode here (AVIF and/or WebP), with EXIF and other
+metadata stripped, plus a tiny blurred placeholder as a data URI. The apps
+run ``render`` as a background job (see jobs.py) so the upload request is not
+blocked, and store the result on the project/article under
+``image_variants[<original url>]``:
+
+  {"width": 3000, "height": 2000, "placeholder": "data:image/webp;base64,...",
+   "variants": [{"url": ".../_derived/photo_jpg-320.webp", "width": 320,
+                 "height": 213, "format": "webp"}, ...],
+   "webp": ".../_derived/photo_jpg.webp"}
+
+``webp`` is a full-size WebP of a JPEG or PNG, which static_files.py serves
+in place of the original to clients that accept it.
+
+Pillow is optional; without it uploads are stored as-is and nothing is queued.
+"""
+import base64
+import io
+import os
+
+import metrics
+
+try:
+    from PIL import Image, ImageFilter, ImageOps, features
+except ImportError:  # Pillow not installed: derivatives disabled
+    Image = None
+
+WIDTHS = (320, 640, 1024, 1600)
+SAVE_OPTIONS = {'avif': {'quality': 50, 'speed': 8}, 'webp': {'quality': 75, 'method': 4}}
+PLACEHOLDER_WIDTH = 16
+DERIVED_DIR = '_derived'
+FULL_WEBP_SOURCES = ('JPEG', 'PNG')
+
+
+def available():
+    return Image is not None
+
+
+def output_formats():
+    if Image is None:
+        return ()
+    return tuple(fmt for fmt in ('avif', 'webp') if _supported(fmt))
+
+
+def _supported(fmt):
+    try:
+        return bool(features.check(fmt))
+    except ValueError:  # feature unknown to this Pillow version
+        return False
+
+
+def _placeholder(img):
+    thumb = img.copy()
+    thumb.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH))
+    thumb = thumb.filter(ImageFilter.GaussianBlur(1))
+    fmt, mime = ('WEBP', 'image/webp') if _supported('webp') else ('PNG', 'image/png')
+    buf = io.BytesIO()
+    thumb.save(buf, fmt)
+    return f"data:{mime};base64,{base64.b64encode(buf.getvalue()).decode('ascii')}"
+
+
+def _save(img, path, fmt):
+    tmp = path + '.part'
+    img.save(tmp, fmt.upper(), **SAVE_OPTIONS[fmt])
+    os.replace(tmp, path)
+
+
+@metrics.span('images.render')
+def render(src_path, url):
+    """Render derivatives for the file at ``src_path`` served at ``url``.
+
+    Files go to a ``_derived`` folder next to the source. Returns the
+    metadata dict.
+    """
+    src_dir = os.path.dirname(src_path)
+    # keep the extension in the stem so photo.jpg and photo.png don't collide
+    stem = os.path.basename(src_path).replace('.', '_')
+    url_dir = url.rsplit('/', 1)[0]
+    out_dir = os.path.join(src_dir, DERIVED_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+
+    with Image.open(src_path) as opened:
+        img = ImageOps.exif_transpose(opened)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        width, height = img.size
+        meta = {'width': width, 'height': height, 'placeholder': _placeholder(img), 'variants': []}
+        widths = [w for w in WIDTHS if w < width] or [width]
+        for w in widths:
+            h = max(1, round(height * w / width))
+            resized = img.resize((w, h), Image.LANCZOS) if w != width else img
+            for fmt in output_formats():
+                name = f"{stem}-{w}.{fmt}"
+                _save(resized, os.path.join(out_dir, name), fmt)
+                meta['variants'].append({
+                    'url': f"{url_dir}/{DERIVED_DIR}/{name}",
+                    'width': w,
+                    'height': h,
+                    'format': fmt,
+                })
+        # full-size copy the upload routes send instead of the original to WebP-capable clients
+        if opened.format in FULL_WEBP_SOURCES and _supported('webp'):
+            name = f"{stem}.webp"
+            _save(img, os.path.join(out_dir, name), 'webp')
+            meta['webp'] = f"{url_dir}/{DERIVED_DIR}/{name}"
+    return meta
+
+
+def srcset(meta, fmt):
+    """``srcset`` attribute value for one format of a stored metadata dict."""
+    return ', '.join(f"{v['url']} {v['width']}w" for v in (meta or {}).get('variants', []) if v['format'] == fmt)
@@ -0,0 +1,280 @@
+"""Persistent background jobs for work that should not hold up a request.
+
+Jobs live in a SQLite table, so queued work survives a restart and several
+processes can share one queue. Each process runs a small pool of worker
+threads that claim due jobs of the kinds it has handlers for. A failing job is
+retried with exponential backoff until ``max_attempts`` is reached and then
+marked ``failed`` with the last error kept for inspection. A job whose worker
+died mid-run is picked up again once its lease expires.
+
+Jobs enqueued with a ``dedupe_key`` coalesce: while a job with the same key is
+still waiting, enqueueing again only refreshes its payload (or merges it into
+the waiting one) instead of adding a second job. With a ``delay`` this is a
+debounce: each enqueue pushes the start back, but never past ``max_delay``
+after the first one, so a burst of publish requests produces one
+regeneration shortly after the burst ends. A job is not started while
+another job with its ``dedupe_key`` is running, so two runs of the same
+regeneration never overlap; the waiting one starts when the first finishes.
+
+Statuses: ``queued`` -> ``running`` -> ``done`` | ``failed``.
+"""
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import traceback
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+JOB_WORKERS = 2
+MAX_ATTEMPTS = 5
+RETRY_BASE = 2.0         # seconds before the first retry, doubled each attempt
+RETRY_MAX = 300.0
+LEASE_SECONDS = 600      # a running job older than this is assumed orphaned
+POLL_INTERVAL = 1.0      # picks up jobs enqueued by other processes
+RETENTION = 7 * 86400    # finished jobs are pruned after a week
+
+# a queued job whose dedupe_key is held by a running job (with a live lease) waits for it
+_NOT_BLOCKED = ("(dedupe_key IS NULL OR NOT EXISTS (SELECT 1 FROM jobs AS r WHERE r.dedupe_key = jobs.dedupe_key "
+                "AND r.status = 'running' AND r.lease_until >= ?))")
+
+_FIELDS = ('id', 'kind', 'payload', 'dedupe_key', 'status', 'attempts', 'max_attempts',
+           'run_after', 'created', 'updated', 'error', 'result')
+
+
+def backoff(attempts):
+    """Delay before retry number ``attempts`` (1-based), with jitter."""
+    delay = min(RETRY_MAX, RETRY_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class JobQueue:
+    def __init__(self, db_path, workers=JOB_WORKERS):
+        self.path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.workers = workers
+        self._handlers = {}
+        self._local = threading.local()
+        self._wake = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        self._init_schema()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        self._conn().executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL DEFAULT '{}',
+                dedupe_key TEXT,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                run_after REAL NOT NULL,
+                lease_until REAL,
+                created REAL NOT NULL,
+                updated REAL NOT NULL,
+                error TEXT,
+                result TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_due ON jobs(status, run_after);
+            CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs(dedupe_key, status);
+        ''')
+
+    def register(self, kind, fn=None):
+        """Register ``fn(payload) -> result`` for ``kind``; usable as a decorator."""
+        if fn is None:
+            return lambda f: self.register(kind, f)
+        self._handlers[kind] = fn
+        return fn
+
+    def start(self):
+        """Start the worker threads (idempotent) and prune old finished jobs."""
+        if self._threads:
+            return
+        cutoff = time.time() - RETENTION
+        self._conn().execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated < ?", (cutoff,))
+        for n in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f'jobs-{n}', daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout=None):
+        self._stopping = True
+        with self._wake:
+            self._wake.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+        self._stopping = False
+
+    def enqueue(self, kind, payload=None, dedupe_key=None, delay=0.0, max_delay=None, merge=None,
+                max_attempts=MAX_ATTEMPTS):
+        """Queue a job and return its id (the existing job's id when coalesced).
+
+        When coalescing, ``merge(waiting_payload, payload)`` (if given) builds
+        the payload that is kept; otherwise the new payload replaces it.
+        """
+        now = time.time()
+        payload = payload or {}
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = None
+            if dedupe_key is not None:
+                row = conn.execute(
+                    "SELECT id, payload, run_after, created FROM jobs WHERE dedupe_key = ? AND status = 'queued' "
+                    "LIMIT 1", (dedupe_key,)).fetchone()
+            if row is not None:
+                job_id = row['id']
+                if merge is not None:
+                    body = json.dumps(merge(json.loads(row['payload']), payload),
+                                      ensure_ascii=False, separators=(',', ':'))
+                run_after = max(row['run_after'], now + delay)
+                if max_delay is not None:
+                    run_after = min(run_after, max(row['created'] + max_delay, row['run_after']))
+                conn.execute('UPDATE jobs SET payload = ?, run_after = ?, updated = ? WHERE id = ?',
+                             (body, run_after, now, job_id))
+            else:
+                job_id = conn.execute(
+                    'INSERT INTO jobs (kind, payload, dedupe_key, max_attempts, run_after, created, updated) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (kind, body, dedupe_key, max_attempts, now + delay, now, now)).lastrowid
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        with self._wake:
+            self._wake.notify()
+        return job_id
+
+    def get(self, job_id):
+        row = self._conn().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return _as_dict(row) if row is not None else None
+
+    def list(self, status=None, limit=50):
+        """Most recent jobs first, optionally only those with ``status``."""
+        if status:
+            rows = self._conn().execute('SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?',
+                                        (status, limit))
+        else:
+            rows = self._conn().execute('SELECT * FROM jobs ORDER BY id DESC LIMIT ?', (limit,))
+        return [_as_dict(r) for r in rows]
+
+    def counts(self):
+        rows = self._conn().execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status')
+        return {r['status']: r['n'] for r in rows}
+
+    def _claim(self):
+        """Atomically take the next due job this process can run, or return None."""
+        kinds = list(self._handlers)
+        if not kinds:
+            return None
+        now = time.time()
+        marks = ','.join('?' * len(kinds))
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                f"SELECT * FROM jobs WHERE kind IN ({marks}) AND ("
+                f"(status = 'queued' AND run_after <= ? AND {_NOT_BLOCKED}) "
+                f"OR (status = 'running' AND lease_until < ?)) "
+                f"ORDER BY run_after, id LIMIT 1",
+                (*kinds, now, now, now)).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated = ? "
+                    "WHERE id = ?", (now + LEASE_SECONDS, now, row['id']))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if row is None:
+            return None
+        job = _as_dict(row)
+        job['attempts'] += 1
+        return job
+
+    def _next_due_in(self):
+        kinds = list(self._handlers)
+        if not kinds:
+            return POLL_INTERVAL
+        marks = ','.join('?' * len(kinds))
+        row = self._conn().execute(
+            f"SELECT MIN(run_after) AS due FROM jobs WHERE status = 'queued' AND kind IN ({marks}) "
+            f"AND {_NOT_BLOCKED}", (*kinds, time.time())).fetchone()
+        if row['due'] is None:
+            return POLL_INTERVAL
+        return min(POLL_INTERVAL, max(0.0, row['due'] - time.time()))
+
+    def _finish(self, job, status, error=None, result=None, run_after=None):
+        now = time.time()
+        self._conn().execute(
+            'UPDATE jobs SET status = ?, error = ?, result = ?, run_after = COALESCE(?, run_after), '
+            'lease_until = NULL, updated = ? WHERE id = ?',
+            (status, error,
+             None if result is None else json.dumps(result, ensure_ascii=False, default=str),
+             run_after, now, job['id']))
+
+    def run_once(self):
+        """Run one due job in the calling thread; returns False if there was none."""
+        job = self._claim()
+        if job is None:
+            return False
+        started = time.perf_counter()
+        try:
+            result = self._handlers[job['kind']](job['payload'])
+        except Exception:
+            metrics.JOB_SECONDS.observe(time.perf_counter() - started, job['kind'], 'error')
+            error = traceback.format_exc(limit=5)
+            if job['attempts'] < job['max_attempts']:
+                log.warning('job %s (%s) failed, attempt %s/%s', job['id'], job['kind'],
+                            job['attempts'], job['max_attempts'])
+                self._finish(job, 'queued', error=error, run_after=time.time() + backoff(job['attempts']))
+            else:
+                log.error('job %s (%s) failed permanently:\n%s', job['id'], job['kind'], error)
+                self._finish(job, 'failed', error=error)
+        else:
+            metrics.JOB_SECONDS.observe(time.perf_counter() - started, job['kind'], 'done')
+            self._finish(job, 'done', result=result)
+        if job['dedupe_key'] is not None:
+            with self._wake:    # a job with the same key may have been waiting for this one
+                self._wake.notify()
+        return True
+
+    def _worker(self):
+        while not self._stopping:
+            try:
+                if self.run_once():
+                    continue
+                wait = self._next_due_in()
+            except sqlite3.Error:
+                log.exception('job queue error')
+                wait = POLL_INTERVAL
+            with self._wake:
+                if not self._stopping:
+                    self._wake.wait(wait)
+
+
+def _as_dict(row):
+    job = {k: row[k] for k in _FIELDS}
+    job['payload'] = json.loads(job['payload'] or '{}')
+    if job['result'] is not None:
+        job['result'] = json.loads(job['result'])
+    return job
@@ -0,0 +1,109 @@
+"""Single admin server for projects and news.
+
+``create_app`` mounts the projects blueprint (app.py) and the news blueprint
+(news_app.py) on one Flask app over the shared data layer in services.py, so
+one process on one port serves the admin pages, both APIs and all uploads.
+Startup time and resident memory are logged when the app is created and
+exposed at ``/admin/status``.
+
+  python server/main.py            # http://127.0.0.1:5000
+"""
+import time
+
+_STARTED = time.perf_counter()
+
+import logging  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from flask import Flask, jsonify  # noqa: E402
+from flask_cors import CORS  # noqa: E402
+
+from config import Config  # noqa: E402
+
+log = logging.getLogger('sccf')
+
+
+def _rss_bytes():
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _startup_seconds():
+    """Seconds since the process started (since this module loaded where /proc is unavailable)."""
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.perf_counter() - _STARTED
+
+
+def create_app(config=Config):
+    """Build the Flask app. The shared data layer (services.py) always uses ``Config``."""
+    import app as projects
+    import bulk
+    import feed
+    import news_app
+    import metrics
+    from services import JOBS
+
+    app = Flask(__name__)
+    app.config.from_object(config)
+    for d in (config.DATA_DIR, config.UPLOAD_ROOT, config.NEWS_UPLOAD_DIR, config.PUBLIC_UPLOADS_ROOT):
+        os.makedirs(d, exist_ok=True)
+
+    CORS(app, resources={
+        # the public news feed has always been readable from any origin
+        r"/api/news*": {"origins": "*", "expose_headers": config.CORS_EXPOSE_HEADERS},
+        r"/api/*": {"origins": config.CORS_ORIGINS, "expose_headers": config.CORS_EXPOSE_HEADERS},
+    })
+    app.register_blueprint(projects.bp)
+    app.register_blueprint(news_app.bp)
+    app.register_blueprint(feed.bp)
+    app.register_blueprint(bulk.bp)
+    metrics.init_app(app)
+    metrics.gauge('sccf_process_resident_memory_bytes', 'Resident memory of this process.', _rss_bytes)
+    JOBS.start()
+
+    startup = {
+        'startup_seconds': round(_startup_seconds(), 3),
+        'rss_bytes': _rss_bytes(),
+        'pid': os.getpid(),
+    }
+    app.extensions['sccf_startup'] = startup
+
+    @app.route('/admin/status')
+    def admin_status():
+        return jsonify({**startup, 'rss_bytes_now': _rss_bytes()})
+
+    if not log.handlers and not logging.getLogger().handlers:
+        # nothing configured logging (dev server, uvicorn): still report the boot numbers
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        log.addHandler(handler)
+        log.setLevel(logging.INFO)
+    rss = startup['rss_bytes']
+    log.info('admin server ready in %.3fs, RSS %s (pid %s)', startup['startup_seconds'],
+             f'{rss / 2 ** 20:.1f} MiB' if rss is not None else 'unknown', startup['pid'])
+    return app
+
+
+if __name__ == '__main__':
+    # debug=False and no reloader: the reloader's child process can make the
+    # server unreachable when launched in background
+    create_app().run(host=Config.HOST, port=Config.PORT, debug=False, use_reloader=False)
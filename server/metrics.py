@@ -0,0 +1,220 @@
+"""In-process metrics in the Prometheus text format.
+
+Counters and histograms live in module-level registries, guarded by one
+lock; recording is a dict update, so instrumentation can stay on in
+production. ``init_app`` times every Flask request per route, and the
+blueprint serves ``GET /metrics`` plus the opt-in sampling profiler (see
+profiler.py) at ``GET /admin/profile``.
+
+What is recorded:
+
+- ``sccf_http_requests_total`` / ``sccf_http_request_duration_seconds`` per
+  method and route rule (the ASGI fast paths report under the same routes)
+- ``sccf_storage_*``: full loads, bytes read/parsed and written per store,
+  plus the repositories' cache hits and misses
+- ``sccf_span_duration_seconds``: named steps such as saving uploaded files,
+  publishing, rendering image variants and serializing JSON
+- ``sccf_job_duration_seconds`` per background job kind and outcome
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Blueprint, Response, g, request
+
+# Request latencies run from sub-millisecond cache hits to multi-second uploads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_lock = threading.Lock()
+_metrics = {}   # name -> metric, in registration order
+_gauges = {}    # name -> (help, fn), sampled at scrape time
+
+
+def _label_str(names, values):
+    if not names:
+        return ''
+    parts = []
+    for n, v in zip(names, values):
+        v = str(v).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        parts.append(f'{n}="{v}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _fmt(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def _render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labels, v in sorted(self._values.items()):
+            lines.append(f'{self.name}{_label_str(self.labels, labels)} {_fmt(v)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}   # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def _render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        names = self.labels + ('le',)
+        for labels, row in sorted(self._values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), row[:len(self.buckets)] + [None]):
+                cumulative = row[-1] if n is None else cumulative + n
+                lines.append(f'{self.name}_bucket{_label_str(names, labels + (_fmt(float(bound)),))} {cumulative}')
+            lines.append(f'{self.name}_sum{_label_str(self.labels, labels)} {_fmt(row[-2])}')
+            lines.append(f'{self.name}_count{_label_str(self.labels, labels)} {row[-1]}')
+        return lines
+
+
+def counter(name, help, labels=()):
+    with _lock:
+        return _metrics.setdefault(name, Counter(name, help, labels))
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    with _lock:
+        return _metrics.setdefault(name, Histogram(name, help, labels, buckets))
+
+
+def gauge(name, help, fn):
+    """Report ``fn()`` at scrape time (skipped when it returns None)."""
+    _gauges[name] = (help, fn)
+
+
+def render():
+    with _lock:
+        metrics = list(_metrics.values())
+    lines = []
+    for m in metrics:
+        with _lock:
+            lines.extend(m._render())
+    for name, (help, fn) in list(_gauges.items()):
+        try:
+            value = fn()
+        except Exception:
+            continue
+        if value is not None:
+            lines += [f'# HELP {name} {help}', f'# TYPE {name} gauge', f'{name} {_fmt(value)}']
+    return '\n'.join(lines) + '\n'
+
+
+REQUESTS = counter('sccf_http_requests_total', 'HTTP requests by method, route and status.',
+                   ('method', 'route', 'status'))
+REQUEST_SECONDS = histogram('sccf_http_request_duration_seconds', 'HTTP request latency by method and route.',
+                            ('method', 'route'))
+STORE_READS = counter('sccf_storage_reads_total', 'Full loads of a store from disk.', ('store',))
+STORE_BYTES_READ = counter('sccf_storage_bytes_read_total', 'Bytes read and parsed by full loads.', ('store',))
+STORE_WRITES = counter('sccf_storage_writes_total', 'Writes to a store.', ('store',))
+STORE_BYTES_WRITTEN = counter('sccf_storage_bytes_written_total', 'Bytes written to a store.', ('store',))
+CACHE = counter('sccf_repository_cache_total', 'Repository cache revalidations by result (hit/miss).',
+                ('store', 'result'))
+SPAN_SECONDS = histogram('sccf_span_duration_seconds', 'Duration of named internal steps.', ('span',))
+JOB_SECONDS = histogram('sccf_job_duration_seconds', 'Background job run time by kind and outcome.',
+                        ('kind', 'outcome'))
+
+
+def span(name):
+    """``with span('publish.uploads'):`` records the block's duration."""
+    return SPAN_SECONDS.time(name)
+
+
+def observe_request(method, route, status, seconds):
+    REQUESTS.inc(method, route, str(status))
+    REQUEST_SECONDS.observe(seconds, method, route)
+
+
+bp = Blueprint('metrics', __name__)
+
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    return Response(render(), content_type=CONTENT_TYPE)
+
+
+@bp.route('/admin/profile')
+def profile_endpoint():
+    """Sample all threads for ``?seconds=`` (default 10) and return folded stacks.
+
+    The sampling runs in this request's thread, so the response arrives after
+    the capture. ``seconds`` and ``interval`` outside the profiler's bounds are
+    a 400. Disabled unless ``SCCF_PROFILING=1``. The output is one
+    ``frame;frame;frame count`` line per distinct stack, ready for
+    flamegraph.pl or speedscope.
+    """
+    import profiler
+
+    if not profiler.enabled():
+        return Response('profiling is disabled (set SCCF_PROFILING=1)\n', status=404, mimetype='text/plain')
+    try:
+        seconds = float(request.args.get('seconds') or profiler.DEFAULT_SECONDS)
+        interval = float(request.args.get('interval') or profiler.DEFAULT_INTERVAL)
+    except ValueError:
+        return Response('seconds and interval must be numbers\n', status=400, mimetype='text/plain')
+    try:
+        profiler.check_args(seconds, interval)
+    except ValueError as e:
+        return Response(f'{e}\n', status=400, mimetype='text/plain')
+    try:
+        folded = profiler.sample(seconds, interval)
+    except profiler.ProfilerBusy:
+        return Response('a profile is already running\n', status=409, mimetype='text/plain')
+    return Response(folded, mimetype='text/plain')
+
+
+def _before():
+    g._metrics_start = time.perf_counter()
+
+
+def _after(resp):
+    start = getattr(g, '_metrics_start', None)
+    if start is not None:
+        rule = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        observe_request(request.method, rule, resp.status_code, time.perf_counter() - start)
+    return resp
+
+
+def init_app(app):
+    app.before_request(_before)
+    app.after_request(_after)
+    app.register_blueprint(bp)
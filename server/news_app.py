@@ -1,76 +1,176 @@
 # -*- coding: utf-8 -*-
-from flask import Flask, render_template, request, jsonify, send_from_directory
-from flask_cors import CORS
-from werkzeug.utils import secure_filename
+from flask import Blueprint, render_template, request, jsonify
 import os
-import json
 import uuid
 from datetime import datetime
 
-app = Flask(__name__)
-CORS(app)
+from werkzeug.security import safe_join
 
-# Configuration
-UPLOAD_FOLDER = 'uploads/news'
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+import images
+from config import Config
+from http_cache import conditional, json_response
+from query import NEWS_FILTERS, NEWS_SORTS, is_list_query, list_response
+from search import NEWS_FIELDS, search_response
+from services import (BLOBS, CHANGES, JOBS, NEWS, SEARCH, TRANSLATOR, record_blobs, schedule_blob_gc,
+                      schedule_prerender, schedule_translation)
+from static_files import send_upload
+from translation import NEWS_LANG_FIELDS, TARGET_LANGS
+from uploads import allowed_file
 
-# Ensure upload directory exists
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+bp = Blueprint('news', __name__)
 
-# Data file path
-DATA_FILE = 'data/news.json'
+# Configuration
+UPLOAD_FOLDER = Config.NEWS_UPLOAD_DIR
+COMPACT_DELAY = 30.0
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+def upload_path(url):
+    """Absolute path of a blob or legacy /uploads/news/... URL; None if it points outside the upload folders"""
+    if BLOBS.owns(url):
+        return safe_join(BLOBS.root, url[len(BLOBS.url_prefix):])
+    if url.startswith('/uploads/news/'):
+        return safe_join(UPLOAD_FOLDER, url[len('/uploads/news/'):])
+    return None
 
 def load_news():
-    """Load news from JSON file"""
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+    """Load news from the cached store (shared list; do not mutate in place)"""
+    return NEWS.records()
 
 def save_news(news):
     """Save news to JSON file"""
-    os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(news, f, indent=2, ensure_ascii=False)
+    NEWS.save(news)
+
+def publish_blobs():
+    """Mirror newly stored blobs to assets/uploads (the projects app's publish job)"""
+    JOBS.enqueue('publish_uploads', dedupe_key='publish_uploads')
 
 def save_uploaded_file(file):
-    """Save uploaded file and return relative path"""
+    """Save uploaded file to the blob store and return its URL"""
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        # Add unique ID to prevent collisions
-        unique_filename = f"{uuid.uuid4().hex}_{filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(filepath)
-        return f"/uploads/news/{unique_filename}"
+        return BLOBS.put(file, file.filename)
     return None
 
-@app.route('/')
+def save_uploaded_files(files):
+    """Save several uploads concurrently; returns URLs of the accepted ones in order"""
+    accepted = [f for f in files if f and f.filename and allowed_file(f.filename)]
+    return BLOBS.put_many(accepted)
+
+def queue_derivatives(news_id, paths):
+    """Render responsive variants of uploaded images in the background"""
+    if not images.available():
+        return
+    for path in dict.fromkeys(paths):
+        if path:
+            JOBS.enqueue('news_image_derivatives', {'news_id': news_id, 'path': path})
+
+@JOBS.register('news_image_derivatives')
+def run_image_derivatives(payload):
+    news_id, path = payload['news_id'], payload['path']
+    src = upload_path(path)
+    if src is None or not os.path.isfile(src):
+        return {'skipped': 'source missing'}
+    meta = BLOBS.variants(path) if BLOBS.owns(path) else None
+    if meta is None:
+        meta = images.render(src, path)
+        if BLOBS.owns(path):
+            BLOBS.set_variants(path, meta)
+            publish_blobs()
+    if NEWS.update(news_id, lambda a: {'image_variants': {**(a.get('image_variants') or {}), path: meta}}) is not None:
+        CHANGES.record('news', news_id)
+    return {'variants': len(meta['variants'])}
+
+def schedule_compaction():
+    """Reclaim replaced and deleted bodies shortly after an edit (segment storage only)"""
+    if hasattr(NEWS.store, 'compact'):
+        JOBS.enqueue('news_compact', dedupe_key='news_compact', delay=COMPACT_DELAY)
+
+@JOBS.register('news_compact')
+def run_compaction(payload):
+    return NEWS.compact() or {'skipped': 'too little garbage'}
+
+@JOBS.register('translate_news')
+def run_translation(payload):
+    """Store si/ta versions of the title and excerpt under ``translations`` (one provider call per language)"""
+    if TRANSLATOR is None:
+        return {'skipped': 'translation is off'}
+    fields = {}
+    for news_id in payload.get('ids', []):
+        article = NEWS.get(news_id)
+        if article is None:
+            continue
+        existing = article.get('translations') or {}
+        for field in NEWS_LANG_FIELDS:
+            fields[(news_id, field)] = {'en': article.get(field),
+                                        **{lang: (existing.get(lang) or {}).get(field) for lang in TARGET_LANGS}}
+    filled = {}
+    for (news_id, field), langs in TRANSLATOR.fill(fields).items():
+        for lang, text in langs.items():
+            filled.setdefault(news_id, {}).setdefault(lang, {})[field] = text
+
+    def apply(new):
+        def changes(current):
+            existing = current.get('translations') or {}
+            # anything stored meanwhile wins over the machine translation
+            return {'translations': {lang: {**new.get(lang, {}), **(existing.get(lang) or {})}
+                                     for lang in set(new) | set(existing)}}
+        return changes
+
+    results = NEWS.update_many({news_id: apply(new) for news_id, new in filled.items()})
+    updated = [news_id for news_id, article in results.items() if article is not None]
+    if updated:
+        CHANGES.record('news', updated)
+        schedule_prerender()
+    return {'articles': len(updated)}
+
+@JOBS.register('delete_files')
+def run_delete_files(payload):
+    """Remove the upload files of a deleted article"""
+    removed = 0
+    for path in payload.get('paths', []):
+        if not path.startswith('/uploads/news/'):
+            continue
+        file_path = upload_path(path)
+        if file_path is None:
+            continue
+        try:
+            os.remove(file_path)
+        except OSError:
+            continue
+        removed += 1
+    return {'removed': removed}
+
+@bp.route('/admin/news')
 def admin():
     """Admin panel page"""
     return render_template('news-admin.html')
 
-@app.route('/api/news', methods=['GET'])
+@bp.route('/api/news', methods=['GET'])
 def get_news():
-    """Get all news articles"""
-    news = load_news()
-    return jsonify(news)
+    """Get news articles (all, or a filtered/paginated page)"""
+    def build():
+        if is_list_query(request.args, NEWS_FILTERS):
+            return list_response(load_news(), NEWS_FILTERS, NEWS_SORTS, cache=NEWS.derived)
+        return json_response(NEWS.json_bytes())
+    return conditional(NEWS, 'news', build)
 
-@app.route('/api/news/<news_id>', methods=['GET'])
+@bp.route('/api/news/<news_id>', methods=['GET'])
 def get_news_by_id(news_id):
     """Get a specific news article"""
-    news = load_news()
-    article = next((n for n in news if n['id'] == news_id), None)
-    
-    if article:
-        return jsonify(article)
-    return jsonify({'error': 'Article not found'}), 404
-
-@app.route('/api/news', methods=['POST'])
+    def build():
+        article = NEWS.get_full(news_id)
+        if article:
+            return jsonify(article)
+        return jsonify({'error': 'Article not found'}), 404
+    return conditional(NEWS, 'news', build)
+
+@bp.route('/api/news/search', methods=['GET'])
+def search_news():
+    """Ranked full-text search over articles only; the same as /api/search?type=news"""
+    def build():
+        SEARCH.sync('news', NEWS, NEWS_FIELDS)
+        return search_response(SEARCH, ('news',))
+    return conditional(NEWS, 'news-search', build)
+
+@bp.route('/api/news', methods=['POST'])
 def create_news():
     """Create a new news article"""
     try:
@@ -97,12 +197,7 @@ def create_news():
         # Handle additional images upload
         additional_images = []
         if 'additional-images' in request.files:
-            files = request.files.getlist('additional-images')
-            for file in files:
-                if file.filename:
-                    img_path = save_uploaded_file(file)
-                    if img_path:
-                        additional_images.append(img_path)
+            additional_images = save_uploaded_files(request.files.getlist('additional-images'))
         
         # Create article object
         article = {
@@ -117,32 +212,46 @@ def create_news():
             'date': datetime.now().isoformat()
         }
         
-        # Load existing news and add new article
-        news = load_news()
-        news.append(article)
-        save_news(news)
+        # Add new article to the indexed store
+        NEWS.insert(article)
+        BLOBS.set_refs(f'news:{news_id}', record_blobs(article))
+        CHANGES.record('news', news_id)
+        SEARCH.add('news', article, NEWS_FIELDS)
+        if image_path or additional_images:
+            publish_blobs()
+        queue_derivatives(news_id, [image_path] + additional_images)
+        schedule_translation('news', [news_id])
+        schedule_prerender()
         
         return jsonify({'message': 'Article created successfully', 'id': news_id}), 201
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/news/<news_id>', methods=['PUT'])
+@bp.route('/api/news/<news_id>', methods=['PUT'])
 def update_news(news_id):
     """Update an existing news article"""
     try:
-        news = load_news()
-        article = next((n for n in news if n['id'] == news_id), None)
+        article = NEWS.get(news_id)
         
         if not article:
             return jsonify({'error': 'Article not found'}), 404
         
         # Update fields
-        article['title'] = request.form.get('title', article['title'])
-        article['category'] = request.form.get('category', article['category'])
-        article['author'] = request.form.get('author', article['author'])
-        article['excerpt'] = request.form.get('excerpt', article['excerpt'])
-        article['content'] = request.form.get('content', article['content'])
+        changes = {
+            'title': request.form.get('title', article['title']),
+            'category': request.form.get('category', article['category']),
+            'author': request.form.get('author', article['author']),
+            'excerpt': request.form.get('excerpt', article['excerpt']),
+        }
+        # an unchanged body is left where it is stored
+        if 'content' in request.form:
+            changes['content'] = request.form['content']
+        # translations of an edited title or excerpt are dropped and redone
+        retranslate = [f for f in NEWS_LANG_FIELDS if changes[f] != article.get(f)]
+        if retranslate and article.get('translations'):
+            changes['translations'] = {lang: {k: v for k, v in texts.items() if k not in retranslate}
+                                       for lang, texts in article['translations'].items()}
         
         # Handle image upload
         if 'image' in request.files:
@@ -150,72 +259,72 @@ def update_news(news_id):
             if image_file.filename:
                 image_path = save_uploaded_file(image_file)
                 if image_path:
-                    article['image'] = image_path
+                    changes['image'] = image_path
         
         # Handle additional images upload
+        new_images = []
         if 'additional-images' in request.files:
-            files = request.files.getlist('additional-images')
-            new_images = []
-            for file in files:
-                if file.filename:
-                    img_path = save_uploaded_file(file)
-                    if img_path:
-                        new_images.append(img_path)
+            new_images = save_uploaded_files(request.files.getlist('additional-images'))
             
             # Append new images to existing ones
-            if 'images' not in article:
-                article['images'] = []
-            article['images'].extend(new_images)
+            changes['images'] = list(article.get('images') or []) + new_images
         
-        save_news(news)
+        updated = NEWS.update(news_id, changes)
+        if updated is not None:
+            # a replaced main image loses this article's reference
+            BLOBS.set_refs(f'news:{news_id}', record_blobs(updated))
+            CHANGES.record('news', news_id)
+            SEARCH.add('news', updated, NEWS_FIELDS, text=NEWS.expand(updated))
+            if 'content' in changes:
+                schedule_compaction()
+            if 'image' in changes:
+                schedule_blob_gc()
+            if retranslate:
+                schedule_translation('news', [news_id])
+            schedule_prerender()
+        if 'image' in changes or new_images:
+            publish_blobs()
+        queue_derivatives(news_id, [changes.get('image')] + new_images)
         
         return jsonify({'message': 'Article updated successfully'})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/news/<news_id>', methods=['DELETE'])
+@bp.route('/api/news/<news_id>', methods=['DELETE'])
 def delete_news(news_id):
     """Delete a news article"""
     try:
-        news = load_news()
-        article = next((n for n in news if n['id'] == news_id), None)
+        article = NEWS.delete(news_id)
         
         if not article:
             return jsonify({'error': 'Article not found'}), 404
+        SEARCH.remove('news', news_id)
+        CHANGES.record('news', news_id, 'delete')
+        schedule_compaction()
+        schedule_prerender()
         
-        # Remove article from list
-        news = [n for n in news if n['id'] != news_id]
-        save_news(news)
-        
-        # Optionally delete image file
-        if article.get('image'):
-            try:
-                image_path = article['image'].lstrip('/')
-                if os.path.exists(image_path):
-                    os.remove(image_path)
-            except:
-                pass
-        
-        # Delete additional images
-        if article.get('images'):
-            for img in article['images']:
-                try:
-                    img_path = img.lstrip('/')
-                    if os.path.exists(img_path):
-                        os.remove(img_path)
-                except:
-                    pass
+        # Shared blobs go once no record references them; legacy files are deleted outright
+        if BLOBS.release(f'news:{news_id}'):
+            schedule_blob_gc()
+        paths = [article.get('image')] + list(article.get('images') or [])
+        for meta in (article.get('image_variants') or {}).values():
+            paths += [v.get('url') for v in meta.get('variants', [])] + [meta.get('webp')]
+        paths = [p for p in paths if p and p.startswith('/uploads/news/')]
+        if paths:
+            JOBS.enqueue('delete_files', {'paths': paths})
         
         return jsonify({'message': 'Article deleted successfully'})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/uploads/news/<filename>')
+@bp.route('/uploads/news/<path:filename>')
 def uploaded_file(filename):
     """Serve uploaded images"""
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return send_upload(UPLOAD_FOLDER, filename)
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5001)
+    # The projects and news blueprints are served together by main.py
+    import runpy
+    runpy.run_module('main', run_name='__main__')
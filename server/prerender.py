@@ -0,0 +1,489 @@
+"""Static pre-rendering of the public project and news pages.
+
+The public pages fetch JSON after load and build their content in the
+browser, so every visit pays a round trip before anything useful shows. This
+renders, for each language in ``LANGS``:
+
+- ``<lang>/projects.html``: the project list (cards filled in)
+- ``<lang>/projects/<id>.html``: one page per published project
+- ``<lang>/news.html``: the news hub (featured story and first grid page)
+- ``<lang>/news/<id>.html``: one page per article, body included
+
+under the output directory. The site's own HTML files are the templates:
+elements carrying ``data-<lang>`` text are switched to that language, the
+empty containers are filled with the same markup the page scripts build, and
+the data those scripts need is inlined as ``window.__SCCF_DATA__`` so they
+render from it instead of fetching. A relative ``<base>`` keeps the
+templates' asset and page links working from the nested directories.
+
+Builds are incremental. Each page's inputs (its template, language and the
+records shown on it) are hashed, and a manifest keeps the hash every page
+was last written with; only pages whose hash changed are rendered. Those are
+rendered in parallel across a process pool and written with precompressed
+``.gz``/``.br`` siblings. Pages of records that are gone (deleted or
+unpublished) are removed.
+"""
+import hashlib
+import html
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from werkzeug.utils import secure_filename
+
+import metrics
+from publisher import dump_min, write_precompressed
+from storage import FileLock, atomic_write_json
+
+LANGS = ('en', 'si', 'ta')
+TEMPLATES = {
+    'projects': 'projects-list.html',
+    'project': 'projects.html',
+    'news': 'news.html',
+    'article': 'news.html',
+}
+RENDER_VERSION = 1          # bump when the markup below changes, to re-render every page
+PRERENDER_WORKERS = min(os.cpu_count() or 1, 8)
+POOL_MIN_PAGES = 8          # fewer pages than this render in-process; a pool costs more to start
+# quality 11 costs ~6x the time for ~10% smaller pages; pages are rewritten far more often than shards
+PAGE_BROTLI_QUALITY = 9
+NEWS_PER_PAGE = 9           # first grid page of news.js
+RELATED_LIMIT = 3
+PLACEHOLDER_IMAGES = (
+    'assets/images/education/e1.jpg',
+    'assets/images/education/e2.jpg',
+    'assets/images/education/e3.jpg',
+    'assets/images/education/e4.jpg',
+)
+PROJECT_CARD_FIELDS = ('id', 'title', 'summary', 'category', 'status', 'tags', 'featured', 'priority',
+                       'main_image', 'image', 'gallery_images', 'stat1', 'stat2')
+NEWS_CARD_FIELDS = ('id', 'title', 'excerpt', 'category', 'author', 'date', 'image', 'translations')
+
+_templates = {}   # per worker process, set by _init_worker
+
+
+def esc(value):
+    return html.escape(str(value or ''), quote=True)
+
+
+def _text(value, lang):
+    """A ``{en, si, ta}`` field (or a plain string) in ``lang``, English when untranslated."""
+    if isinstance(value, dict):
+        return value.get(lang) or value.get('en') or ''
+    return value if isinstance(value, str) else ''
+
+
+def _i18n(value):
+    """``data-en/si/ta`` attributes of a translatable field, as the page scripts write them."""
+    if not isinstance(value, dict):
+        value = {'en': value or ''}
+    return ' '.join(f'data-{lang}="{esc(value.get(lang))}"' for lang in LANGS)
+
+
+def media(url):
+    """Public URL of a stored image, relative to the site root."""
+    if not isinstance(url, str) or not url:
+        return ''
+    if url.startswith('/uploads/news/'):
+        return url[1:]                  # served from the repository root
+    if url.startswith('/uploads/'):
+        return 'assets' + url           # mirrored into assets/uploads by the publisher
+    return url.lstrip('/')
+
+
+def placeholder(seed):
+    """The same stand-in image main.js picks for a project without a cover."""
+    h = 0
+    for ch in str(seed or ''):
+        h = (h * 31 + ord(ch)) & 0xFFFFFFFF
+    return PLACEHOLDER_IMAGES[h % len(PLACEHOLDER_IMAGES)]
+
+
+def format_date(value):
+    try:
+        d = datetime.fromisoformat(str(value)[:19])
+    except ValueError:
+        return ''
+    return f'{d:%B} {d.day}, {d.year}'
+
+
+def page_path(kind, lang, record_id=None):
+    """Output path of a page relative to the output directory."""
+    if record_id is None:
+        return f'{lang}/{kind}.html'
+    return f'{lang}/{kind}/{secure_filename(str(record_id)) or "page"}.html'
+
+
+def _news_text(article, field, lang):
+    translated = (article.get('translations') or {}).get(lang, {}).get(field) if lang != 'en' else None
+    return translated or article.get(field) or ''
+
+
+# --- markup (mirrors the cards and detail views the page scripts build) -------------------
+
+def project_card(p, href):
+    main = p.get('main_image') or p.get('image') or ''
+    gallery = p.get('gallery_images') or []
+    first = gallery[0] if isinstance(gallery, list) and gallery else ''
+    title = p.get('title')
+    stats = ''.join(f"""
+              <div class="stat">
+                <span class="stat-number">{esc((p.get(k) or {}).get('number'))}</span>
+                <span class="stat-label" {_i18n((p.get(k) or {}).get('label'))}>{esc(_text((p.get(k) or {}).get('label'), 'en'))}</span>
+              </div>""" for k in ('stat1', 'stat2'))
+    fallback = f' data-fbk="{esc(media(first))}"' if first else ''
+    return f"""
+        <article class="project-card" data-category="{esc((p.get('category') or '').strip())}">
+          <div class="project-image">
+            <img src="{esc(media(main))}"{fallback} alt="{esc(_text(title, 'en'))}" loading="lazy" onerror="if(this.dataset.fbk){{var u=this.dataset.fbk; this.dataset.fbk=''; this.src=u;}} else {{ this.onerror=null; this.src='{placeholder(p.get('id') or _text(title, 'en'))}'; }}">
+            <div class="project-overlay">
+              <div class="project-overlay-content">
+                <h3 {_i18n(title)}>{esc(_text(title, 'en'))}</h3>
+                <a href="{esc(href)}" class="btn-overlay" data-en="Learn More" data-si="තව දැනගන්න" data-ta="மேலும் அறிக">Learn More</a>
+              </div>
+            </div>
+          </div>
+          <div class="project-content">
+            <div class="project-meta">
+              <span class="project-category" data-en="{esc(p.get('category'))}">{esc(p.get('category'))}</span>
+              <span class="project-status" data-en="{esc(p.get('status'))}">{esc(p.get('status'))}</span>
+            </div>
+            <h3 {_i18n(title)}>{esc(_text(title, 'en'))}</h3>
+            <p {_i18n(p.get('summary'))}>{esc(_text(p.get('summary'), 'en'))}</p>
+            <div class="project-stats">{stats}
+            </div>
+            <a href="{esc(href)}" class="project-link" data-en="Learn More">Learn More</a>
+          </div>
+        </article>"""
+
+
+def _own(value, lang):
+    """A field's own text in ``lang``, without falling back to English (plain strings are English)."""
+    if isinstance(value, dict):
+        return value.get(lang) or ''
+    return value if lang == 'en' and isinstance(value, str) else ''
+
+
+def _description(p):
+    """The long description per language, the summary where a language has none."""
+    desc = p.get('description') if isinstance(p.get('description'), dict) else {}
+    long = p.get('longDescription') if isinstance(p.get('longDescription'), dict) else {}
+    return {lang: desc.get(lang) or desc.get(f'long_{lang}') or long.get(lang) or _own(p.get('summary'), lang)
+            for lang in LANGS}
+
+
+def _project_detail(p):
+    """``{element id: (inner markup, extra attributes)}`` of projects.html for one project."""
+    title = p.get('title')
+    stats = ''.join(f"<div class=\"p-stat\"><span class=\"num\">{esc((p.get(k) or {}).get('number'))}</span>"
+                    f"<span class=\"label\" {_i18n((p.get(k) or {}).get('label'))}>"
+                    f"{esc(_text((p.get(k) or {}).get('label'), 'en'))}</span></div>"
+                    for k in ('stat1', 'stat2') if p.get(k))
+    description = _description(p)
+    gallery = [u for u in p.get('gallery_images') or [] if u] if isinstance(p.get('gallery_images'), list) else []
+    alt = esc(_text(title, 'en') or 'Project image')
+    cover = media(p.get('main_image') or p.get('image'))
+    return {
+        'crumb-title': (esc(_text(title, 'en')), ' ' + _i18n(title)),
+        'title': (esc(_text(title, 'en')), ' ' + _i18n(title)),
+        'summary': (esc(_text(p.get('summary'), 'en')), ' ' + _i18n(p.get('summary'))),
+        'badge-category': (esc(p.get('category')), ''),
+        'badge-status': (esc(p.get('status')), ''),
+        'cover-wrap': (f'<img id="cover" src="{esc(cover)}" alt="{alt}">' if cover else '', ''),
+        'category': (esc(p.get('category')), ''),
+        'status': (esc(p.get('status')), ''),
+        'stats': (stats, ''),
+        'description': (f"<p class=\"lead\" {_i18n(description)}>{esc(description['en'])}</p>"
+                        if any(description.values()) else '', ''),
+        'gallery-grid': (''.join(f"<div class=\"item\" data-category=\"{esc(p.get('category') or 'community')}\">"
+                                 f"<img data-idx=\"{i}\" src=\"{esc(media(u))}\" alt=\"{alt}\" loading=\"lazy\"></div>"
+                                 for i, u in enumerate(gallery)), ''),
+    }
+
+
+def _news_image(article):
+    return esc(media(article.get('image')) or 'assets/images/placeholder-news.jpg')
+
+
+def featured_news(a, lang, href):
+    return f"""
+    <div class="featured-news-card">
+      <div class="featured-news-image">
+        <span class="featured-badge">Featured</span>
+        <img src="{_news_image(a)}" alt="{esc(_news_text(a, 'title', lang))}">
+      </div>
+      <div class="featured-news-content">
+        <div class="news-meta">
+          <span class="news-category">{esc(a.get('category'))}</span>
+          <span class="news-date">{format_date(a.get('date'))}</span>
+        </div>
+        <h2>{esc(_news_text(a, 'title', lang))}</h2>
+        <p>{esc(_news_text(a, 'excerpt', lang))}</p>
+        <a href="{esc(href)}" class="read-more-btn">Read Full Story</a>
+      </div>
+    </div>"""
+
+
+def news_card(a, lang, href):
+    return f"""
+    <div class="news-card" data-category="{esc((a.get('category') or '').lower())}">
+      <div class="news-card-image">
+        <span class="news-card-category">{esc(a.get('category'))}</span>
+        <img src="{_news_image(a)}" alt="{esc(_news_text(a, 'title', lang))}" loading="lazy">
+      </div>
+      <div class="news-card-content">
+        <div class="news-card-date">{format_date(a.get('date'))}</div>
+        <h3>{esc(_news_text(a, 'title', lang))}</h3>
+        <p class="news-card-excerpt">{esc(_news_text(a, 'excerpt', lang))}</p>
+        <div class="news-card-footer">
+          <span class="news-card-author">{esc(a.get('author') or 'SCCF Team')}</span>
+          <a href="{esc(href)}" class="news-card-link">Read More</a>
+        </div>
+      </div>
+    </div>"""
+
+
+def news_article(a, lang):
+    paragraphs = [p for p in re.split(r'\r?\n', str(a.get('content') or '')) if p.strip()]
+    images = [u for u in (a.get('images') or []) if u] if isinstance(a.get('images'), list) else []
+    gallery = ''
+    if images:
+        gallery = ('\n        <div class="news-image-gallery">\n          <h3>More Images</h3>\n'
+                   '          <div class="news-gallery-grid">'
+                   + ''.join(f'<div class="news-gallery-item"><img src="{esc(media(u))}" alt="Gallery image" loading="lazy"></div>'
+                             for u in images)
+                   + '</div>\n        </div>')
+    return f"""
+    <article class="news-article">
+      <div class="news-modal-header">
+        <img src="{_news_image(a)}" alt="{esc(_news_text(a, 'title', lang))}">
+      </div>
+      <div class="news-modal-body">
+        <div class="news-meta">
+          <span class="news-category">{esc(a.get('category'))}</span>
+          <span class="news-date">{format_date(a.get('date'))}</span>
+        </div>
+        <h1>{esc(_news_text(a, 'title', lang))}</h1>
+        <div class="news-author-info">
+          <span>By {esc(a.get('author') or 'SCCF Team')}</span>
+        </div>
+        <div class="news-full-content">
+          {''.join(f'<p>{esc(p)}</p>' for p in paragraphs)}
+        </div>{gallery}
+      </div>
+    </article>"""
+
+
+# --- template filling ---------------------------------------------------------------------
+
+_SCRIPT = re.compile(r'(<script\b.*?</script>)', re.S | re.I)
+
+
+def localize(markup, lang):
+    """Switch text-only elements that carry a ``data-<lang>`` translation, like switchLanguage()."""
+    pattern = re.compile(r'<(?P<tag>[a-zA-Z][\w-]*)(?P<attrs>[^<>]*?\sdata-' + lang +
+                         r'="(?P<text>[^"]+)"[^<>]*)>[^<]*</(?P=tag)>')
+    parts = _SCRIPT.split(markup)
+    for i in range(0, len(parts), 2):   # never inside <script>
+        parts[i] = pattern.sub(lambda m: f"<{m['tag']}{m['attrs']}>{m['text']}</{m['tag']}>", parts[i])
+    return ''.join(parts)
+
+
+def fill(markup, element_id, inner, attrs=''):
+    """Replace the content of the (non-nested) element with ``id="element_id"``.
+
+    ``attrs`` is appended to its start tag, and a ``hidden`` attribute is
+    dropped once there is something to show.
+    """
+    pattern = re.compile(r'(?P<open><(?P<tag>[a-zA-Z][\w-]*)[^<>]*?\sid="' + re.escape(element_id) + r'"[^<>]*?)'
+                         r'(?P<hidden>\s+hidden)?>.*?(?P<close></(?P=tag)>)', re.S)
+
+    def replace(m):
+        hidden = m['hidden'] if m['hidden'] and not inner else ''
+        return f"{m['open']}{attrs}{hidden}>{inner}{m['close']}"
+    return pattern.sub(replace, markup, count=1)
+
+
+def fill_class(markup, cls, inner, attrs=''):
+    """Replace the content of the first ``<div class="cls">``."""
+    pattern = re.compile(r'(<div class="' + re.escape(cls) + r'"[^<>]*)>.*?(</div>)', re.S)
+    return pattern.sub(lambda m: f'{m.group(1)}{attrs}>{inner}{m.group(2)}', markup, count=1)
+
+
+def inline_data(data):
+    # keep "</script>" and friends inert inside the JSON
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    payload = payload.replace('<', '\\u003c').replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+    return f'<script>window.__SCCF_DATA__ = {payload};</script>'
+
+
+def frame(markup, lang, path, data, title=None, description=None):
+    """Language, base URL, head metadata and inlined data common to every page at ``path``."""
+    base = '../' * path.count('/')
+    markup = re.sub(r'<html lang="[^"]*"', f'<html lang="{lang}" data-prerendered="{lang}"', markup, count=1)
+    markup = re.sub(r'<head>', f'<head>\n  <base href="{base}">', markup, count=1)
+    if title:
+        markup = re.sub(r'<title>.*?</title>', lambda m: f'<title>{esc(title)} - SCCF</title>', markup, count=1, flags=re.S)
+    if description:
+        markup = re.sub(r'(<meta name="description" content=")[^"]*', lambda m: m.group(1) + esc(description), markup, count=1)
+    markup = markup.replace('</head>', f'  {inline_data(data)}\n</head>', 1)
+    return localize(markup, lang)
+
+
+def render(kind, lang, rel, data, prefix=''):
+    """The HTML of the page ``rel`` from the worker's templates.
+
+    ``prefix`` is the output directory relative to the site root, e.g. ``pages/``.
+    """
+    path = prefix + rel
+    markup = _templates[kind]
+    # stay on the pre-rendered pages of this language
+    markup = markup.replace('href="projects-list.html"', f'href="{prefix}{page_path("projects", lang)}"')
+    markup = markup.replace('href="news.html"', f'href="{prefix}{page_path("news", lang)}"')
+    if kind == 'projects':
+        cards = ''.join(project_card(p, p['page']) for p in data['projects'])
+        markup = fill_class(markup, 'projects-grid', cards + '\n      ', ' data-prerendered')
+        return frame(markup, lang, path, data)
+    if kind == 'project':
+        p = data['project']
+        for element_id, (inner, attrs) in _project_detail(p).items():
+            markup = fill(markup, element_id, inner, attrs)
+        if p.get('gallery_images'):
+            markup = markup.replace('<section id="gallery" class="p-gallery" hidden>', '<section id="gallery" class="p-gallery">', 1)
+        return frame(markup, lang, path, data, title=_text(p.get('title'), lang), description=_text(p.get('summary'), lang))
+    if kind == 'news':
+        news = data['news']
+        if news:
+            markup = fill(markup, 'featured-news', featured_news(news[0], lang, news[0]['page']))
+            markup = fill(markup, 'news-grid', ''.join(news_card(a, lang, a['page']) for a in news[1:NEWS_PER_PAGE + 1]))
+        return frame(markup, lang, path, data)
+    a = data['article']
+    markup = fill(markup, 'featured-news', news_article(a, lang))
+    markup = re.sub(r'<section class="news-section">.*?</section>', '', markup, count=1, flags=re.S)
+    return frame(markup, lang, path, data, title=_news_text(a, 'title', lang),
+                 description=_news_text(a, 'excerpt', lang))
+
+
+def _init_worker(templates):
+    _templates.clear()
+    _templates.update(templates)
+
+
+def _render_page(job):
+    rel, kind, lang, data, out_dir, prefix = job
+    body = render(kind, lang, rel, data, prefix).encode('utf-8')
+    write_precompressed(os.path.join(out_dir, rel), body, brotli_quality=PAGE_BROTLI_QUALITY)
+    return rel, len(body)
+
+
+# --- planning -----------------------------------------------------------------------------
+
+def _card(record, fields, page):
+    entry = {k: record[k] for k in fields if k in record}
+    entry['page'] = page
+    return entry
+
+
+def _excerpt(article):
+    if article.get('excerpt'):
+        return article
+    content = str(article.get('content') or '')
+    return {**article, 'excerpt': content if len(content) <= 200 else content[:200].strip() + '...'}
+
+
+def plan(projects, news, prefix=''):
+    """``[(path in the output directory, kind, lang, data)]`` for every page of the site.
+
+    Page links in ``data`` are relative to the site root, i.e. start with ``prefix``.
+    """
+    projects = [p for p in projects if p.get('published')]
+    news = sorted((_excerpt(a) for a in news), key=lambda a: str(a.get('date') or ''), reverse=True)
+    pages = []
+    for lang in LANGS:
+        cards = [_card(p, PROJECT_CARD_FIELDS, prefix + page_path('projects', lang, p.get('id'))) for p in projects]
+        pages.append((page_path('projects', lang), 'projects', lang, {'projects': cards}))
+        for p, card in zip(projects, cards):
+            related = [c for c in cards if c['id'] != card['id'] and c.get('category') == card.get('category')]
+            pages.append((page_path('projects', lang, p.get('id')), 'project', lang,
+                          {'project': {**p, 'page': card['page']}, 'related': related[:RELATED_LIMIT]}))
+        items = [_card(a, NEWS_CARD_FIELDS, prefix + page_path('news', lang, a.get('id'))) for a in news]
+        pages.append((page_path('news', lang), 'news', lang, {'news': items}))
+        for a, item in zip(news, items):
+            pages.append((page_path('news', lang, a.get('id')), 'article', lang, {'article': {**a, 'page': item['page']}}))
+    return pages
+
+
+def _load_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data.get('pages', {}) if isinstance(data, dict) else {}
+
+
+def _remove(out_dir, rel):
+    for suffix in ('', '.gz', '.br'):
+        try:
+            os.remove(os.path.join(out_dir, rel + suffix))
+        except OSError:
+            pass
+
+
+@metrics.span('publish.prerender')
+def build(projects, news, site_root, out_dir, manifest_path, dry_run=False, force=False,
+          workers=PRERENDER_WORKERS):
+    """Bring the pre-rendered pages in ``out_dir`` up to date; returns a report dict.
+
+    ``projects`` and ``news`` are the full record lists (unpublished projects
+    are left out here); articles need their ``content``. ``out_dir`` has to
+    be inside ``site_root`` for the pages' asset links to resolve. ``force``
+    renders every page regardless of the manifest.
+    """
+    prefix = os.path.relpath(out_dir, site_root).replace(os.sep, '/')
+    prefix = '' if prefix == '.' else prefix + '/'
+    templates = {}
+    template_digests = {}
+    for kind, name in TEMPLATES.items():
+        with open(os.path.join(site_root, name), 'r', encoding='utf-8') as f:
+            templates[kind] = f.read()
+        template_digests[kind] = hashlib.sha256(templates[kind].encode('utf-8')).hexdigest()
+
+    with FileLock(manifest_path):
+        old = {} if force else _load_manifest(manifest_path)
+        new, jobs = {}, []
+        for rel, kind, lang, data in plan(projects, news, prefix):
+            h = hashlib.sha256(f'{RENDER_VERSION}:{template_digests[kind]}:{lang}:{prefix}:'.encode('utf-8'))
+            h.update(dump_min(data))
+            digest = h.hexdigest()
+            new[rel] = digest
+            if old.get(rel) != digest or not os.path.exists(os.path.join(out_dir, rel)):
+                jobs.append((rel, kind, lang, data, out_dir, prefix))
+        removed = [rel for rel in old if rel not in new]
+        report = {
+            'dry_run': dry_run,
+            'rendered': len(jobs),
+            'unchanged': len(new) - len(jobs),
+            'removed': len(removed),
+            'pages': {'render': sorted(j[0] for j in jobs), 'remove': sorted(removed)},
+        }
+        if dry_run:
+            return report
+
+        written = 0
+        if len(jobs) >= POOL_MIN_PAGES and workers > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), initializer=_init_worker,
+                                     initargs=(templates,)) as pool:
+                for _, size in pool.map(_render_page, jobs, chunksize=max(1, len(jobs) // (workers * 4))):
+                    written += size
+        else:
+            _init_worker(templates)
+            for job in jobs:
+                written += _render_page(job)[1]
+        for rel in removed:
+            _remove(out_dir, rel)
+        report['bytes'] = written
+        atomic_write_json(manifest_path, {'version': 1, 'pages': new}, indent=None)
+        return report
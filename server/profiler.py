@@ -0,0 +1,84 @@
+"""Opt-in sampling profiler for live servers.
+
+A profile is captured in the thread that handles the profile request: that
+thread snapshots every other thread's Python stack (``sys._current_frames``)
+every ``interval`` seconds and counts identical stacks, so the request (and
+the worker thread serving it) is busy for the whole capture. The result is in the "folded" format, one
+``outer;inner;leaf count`` line per stack, which flamegraph.pl, speedscope
+and inferno read directly. Sampling costs nothing when no profile is running
+and only a few percent of one core while it is; it sees the threads of the
+process that serves the request (one worker under gunicorn).
+
+Enabled with ``SCCF_PROFILING=1``; served at ``GET /admin/profile`` (see
+metrics.py).
+"""
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from config import Config
+
+DEFAULT_SECONDS = 10.0
+DEFAULT_INTERVAL = 0.005
+MIN_SECONDS = 0.1
+MAX_SECONDS = 60.0
+MIN_INTERVAL = 0.001
+MAX_INTERVAL = 1.0
+
+_running = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """Another profile is already being captured."""
+
+
+def enabled():
+    return Config.PROFILING
+
+
+def check_args(seconds, interval):
+    """Raise ValueError unless ``seconds`` and ``interval`` are within the allowed bounds."""
+    if not (math.isfinite(seconds) and MIN_SECONDS <= seconds <= MAX_SECONDS):
+        raise ValueError(f'seconds must be between {MIN_SECONDS:g} and {MAX_SECONDS:g}')
+    if not (math.isfinite(interval) and MIN_INTERVAL <= interval <= MAX_INTERVAL):
+        raise ValueError(f'interval must be between {MIN_INTERVAL:g} and {MAX_INTERVAL:g}')
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def _stack(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ';'.join(labels)
+
+
+def sample(seconds=DEFAULT_SECONDS, interval=DEFAULT_INTERVAL):
+    """Sample all other threads for ``seconds``, blocking the caller, and return folded stacks as text."""
+    check_args(seconds, interval)
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        stacks = Counter()
+        names = {}
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stacks[f'{names.get(ident, ident)};{_stack(frame)}'] += 1
+            time.sleep(interval)
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+    finally:
+        _running.release()
@@ -0,0 +1,285 @@
+"""Incremental publishing of server/uploads into assets/uploads.
+
+A manifest records the content hash, size and mtime of every source file that
+has been published. A publish walks the source tree once (one stat per file
+via ``os.scandir``), skips files whose size and mtime match the manifest,
+hashes the rest and copies only those whose content actually changed. Copies
+run in parallel and use a hardlink when source and target share a filesystem.
+Files that were published before but no longer exist in the source are
+pruned from the target; files in the target that the publisher never wrote
+are left alone.
+
+The public JSON consumed by the static site is emitted minified with
+precompressed ``.gz`` and ``.br`` siblings (brotli only if the module is
+installed). Projects are additionally split into a small list index and
+per-project detail shards whose file names carry a content hash, so shards
+can be cached forever and the list page does not download every long
+description.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.utils import secure_filename
+
+import metrics
+from storage import FileLock, atomic_write_bytes, atomic_write_json
+
+try:
+    import brotli
+except ImportError:  # .br siblings are skipped without the brotli module
+    brotli = None
+
+PUBLISH_WORKERS = 8
+HASH_CHUNK = 1024 * 1024
+
+
+def _is_temp(name):
+    return name.startswith('.') or name.endswith('.part') or name.endswith('.tmp')
+
+
+def _walk(root):
+    """Yield ``(relative posix path, DirEntry)`` for every regular file under ``root``."""
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            with os.scandir(os.path.join(root, rel_dir)) as it:
+                for entry in it:
+                    if _is_temp(entry.name):
+                        continue
+                    rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(rel)
+                    elif entry.is_file():
+                        yield rel, entry
+        except FileNotFoundError:
+            continue
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _load_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data.get('files', {}) if isinstance(data, dict) else {}
+
+
+def _link_or_copy(src, dst, same_device):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        if os.path.samefile(src, dst):
+            # Already hardlinked; rename() onto the same inode would be a no-op
+            return
+    except OSError:
+        pass
+    tmp = f"{dst}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        if same_device:
+            try:
+                os.link(src, tmp)
+            except OSError:
+                shutil.copy2(src, tmp)
+        else:
+            shutil.copy2(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+@metrics.span('publish.uploads')
+def publish(src_root, dst_root, manifest_path, dry_run=False, link=True, workers=PUBLISH_WORKERS):
+    """Bring ``dst_root`` up to date with ``src_root``; returns a report dict.
+
+    With ``dry_run`` nothing is written and the report lists what would be
+    transferred. ``link=False`` always copies instead of hardlinking.
+    """
+    with FileLock(manifest_path):
+        old = _load_manifest(manifest_path)
+        new = {}
+        candidates = []
+        unchanged = 0
+        for rel, entry in _walk(src_root):
+            st = entry.stat()
+            prev = old.get(rel)
+            if prev and prev.get('size') == st.st_size and prev.get('mtime_ns') == st.st_mtime_ns:
+                new[rel] = prev
+                unchanged += 1
+            else:
+                candidates.append((rel, entry.path, st))
+
+        def classify(item):
+            rel, src, st = item
+            digest = file_hash(src)
+            record = {'sha256': digest, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+            prev = old.get(rel)
+            dst = os.path.join(dst_root, rel)
+            if prev and prev.get('sha256') == digest:
+                return rel, record, False
+            # Already mirrored (e.g. by an earlier run whose manifest was lost) with identical content
+            if not prev and os.path.isfile(dst) and os.path.getsize(dst) == st.st_size and file_hash(dst) == digest:
+                return rel, record, False
+            return rel, record, True
+
+        to_copy = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for rel, record, changed in pool.map(classify, candidates):
+                new[rel] = record
+                if changed:
+                    to_copy.append(rel)
+                else:
+                    unchanged += 1
+
+        orphans = [rel for rel in old if rel not in new]
+        report = {
+            'dry_run': dry_run,
+            'copied': len(to_copy),
+            'copied_bytes': sum(new[rel]['size'] for rel in to_copy),
+            'pruned': len(orphans),
+            'pruned_bytes': sum(old[rel].get('size', 0) for rel in orphans),
+            'unchanged': unchanged,
+            'files': {'copy': sorted(to_copy), 'prune': sorted(orphans)},
+        }
+        if dry_run:
+            return report
+
+        same_device = False
+        if link:
+            os.makedirs(dst_root, exist_ok=True)
+            try:
+                same_device = os.stat(src_root).st_dev == os.stat(dst_root).st_dev
+            except OSError:
+                same_device = False
+
+        def copy(rel):
+            _link_or_copy(os.path.join(src_root, rel), os.path.join(dst_root, rel), same_device)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(copy, to_copy))
+        for rel in orphans:
+            try:
+                os.remove(os.path.join(dst_root, rel))
+            except OSError:
+                pass
+
+        atomic_write_json(manifest_path, {'version': 1, 'files': new}, indent=None)
+        return report
+
+
+# Fields the project list/cards need (main.js renders the cards from the index); everything else
+# lives in the detail shard. ``gallery_images`` is cut to its first image, the card's image fallback.
+INDEX_FIELDS = ('id', 'title', 'summary', 'category', 'status', 'tags', 'featured', 'priority',
+                'published', 'main_image', 'image', 'stat1', 'stat2', 'gallery_images')
+SHARD_DIR = 'p'
+_SHARD_NAME = re.compile(r'^.+\.[0-9a-f]{12}\.json$')
+
+
+def dump_min(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def write_precompressed(path, data: bytes, brotli_quality=11):
+    """Write ``data`` plus ``.gz``/``.br`` siblings; unchanged files are left untouched."""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data and os.path.exists(path + '.gz'):
+                return False
+    except OSError:
+        pass
+    atomic_write_bytes(path, data)
+    atomic_write_bytes(path + '.gz', gzip.compress(data, 9, mtime=0))
+    if brotli is not None:
+        atomic_write_bytes(path + '.br', brotli.compress(data, quality=brotli_quality))
+    return True
+
+
+@metrics.span('publish.projects_bundle')
+def write_projects_bundle(projects, assets_dir, changed=None):
+    """Emit the public project bundle for the static site.
+
+    - ``projects.json``: all given projects, minified (kept for existing pages)
+    - ``projects/index.json``: list fields only, with each project's ``detail`` shard URL
+    - ``projects/p/<id>.<hash>.json``: full project record, immutable
+    Shards referenced by neither the new nor the previous index are removed.
+    Everything is written under a lock on the index, so concurrent publishers
+    (another worker, the CLI scripts) never prune each other's shards.
+
+    ``changed`` is an optional set of project ids known to differ from the
+    last bundle; other projects reuse their previous index entry and shard
+    instead of being serialized and hashed again.
+    """
+    projects = list(projects)
+    bundle_dir = os.path.join(assets_dir, 'projects')
+    index_path = os.path.join(bundle_dir, 'index.json')
+    with FileLock(index_path):
+        write_precompressed(os.path.join(assets_dir, 'projects.json'), dump_min(projects))
+        return _write_bundle(projects, bundle_dir, index_path, changed)
+
+
+def _write_bundle(projects, bundle_dir, index_path, changed):
+    shard_dir = os.path.join(bundle_dir, SHARD_DIR)
+    os.makedirs(shard_dir, exist_ok=True)
+
+    keep = set()
+    previous = {}
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            for e in json.load(f):
+                if e.get('detail'):
+                    keep.add(e['detail'].rsplit('/', 1)[-1])
+                    previous[str(e.get('id', ''))] = e
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        pass
+
+    index = []
+    for p in projects:
+        pid = str(p.get('id', ''))
+        entry = previous.get(pid) if changed is not None and pid not in changed else None
+        if entry is not None and any(k in p and k not in entry for k in INDEX_FIELDS):
+            entry = None    # written before a field was added to INDEX_FIELDS
+        if entry is not None and os.path.exists(os.path.join(shard_dir, entry['detail'].rsplit('/', 1)[-1])):
+            index.append(entry)
+            continue
+        body = dump_min(p)
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        name = f"{secure_filename(str(p.get('id', ''))) or 'project'}.{digest}.json"
+        shard_path = os.path.join(shard_dir, name)
+        if not os.path.exists(shard_path):
+            write_precompressed(shard_path, body)
+        keep.add(name)
+        entry = {k: p[k] for k in INDEX_FIELDS if k in p}
+        if isinstance(entry.get('gallery_images'), list):
+            entry['gallery_images'] = entry['gallery_images'][:1]
+        main_variants = (p.get('image_variants') or {}).get(p.get('main_image'))
+        if main_variants:
+            entry['main_image_variants'] = main_variants
+        entry['detail'] = f"assets/projects/{SHARD_DIR}/{name}"
+        index.append(entry)
+    write_precompressed(index_path, dump_min(index))
+
+    for fn in os.listdir(shard_dir):
+        base = re.sub(r'\.(gz|br)$', '', fn)
+        if _SHARD_NAME.match(base) and base not in keep:
+            try:
+                os.remove(os.path.join(shard_dir, fn))
+            except OSError:
+                pass
+    return index
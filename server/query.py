@@ -0,0 +1,224 @@
+"""Pagination, filtering, sorting and field projection for the list APIs.
+
+A list endpoint without any of these query parameters keeps returning the
+full, cached JSON array. With them, the body is still a JSON array, limited to
+the requested page; the cursor for the next page is sent in the
+``X-Next-Cursor`` header and as a ``Link: <...>; rel="next"`` header.
+
+  ?limit=20&cursor=...         page size (max MAX_LIMIT) and opaque cursor;
+                               without limit all matching records are returned
+  ?sort=-priority,id           comma-separated sort keys, '-' for descending
+  ?fields=id,title,main_image  keep only these top-level fields
+  ?category=...&tag=...        endpoint-specific filters (see *_FILTERS)
+"""
+import base64
+import json
+from urllib.parse import urlencode
+
+from flask import Response, request
+
+MAX_LIMIT = 500
+PAGING_PARAMS = ('limit', 'cursor', 'sort', 'fields')
+
+
+class QueryError(ValueError):
+    """Invalid list query parameter; reported to the client as a 400."""
+
+
+def parse_bool(value):
+    v = (value or '').strip().lower()
+    if v in ('1', 'true', 'yes', 'on'):
+        return True
+    if v in ('0', 'false', 'no', 'off'):
+        return False
+    raise QueryError(f'expected a boolean, got {value!r}')
+
+
+def _text(value):
+    return (value or '').strip().lower()
+
+
+def _equals(field):
+    return lambda v: (lambda r: _text(str(r.get(field) or '')) == _text(v))
+
+
+def _has_tag(v):
+    wanted = _text(v)
+    return lambda r: any(_text(t) == wanted for t in (r.get('tags') or []))
+
+
+def _flag(field):
+    def build(v):
+        wanted = parse_bool(v)
+        return lambda r: bool(r.get(field)) == wanted
+    return build
+
+
+def _date_from(v):
+    v = v.strip()
+    return lambda r: str(r.get('date') or '')[:len(v)] >= v
+
+
+def _date_to(v):
+    v = v.strip()
+    return lambda r: bool(r.get('date')) and str(r.get('date'))[:len(v)] <= v
+
+
+def _localized(field):
+    def key(r):
+        value = r.get(field)
+        if isinstance(value, dict):
+            value = value.get('en') or ''
+        return _text(str(value or ''))
+    return key
+
+
+def _int_field(field):
+    def key(r):
+        try:
+            return int(r.get(field) or 0)
+        except (TypeError, ValueError):
+            return 0
+    return key
+
+
+PROJECT_FILTERS = {
+    'category': _equals('category'),
+    'status': _equals('status'),
+    'tag': _has_tag,
+    'published': _flag('published'),
+    'featured': _flag('featured'),
+}
+
+PROJECT_SORTS = {
+    # 'id' descending is the manage page's ordering
+    'id': lambda r: str(r.get('id', '')),
+    'priority': _int_field('priority'),
+    'featured': lambda r: bool(r.get('featured')),
+    'category': _localized('category'),
+    'title': _localized('title'),
+}
+
+GALLERY_FILTERS = {
+    'category': _equals('category'),
+    'tag': _has_tag,
+    'project': _equals('projectId'),
+}
+
+GALLERY_SORTS = {}
+
+NEWS_FILTERS = {
+    'category': _equals('category'),
+    'author': _equals('author'),
+    'from': _date_from,
+    'to': _date_to,
+}
+
+NEWS_SORTS = {
+    'date': lambda r: str(r.get('date') or ''),
+    'title': _localized('title'),
+    'category': _localized('category'),
+}
+
+
+def is_list_query(args, filters):
+    return any(k in args for k in PAGING_PARAMS) or any(k in args for k in filters)
+
+
+def _encode_cursor(offset):
+    return base64.urlsafe_b64encode(f'o:{offset}'.encode('ascii')).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+        kind, _, offset = raw.partition(':')
+        if kind != 'o' or int(offset) < 0:
+            raise ValueError
+        return int(offset)
+    except ValueError:
+        raise QueryError('invalid cursor')
+
+
+def _parse_limit(value):
+    if value is None or value == '':
+        return None
+    try:
+        limit = int(value)
+    except ValueError:
+        raise QueryError('limit must be an integer')
+    if limit < 1:
+        raise QueryError('limit must be positive')
+    return min(limit, MAX_LIMIT)
+
+
+def _parse_sort(value, sorts):
+    spec = []
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        desc = part.startswith('-')
+        name = part.lstrip('-+')
+        if name not in sorts:
+            raise QueryError(f'unknown sort key {name!r}; expected one of {", ".join(sorted(sorts)) or "none"}')
+        spec.append((name, desc))
+    return tuple(spec)
+
+
+def _sorted(records, spec, sorts):
+    result = list(records)
+    # Stable sorts applied from the least significant key
+    for name, desc in reversed(spec):
+        result.sort(key=sorts[name], reverse=desc)
+    return result
+
+
+def run_list_query(records, args, filters, sorts, cache=None):
+    """Return ``(page, next_cursor)`` for ``records`` under the query ``args``.
+
+    ``cache(key, build)`` (e.g. ``repository.derived``) memoizes sorted orders
+    so repeated page requests don't re-sort the collection.
+    """
+    limit = _parse_limit(args.get('limit'))
+    offset = _decode_cursor(args['cursor']) if args.get('cursor') else 0
+    spec = _parse_sort(args.get('sort'), sorts)
+    if spec:
+        if cache is not None:
+            records = cache(('sorted', spec), lambda recs: _sorted(recs, spec, sorts))
+        else:
+            records = _sorted(records, spec, sorts)
+
+    predicates = [build(args[name]) for name, build in filters.items() if args.get(name) not in (None, '')]
+    fields = [f.strip() for f in (args.get('fields') or '').split(',') if f.strip()]
+
+    page = []
+    matched = 0
+    has_more = False
+    for r in records:
+        if predicates and not all(p(r) for p in predicates):
+            continue
+        if matched >= offset:
+            if limit is not None and len(page) == limit:
+                has_more = True
+                break
+            page.append({f: r[f] for f in fields if f in r} if fields else r)
+        matched += 1
+    return page, (_encode_cursor(offset + limit) if has_more else None)
+
+
+def list_response(records, filters, sorts, cache=None):
+    """Flask response for the current request's list query."""
+    try:
+        page, next_cursor = run_list_query(records, request.args, filters, sorts, cache)
+    except QueryError as e:
+        return Response(json.dumps({'error': str(e)}), status=400, mimetype='application/json')
+    body = json.dumps(page, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    resp = Response(body, mimetype='application/json')
+    if next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        resp.headers['X-Next-Cursor'] = next_cursor
+        next_url = request.base_url + '?' + urlencode(args, safe=',-')
+        resp.headers['Link'] = f'<{next_url}>; rel="next"'
+    return resp
@@ -0,0 +1,317 @@
+"""In-memory, process-wide view of the JSON data files.
+
+Parsing the data file on every request makes JSON decoding the dominant cost of
+the read APIs, so a repository keeps the parsed records in memory and only
+re-reads the file when its mtime or size changes. Derived artifacts (serialized
+response bodies, the flattened gallery) are computed lazily and dropped
+whenever the underlying records change.
+
+Records are held in an insertion-ordered dict keyed on the normalized id, so
+lookups and single-record mutations do not depend on the number of records.
+Mutations run under the store's cross-process lock against freshly loaded
+state and are saved as a compare-and-swap on the store's version counter.
+"""
+import json
+import threading
+from contextlib import contextmanager
+
+import metrics
+from images import srcset
+from storage import JsonStore
+
+_UNSET = object()
+
+
+def normalize_id(value):
+    """Canonical form of a record id used as the index key."""
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+class JsonRepository:
+    """Cached, id-indexed records backed by a JSON array on disk.
+
+    Records handed out by ``records()`` and ``get()`` are shared between
+    requests and must be treated as read-only. Mutations go through
+    ``insert()``, ``update()`` and ``delete()``, which replace records instead
+    of modifying them in place.
+    """
+
+    def __init__(self, path, store=None):
+        self.path = path
+        self.store = store if store is not None else JsonStore(path)
+        self._lock = threading.RLock()
+        self._signature = _UNSET
+        self._version = None
+        self._items = {}
+        self._derived = {}
+
+    def _stat_signature(self):
+        return self.store.signature()
+
+    def _set(self, records, signature, version=None):
+        items = {}
+        for r in records:
+            if not isinstance(r, dict):
+                continue
+            key = normalize_id(r.get('id'))
+            if not key or key in items:
+                # Keep id-less and duplicate records, just not addressable by id
+                key = ('#', len(items))
+            items[key] = r
+        self._items = items
+        self._derived = {}
+        self._signature = signature
+        self._version = version
+
+    def _refresh(self):
+        signature = self._stat_signature()
+        name = getattr(self.store, 'name', 'store')
+        if signature == self._signature:
+            metrics.CACHE.inc(name, 'hit')
+            return
+        metrics.CACHE.inc(name, 'miss')
+        with metrics.span(f'storage.load.{name}'):
+            records, version = self.store.load()
+            self._set(records, signature, version)
+
+    @contextmanager
+    def _writing(self):
+        """Hold the write lock over fresh state; drop the cache if the write fails."""
+        with self._lock, self.store.lock():
+            self._refresh()
+            try:
+                yield
+            except BaseException:
+                self._signature = _UNSET
+                raise
+
+    def _changed(self, upserts=(), deletes=()):
+        self._derived = {}
+        self._persist(upserts, deletes)
+
+    def _persist(self, upserts=(), deletes=()):
+        self._version = self.store.write_changes(
+            lambda: list(self._items.values()), upserts, deletes, expected_version=self._version)
+        self._signature = self._stat_signature()
+
+    def records(self):
+        """Return the current records, reloading only if the file changed."""
+        with self._lock:
+            self._refresh()
+            if 'list' not in self._derived:
+                self._derived['list'] = list(self._items.values())
+            return self._derived['list']
+
+    def snapshot(self):
+        """Return ``(signature, {key: record})`` for consumers that diff by identity."""
+        with self._lock:
+            self._refresh()
+            return self._signature, dict(self._items)
+
+    def get(self, record_id):
+        with self._lock:
+            self._refresh()
+            return self._items.get(normalize_id(record_id))
+
+    def __contains__(self, record_id):
+        return self.get(record_id) is not None
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._items)
+
+    def derived(self, key, build):
+        """Memoize ``build(records)`` until the records change."""
+        with self._lock:
+            self._refresh()
+            if key not in self._derived:
+                self._derived[key] = build(self.records())
+            return self._derived[key]
+
+    def json_bytes(self):
+        """Serialized JSON body of the full record list."""
+        return self.derived('json', _dump_bytes)
+
+    def insert(self, record):
+        """Append ``record``; returns False if its id is already taken."""
+        key = normalize_id(record.get('id'))
+        with self._writing():
+            if not key or key in self._items:
+                return False
+            self._items[key] = record
+            self._changed(upserts=[record])
+            return True
+
+    def update(self, record_id, changes):
+        """Replace the record with a copy that has ``changes`` applied.
+
+        ``changes`` is a dict, or a callable that receives the current record
+        (loaded under the write lock) and returns the dict to apply.
+        Returns the new record, or None when no record has that id.
+        """
+        key = normalize_id(record_id)
+        with self._writing():
+            current = self._items.get(key)
+            if current is None:
+                return None
+            updated = dict(current)
+            updated.update(changes(current) if callable(changes) else changes)
+            self._items[key] = updated
+            self._changed(upserts=[updated])
+            return updated
+
+    def update_many(self, changes_by_id):
+        """Apply several ``update`` calls in one locked write.
+
+        ``changes_by_id`` maps record id to a dict or callable, as for
+        ``update``. Returns ``{id: new record or None}``; nothing is written
+        when none of the ids exist.
+        """
+        results = {}
+        with self._writing():
+            upserts = []
+            for record_id, changes in changes_by_id.items():
+                key = normalize_id(record_id)
+                current = self._items.get(key)
+                if current is None:
+                    results[record_id] = None
+                    continue
+                updated = dict(current)
+                updated.update(changes(current) if callable(changes) else changes)
+                self._items[key] = updated
+                upserts.append(updated)
+                results[record_id] = updated
+            if upserts:
+                self._changed(upserts=upserts)
+        return results
+
+    def upsert_many(self, records, replace=True):
+        """Insert or replace several whole records in one locked write.
+
+        A record whose id is taken replaces the existing one, or is skipped
+        when ``replace`` is False. Returns ``(inserted ids, replaced ids,
+        skipped ids)``; nothing is written when every record was skipped.
+        """
+        inserted, replaced, skipped = [], [], []
+        with self._writing():
+            upserts = []
+            for record in records:
+                key = normalize_id(record.get('id'))
+                if key in self._items:
+                    if not replace:
+                        skipped.append(key)
+                        continue
+                    replaced.append(key)
+                else:
+                    inserted.append(key)
+                self._items[key] = record
+                upserts.append(record)
+            if upserts:
+                self._changed(upserts=upserts)
+        return inserted, replaced, skipped
+
+    def delete(self, record_id):
+        """Remove and return the record, or None when no record has that id."""
+        key = normalize_id(record_id)
+        with self._writing():
+            removed = self._items.pop(key, None)
+            if removed is not None:
+                self._changed(deletes=[key])
+            return removed
+
+    def save(self, records):
+        """Persist ``records`` and make them the cached state."""
+        with self._writing():
+            records = list(records)
+            self._set(records, None, self._version)
+            self._version = self.store.save(records, expected_version=self._version)
+            self._signature = self._stat_signature()
+
+
+class ProjectRepository(JsonRepository):
+    """Project records plus the flattened gallery served by /api/gallery."""
+
+    def gallery(self):
+        return self.derived('gallery', _build_gallery)
+
+    def gallery_json_bytes(self):
+        return self.derived('gallery_json', lambda _: _dump_bytes(self.gallery()))
+
+
+class NewsRepository(JsonRepository):
+    """News articles served by news_app.
+
+    With a store that keeps bodies apart (segment_store.SegmentStore) the
+    cached records carry no ``content``: lists never load article bodies, and
+    ``get_full``/``expand`` read one body when a single article is shown.
+    With the other stores both return the cached record as is.
+    """
+
+    def _lazy_bodies(self):
+        return hasattr(self.store, 'body')
+
+    def expand(self, record):
+        """``record`` with its ``content`` (a new dict; the cached record is not touched)."""
+        if record is None or not self._lazy_bodies() or 'content' in record:
+            return record
+        body = self.store.body(record.get('id'))
+        return record if body is None else {**record, 'content': body}
+
+    def get_full(self, record_id):
+        return self.expand(self.get(record_id))
+
+    def _changed(self, upserts=(), deletes=()):
+        if self._lazy_bodies():
+            # the store takes the bodies; the cache keeps only the metadata
+            for record in upserts:
+                if 'content' in record:
+                    key = normalize_id(record.get('id'))
+                    self._items[key] = {k: v for k, v in record.items() if k != 'content'}
+        super()._changed(upserts, deletes)
+
+    def save(self, records):
+        super().save(records)
+        if self._lazy_bodies():
+            with self._lock:
+                self._signature = _UNSET   # reload without the bodies
+
+    def compact(self):
+        """Reclaim space left by replaced and deleted bodies, if the store has any."""
+        if not self._lazy_bodies():
+            return None
+        with self._lock:
+            return self.store.compact()
+
+
+def _dump_bytes(data):
+    with metrics.span('serialize.json'):
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _gallery_item(p, url):
+    item = {
+        'url': url,
+        'category': p.get('category', ''),
+        'tags': p.get('tags', []),
+        'projectId': p.get('id'),
+    }
+    meta = (p.get('image_variants') or {}).get(url)
+    if meta:
+        item['width'] = meta.get('width')
+        item['height'] = meta.get('height')
+        item['placeholder'] = meta.get('placeholder')
+        item['srcset'] = {fmt: srcset(meta, fmt) for fmt in sorted({v['format'] for v in meta.get('variants', [])})}
+    return item
+
+
+def _build_gallery(projects):
+    items = []
+    for p in projects:
+        if p.get('main_image'):
+            items.append(_gallery_item(p, p['main_image']))
+        for url in p.get('gallery_images', []) or []:
+            items.append(_gallery_item(p, url))
+    return items
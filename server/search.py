@@ -0,0 +1,242 @@
+"""In-process full-text search over projects and news.
+
+Text is NFC-normalized and case-folded; a token is a run of letters, combining
+marks and digits, which keeps Sinhala and Tamil words (vowel signs and viramas
+are combining marks) intact. Zero-width joiners used in Sinhala conjuncts are
+dropped so queries match with or without them.
+
+Documents are kept in an inverted index (term -> {doc: weighted tf}) and ranked
+with BM25. Title terms count more than summary/excerpt terms, which count
+more than body text. The last query term also matches as a prefix, for
+type-ahead. Handlers update the index per record; ``sync`` catches up with
+changes made by other processes by diffing the repository's records by object
+identity (records are replaced, never mutated, on update).
+"""
+import bisect
+import heapq
+import math
+import threading
+import unicodedata
+
+from flask import jsonify, request
+
+import metrics
+from query import QueryError, parse_bool
+
+K1 = 1.2
+B = 0.75
+MAX_PREFIX_EXPANSIONS = 50
+DEFAULT_RESULTS = 20
+MAX_RESULTS = 100
+
+_NEVER = object()
+
+_JOINERS = dict.fromkeys(map(ord, '\u200c\u200d\ufeff'))
+
+PROJECT_FIELDS = (
+    ('title', 3), ('summary', 2), ('longDescription', 1), ('category', 1), ('tags', 1),
+    ('stat1', 1), ('stat2', 1),
+)
+NEWS_FIELDS = (
+    ('title', 3), ('excerpt', 2), ('content', 1), ('category', 1), ('author', 1),
+)
+# record fields copied into each hit, per collection
+PREVIEW = {
+    'projects': ('title', 'summary', 'category', 'main_image', 'published'),
+    'news': ('title', 'excerpt', 'category', 'author', 'image', 'date'),
+}
+
+
+def _is_word_char(ch):
+    cat = unicodedata.category(ch)
+    return cat[0] in 'LMN'
+
+
+def _expand(repo, record):
+    expand = getattr(repo, 'expand', None)
+    return expand(record) if expand is not None else record
+
+
+def tokenize(text):
+    text = unicodedata.normalize('NFC', text or '').translate(_JOINERS).casefold()
+    tokens = []
+    start = None
+    for i, ch in enumerate(text):
+        if _is_word_char(ch):
+            if start is None:
+                start = i
+        elif start is not None:
+            tokens.append(text[start:i])
+            start = None
+    if start is not None:
+        tokens.append(text[start:])
+    return tokens
+
+
+def _strings(value):
+    """All strings inside a field value (plain, per-language dict, list, stat dict)."""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from _strings(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from _strings(v)
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}      # term -> {doc_key: weighted tf}
+        self._doc_terms = {}     # doc_key -> {term: weighted tf}
+        self._doc_len = {}
+        self._docs = {}          # doc_key -> stored record
+        self._total_len = 0
+        self._terms = []         # sorted vocabulary for prefix lookups
+        self._terms_dirty = False
+        self._synced = {}        # collection -> repository signature at last sync
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, collection, record, fields, text=None):
+        """Index ``record``; ``text`` is a fuller copy to read the fields from (e.g. with a lazily loaded body)."""
+        key = (collection, str(record.get('id', '')).strip())
+        source = text if text is not None else record
+        tf = {}
+        for field, weight in fields:
+            for s in _strings(source.get(field)):
+                for term in tokenize(s):
+                    tf[term] = tf.get(term, 0) + weight
+        with self._lock:
+            self._remove_key(key)
+            self._docs[key] = record
+            self._doc_terms[key] = tf
+            length = sum(tf.values())
+            self._doc_len[key] = length
+            self._total_len += length
+            for term, freq in tf.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._terms_dirty = True
+                postings[key] = freq
+
+    def remove(self, collection, record_id):
+        with self._lock:
+            self._remove_key((collection, str(record_id).strip()))
+
+    def _remove_key(self, key):
+        tf = self._doc_terms.pop(key, None)
+        if tf is None:
+            return
+        del self._docs[key]
+        self._total_len -= self._doc_len.pop(key)
+        for term in tf:
+            postings = self._postings[term]
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[term]
+                self._terms_dirty = True
+
+    def sync(self, collection, repo, fields):
+        """Bring ``collection`` in line with ``repo`` if it changed since the last sync."""
+        signature, items = repo.snapshot()
+        with self._lock:
+            if self._synced.get(collection, _NEVER) == signature:
+                return
+            with metrics.span(f'search.sync.{collection}'):
+                for key, record in items.items():
+                    if isinstance(key, str) and self._docs.get((collection, key)) is not record:
+                        self.add(collection, record, fields, text=_expand(repo, record))
+                stale = [k for k in self._docs if k[0] == collection and k[1] not in items]
+                for key in stale:
+                    self._remove_key(key)
+            self._synced[collection] = signature
+
+    def _expand(self, prefix):
+        if self._terms_dirty:
+            self._terms = sorted(self._postings)
+            self._terms_dirty = False
+        i = bisect.bisect_left(self._terms, prefix)
+        out = []
+        while i < len(self._terms) and self._terms[i].startswith(prefix) and len(out) < MAX_PREFIX_EXPANSIONS:
+            out.append(self._terms[i])
+            i += 1
+        return out
+
+    def search(self, query, limit=20, collections=None, prefix=True, match=None):
+        """Return ``[(score, collection, record)]``, best first.
+
+        ``match(collection, record)`` can exclude documents (e.g. unpublished).
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            n = len(self._docs)
+            if n == 0:
+                return []
+            avgdl = self._total_len / n or 1
+            scores = {}
+            rejected = set()
+            for i, term in enumerate(terms):
+                expansions = self._expand(term) if prefix and i == len(terms) - 1 else [term]
+                for t in expansions:
+                    postings = self._postings.get(t)
+                    if not postings:
+                        continue
+                    df = len(postings)
+                    idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                    # exact matches outrank prefix completions
+                    boost = 1.0 if t == term else 0.5
+                    for key, freq in postings.items():
+                        if collections and key[0] not in collections:
+                            continue
+                        if key in rejected:
+                            continue
+                        if match is not None and key not in scores and not match(key[0], self._docs[key]):
+                            rejected.add(key)
+                            continue
+                        dl = self._doc_len[key]
+                        score = idf * freq * (K1 + 1) / (freq + K1 * (1 - B + B * dl / avgdl)) * boost
+                        scores[key] = scores.get(key, 0.0) + score
+            best = heapq.nlargest(limit, scores.items(), key=lambda kv: kv[1])
+            return [(score, key[0], self._docs[key]) for key, score in best]
+
+
+def search_response(index, collections, preview=PREVIEW, match=None):
+    """Flask response for ``?q=...&limit=...&prefix=0|1&type=...`` against ``index``.
+
+    ``type`` (comma-separated) narrows the search to some of ``collections``.
+    Each hit is ``{"type", "id", "score"}`` plus the ``preview[type]`` fields
+    the record has, so result lists render without fetching every record.
+    """
+    args = request.args
+    q = (args.get('q') or '').strip()
+    try:
+        if not q:
+            raise QueryError('q is required')
+        types = [t.strip() for t in (args.get('type') or '').split(',') if t.strip()]
+        if any(t not in collections for t in types):
+            raise QueryError(f"type must be one of: {', '.join(collections)}")
+        if types:
+            collections = tuple(types)
+        limit = args.get('limit') or DEFAULT_RESULTS
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise QueryError('limit must be an integer')
+        if limit < 1:
+            raise QueryError('limit must be positive')
+        prefix = parse_bool(args['prefix']) if 'prefix' in args else True
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    hits = index.search(q, limit=min(limit, MAX_RESULTS), collections=collections, prefix=prefix, match=match)
+    out = []
+    for score, collection, record in hits:
+        hit = {'type': collection, 'id': record.get('id'), 'score': round(score, 4)}
+        hit.update((f, record[f]) for f in preview.get(collection, ()) if f in record)
+        out.append(hit)
+    return jsonify(out)
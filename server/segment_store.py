@@ -0,0 +1,287 @@
+"""News storage with article bodies kept apart from the metadata.
+
+Parsing and caching every article's ``content`` makes the news list cost
+(parse time, memory, response size) grow with the total length of the
+archive, although lists only show titles, excerpts, images and dates. This
+store keeps two files next to the news JSON path:
+
+- ``news.index.json``: the article records without ``content``, each with a
+  ``_body: [offset, length]`` pointer. Lists only ever parse this.
+- ``news.bodies.<generation>``: an append-only segment of UTF-8 bodies.
+  Bodies are read through ``mmap`` by offset, one article at a time.
+
+Saving a new or edited body appends it to the segment and rewrites the small
+index. Deleted and replaced bodies stay in the segment as garbage until
+``compact`` copies the live ones into the next generation. The index is
+replaced atomically after the segment is fsynced, so a crash leaves at most
+unreferenced bytes behind. Writes take the same lock file and bump the same
+kind of ``.version`` sidecar as ``storage.JsonStore``.
+
+Records without a ``content`` key keep their stored body, so metadata-only
+updates never touch the segment. The first load imports the legacy
+news.json when no index exists yet. Enable with ``SCCF_NEWS_STORAGE=segments``.
+"""
+import json
+import mmap
+import os
+import threading
+
+import metrics
+from storage import FileLock, JsonStore, VersionConflict, atomic_write_bytes
+
+COMPACT_MIN_BYTES = 1024 * 1024   # garbage below this is never worth a rewrite
+COMPACT_RATIO = 0.5               # ... nor while it is less than this share of the segment
+
+
+class SegmentStore:
+    def __init__(self, json_path):
+        base = os.path.splitext(json_path)[0]
+        self.legacy_path = json_path
+        self.path = base + '.index.json'
+        self.version_path = self.path + '.version'
+        self.segment_prefix = os.path.basename(base) + '.bodies.'
+        self.dir = os.path.dirname(os.path.abspath(self.path))
+        self.name = os.path.basename(base)
+        self._lock = FileLock(self.path)
+        # (segment file name, {id: (offset, length)}) from the last index read, swapped as one
+        self._state = (None, {})
+        self._maps = {}
+        self._maps_lock = threading.Lock()
+
+    def lock(self):
+        """Cross-process write lock; re-entrant within a thread."""
+        return self._lock
+
+    def signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def version(self):
+        try:
+            with open(self.version_path, 'r', encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def last_modified(self):
+        for path in (self.version_path, self.path):
+            try:
+                return os.stat(path).st_mtime
+            except OSError:
+                continue
+        return None
+
+    def _read_index(self):
+        try:
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None, None, {}
+        metrics.STORE_READS.inc(self.name)
+        metrics.STORE_BYTES_READ.inc(self.name, amount=len(raw))
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            return None, [], {}
+        records, refs = [], {}
+        for r in data.get('records', []):
+            if not isinstance(r, dict):
+                continue
+            ref = r.pop('_body', None)
+            if ref is not None:
+                refs[str(r.get('id', '')).strip()] = tuple(ref)
+            records.append(r)
+        return data.get('segment'), records, refs
+
+    def load(self):
+        """Return ``(records without content, version)``."""
+        if not os.path.exists(self.path) and os.path.exists(self.legacy_path):
+            self._import_legacy()
+        version = self.version()
+        segment, records, refs = self._read_index()
+        if records is None:
+            return [], version
+        self._state = (segment, refs)
+        return records, version
+
+    def _import_legacy(self):
+        with self._lock:
+            if os.path.exists(self.path):
+                return
+            legacy = JsonStore(self.legacy_path)
+            records, version = legacy.load()
+            self._write(records, version, new_segment=True)
+
+    def _map(self, segment, end):
+        """A read-only map of ``segment`` covering at least ``end`` bytes."""
+        with self._maps_lock:
+            m = self._maps.get(segment)
+            if m is None or len(m) < end:
+                # first read, or bodies were appended since it was mapped
+                with open(os.path.join(self.dir, segment), 'rb') as f:
+                    if os.fstat(f.fileno()).st_size == 0:
+                        return b''
+                    m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                # forget compacted-away generations; a map still being read closes when released
+                self._maps = {segment: m}
+            return m
+
+    def body(self, record_id):
+        """The ``content`` of one article, or None if it has none."""
+        key = str(record_id).strip()
+        for attempt in (1, 2):
+            segment, refs = self._state
+            ref = refs.get(key)
+            if ref is None or segment is None:
+                return None
+            offset, length = ref
+            try:
+                data = bytes(self._map(segment, offset + length)[offset:offset + length])
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+                # another process compacted since our last load: re-read the pointers
+                segment, _, refs = self._read_index()
+                self._state = (segment, refs)
+                continue
+            metrics.STORE_BYTES_READ.inc(f'{self.name}.bodies', amount=length)
+            return data.decode('utf-8')
+
+    def load_full(self):
+        """``(records with content, version)``, e.g. to export the public news.json."""
+        records, version = self.load()
+        full = []
+        for r in records:
+            body = self.body(r.get('id'))
+            full.append(r if body is None else {**r, 'content': body})
+        return full, version
+
+    def garbage(self):
+        """``(unreferenced bytes, segment bytes)`` of the current generation."""
+        segment, refs = self._state
+        if segment is None:
+            return 0, 0
+        try:
+            size = os.path.getsize(os.path.join(self.dir, segment))
+        except OSError:
+            return 0, 0
+        return size - sum(length for _, length in refs.values()), size
+
+    def _check(self, expected_version):
+        current = self.version()
+        if expected_version is not None and current != expected_version:
+            raise VersionConflict(f'{self.path}: expected version {expected_version}, found {current}')
+        return current
+
+    def _write(self, records, current, new_segment=False, bodies=None):
+        """Persist ``records`` (content in them is taken as new bodies) and the version after ``current``.
+
+        ``bodies`` maps id to body for records that arrive without content.
+        """
+        old, refs = self._state
+        refs = dict(refs)
+        if new_segment or old is None:
+            generation = int(old.rsplit('.', 1)[1]) + 1 if old else 1
+            segment = f'{self.segment_prefix}{generation}'
+            mode, offset = 'wb', 0
+        else:
+            segment = old
+            mode = 'ab'
+            offset = os.path.getsize(os.path.join(self.dir, segment))
+        index, appended = [], 0
+        with open(os.path.join(self.dir, segment), mode) as f:
+            for r in records:
+                if not isinstance(r, dict):
+                    continue
+                key = str(r.get('id', '')).strip()
+                meta = {k: v for k, v in r.items() if k != 'content'}
+                if 'content' in r:
+                    body = r['content']
+                elif bodies is not None and key in bodies:
+                    body = bodies[key]
+                else:
+                    body = None
+                if body is not None:
+                    data = str(body).encode('utf-8')
+                    f.write(data)
+                    refs[key] = (offset, len(data))
+                    offset += len(data)
+                    appended += len(data)
+                elif key in refs and not new_segment:
+                    pass   # unchanged body stays where it is
+                else:
+                    refs.pop(key, None)
+                if key in refs:
+                    meta['_body'] = list(refs[key])
+                index.append(meta)
+            f.flush()
+            os.fsync(f.fileno())
+        live = {str(m.get('id', '')).strip() for m in index}
+        refs = {k: v for k, v in refs.items() if k in live}
+        with metrics.span('storage.serialize'):
+            data = json.dumps({'segment': segment, 'records': index}, ensure_ascii=False,
+                              separators=(',', ':')).encode('utf-8')
+        atomic_write_bytes(self.path, data)
+        atomic_write_bytes(self.version_path, str(current + 1).encode('ascii'))
+        metrics.STORE_WRITES.inc(self.name)
+        metrics.STORE_BYTES_WRITTEN.inc(self.name, amount=len(data) + appended)
+        self._state = (segment, refs)
+        if old and old != segment:
+            try:
+                os.remove(os.path.join(self.dir, old))
+            except OSError:  # still mapped on Windows; the next compaction retries
+                pass
+        return current + 1
+
+    def save(self, records, expected_version=None):
+        """Write ``records`` (a full list) in a fresh segment and return the new version.
+
+        Records without ``content`` keep the body they already have.
+        """
+        with self._lock:
+            current = self._check(expected_version)
+            records = list(records)
+            bodies = {}
+            for r in records:
+                if isinstance(r, dict) and 'content' not in r:
+                    body = self.body(r.get('id'))
+                    if body is not None:
+                        bodies[str(r.get('id', '')).strip()] = body
+            return self._write(records, current, new_segment=True, bodies=bodies)
+
+    def write_changes(self, all_records, upserts=(), deletes=(), expected_version=None):
+        """Append the bodies of ``upserts`` and rewrite the index from ``all_records()``."""
+        with self._lock:
+            current = self._check(expected_version)
+            changed = {str(r.get('id', '')).strip(): r for r in upserts if 'content' in r}
+            records = [changed.get(str(r.get('id', '')).strip(), r) for r in all_records()]
+            return self._write(records, current)
+
+    def update(self, fn):
+        """Load, apply ``fn(records)`` and save under the lock."""
+        with self._lock:
+            records, version = self.load()
+            result = fn(records)
+            return self.save(records if result is None else result, expected_version=version)
+
+    def compact(self, min_bytes=COMPACT_MIN_BYTES, ratio=COMPACT_RATIO):
+        """Copy the live bodies into a new generation once garbage passes both thresholds.
+
+        Returns ``{'reclaimed': bytes}``, or None when it was not worth it.
+        The version is left alone: the articles themselves did not change.
+        """
+        with self._lock:
+            records, version = self.load()
+            dead, size = self.garbage()
+            if dead < min_bytes or dead < size * ratio:
+                return None
+            bodies = {}
+            for r in records:
+                body = self.body(r.get('id'))
+                if body is not None:
+                    bodies[str(r.get('id', '')).strip()] = body
+            self._write(records, version - 1, new_segment=True, bodies=bodies)
+            return {'reclaimed': dead}
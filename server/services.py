@@ -0,0 +1,81 @@
+"""Process-wide data layer shared by the projects and news blueprints.
+
+One cached repository per collection, one search index, one background job
+queue, one upload blob store, one change log and (when a provider is
+configured) one translator per process, whichever blueprint uses them. The
+pre-rendered public pages are rebuilt from both collections here too.
+"""
+import itertools
+
+import prerender
+
+from blobs import BlobStore, blob_urls
+from changes import ChangeLog
+from config import Config
+from jobs import JobQueue
+from repository import NewsRepository, ProjectRepository
+from search import SearchIndex
+from storage import open_store
+from translation import TranslationCache, Translator, open_provider
+
+# Parsed records are cached per process and reloaded only when the store changes
+PROJECTS = ProjectRepository(Config.PROJECTS_JSON, store=open_store(Config.PROJECTS_JSON, 'projects'))
+NEWS = NewsRepository(Config.NEWS_JSON, store=open_store(Config.NEWS_JSON, 'news'))
+SEARCH = SearchIndex()
+# Mirroring, public JSON, image derivatives and file cleanup run here, after the request returns
+JOBS = JobQueue(Config.JOBS_DB)
+# Uploaded files, stored once per distinct content and shared by both collections
+BLOBS = BlobStore(Config.BLOB_DIR, Config.BLOB_URL_PREFIX, Config.BLOBS_DB)
+BLOB_GC_DELAY = 60.0
+# Every admin write is appended here for /api/changes and its event stream (feed.py)
+CHANGES = ChangeLog(Config.CHANGES_DB)
+# Fills empty si/ta fields after uploads; None unless SCCF_TRANSLATION_PROVIDER is set
+_provider = open_provider(Config.TRANSLATION_PROVIDER, Config.GEMINI_API_KEY)
+TRANSLATOR = (Translator(_provider, TranslationCache(Config.TRANSLATIONS_DB, Config.TRANSLATION_CACHE_ENTRIES))
+              if _provider is not None else None)
+TRANSLATE_DEBOUNCE = 2.0
+PRERENDER_DEBOUNCE = 2.0
+PRERENDER_MAX_DELAY = 10.0
+
+
+def record_blobs(record):
+    """Blob URLs referenced by a project or article."""
+    return blob_urls(record, Config.BLOB_URL_PREFIX)
+
+
+def schedule_blob_gc():
+    """Collect unreferenced blobs shortly after references were dropped."""
+    return JOBS.enqueue('blob_gc', dedupe_key='blob_gc', delay=BLOB_GC_DELAY)
+
+
+def _merge_ids(waiting, new):
+    return {'ids': list(dict.fromkeys(waiting.get('ids', []) + new.get('ids', [])))}
+
+
+def schedule_translation(collection, ids):
+    """Queue filling the empty si/ta fields of ``ids``; uploads close together share one batch."""
+    if TRANSLATOR is None:
+        return None
+    return JOBS.enqueue(f'translate_{collection}', {'ids': [str(i) for i in ids]}, dedupe_key=f'translate_{collection}',
+                        delay=TRANSLATE_DEBOUNCE, merge=_merge_ids)
+
+
+def schedule_prerender():
+    """Queue an incremental rebuild of the pre-rendered pages; edits close together share one."""
+    return JOBS.enqueue('prerender', dedupe_key='prerender', delay=PRERENDER_DEBOUNCE,
+                        max_delay=PRERENDER_MAX_DELAY)
+
+
+@JOBS.register('prerender')
+def _run_prerender(payload):
+    news = [NEWS.expand(r) for r in NEWS.records()]
+    report = prerender.build(PROJECTS.records(), news, Config.BASE_DIR, Config.PRERENDER_DIR,
+                             Config.PRERENDER_MANIFEST)
+    return {k: v for k, v in report.items() if k != 'pages'}
+
+
+@JOBS.register('blob_gc')
+def _run_blob_gc(payload):
+    # whatever the records still mention is kept, even if a reference row went missing
+    keep = set(itertools.chain.from_iterable(record_blobs(r) for r in PROJECTS.records() + NEWS.records()))
+    return BLOBS.gc(keep=keep)
@@ -0,0 +1,195 @@
+"""SQLite backend with the same load/save API as ``storage.JsonStore``.
+
+Each collection (projects, news) is a table holding the full record as JSON
+plus the columns the apps filter and sort on, which are indexed. Single-record
+writes through ``write_changes`` touch only the affected rows, so their cost
+no longer grows with the size of the collection.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+import metrics
+from storage import FileLock, VersionConflict
+
+_COLUMNS = ('id', 'position', 'published', 'category', 'featured', 'priority', 'date', 'body')
+
+
+def _row(record, position):
+    try:
+        priority = int(record.get('priority') or 0)
+    except (TypeError, ValueError):
+        priority = 0
+    return (
+        str(record.get('id') if record.get('id') is not None else '').strip(),
+        position,
+        1 if record.get('published') else 0,
+        str(record.get('category') or ''),
+        1 if record.get('featured') else 0,
+        priority,
+        str(record.get('date') or ''),
+        json.dumps(record, ensure_ascii=False, separators=(',', ':')),
+    )
+
+
+class SqliteStore:
+    """One collection stored as a table in a SQLite database file."""
+
+    def __init__(self, db_path, table):
+        if not table.isidentifier():
+            raise ValueError(f'invalid table name: {table!r}')
+        self.path = db_path
+        self.table = table
+        self.name = table
+        self._local = threading.local()
+        self._lock = FileLock(db_path)
+        self._init_schema()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        t = self.table
+        self._conn().executescript(f'''
+            CREATE TABLE IF NOT EXISTS store_versions (
+                collection TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS {t} (
+                id TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                published INTEGER NOT NULL DEFAULT 0,
+                category TEXT NOT NULL DEFAULT '',
+                featured INTEGER NOT NULL DEFAULT 0,
+                priority INTEGER NOT NULL DEFAULT 0,
+                date TEXT NOT NULL DEFAULT '',
+                body TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS {t}_position ON {t}(position);
+            CREATE INDEX IF NOT EXISTS {t}_published ON {t}(published);
+            CREATE INDEX IF NOT EXISTS {t}_category ON {t}(category);
+            CREATE INDEX IF NOT EXISTS {t}_featured_priority ON {t}(featured DESC, priority DESC);
+            CREATE INDEX IF NOT EXISTS {t}_date ON {t}(date);
+        ''')
+
+    def lock(self):
+        """Cross-process write lock; re-entrant within a thread."""
+        return self._lock
+
+    def version(self):
+        row = self._conn().execute(
+            'SELECT version FROM store_versions WHERE collection = ?', (self.table,)).fetchone()
+        return row[0] if row else 0
+
+    def last_modified(self):
+        """Time of the last commit as a POSIX timestamp (WAL-aware)."""
+        times = []
+        for path in (self.path, self.path + '-wal'):
+            try:
+                times.append(os.stat(path).st_mtime)
+            except OSError:
+                pass
+        return max(times) if times else None
+
+    def signature(self):
+        """Cheap change marker used by repositories to revalidate their cache."""
+        return self.version()
+
+    def load(self):
+        conn = self._conn()
+        conn.execute('BEGIN')
+        try:
+            version = self.version()
+            rows = conn.execute(f'SELECT body FROM {self.table} ORDER BY position').fetchall()
+        finally:
+            conn.execute('COMMIT')
+        metrics.STORE_READS.inc(self.name)
+        metrics.STORE_BYTES_READ.inc(self.name, amount=sum(len(body) for (body,) in rows))
+        return [json.loads(body) for (body,) in rows], version
+
+    def get(self, record_id):
+        row = self._conn().execute(
+            f'SELECT body FROM {self.table} WHERE id = ?', (str(record_id).strip(),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query(self, where='', params=(), order_by='position', limit=None):
+        """Run an indexed query, e.g. ``query('published = 1 AND category = ?', ('education',))``."""
+        sql = f'SELECT body FROM {self.table}'
+        if where:
+            sql += f' WHERE {where}'
+        sql += f' ORDER BY {order_by}'
+        if limit is not None:
+            sql += f' LIMIT {int(limit)}'
+        return [json.loads(body) for (body,) in self._conn().execute(sql, tuple(params))]
+
+    def _begin(self, expected_version):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        current = self.version()
+        if expected_version is not None and current != expected_version:
+            conn.execute('ROLLBACK')
+            raise VersionConflict(f'{self.path}:{self.table}: expected version {expected_version}, found {current}')
+        return conn, current
+
+    def _commit(self, conn, current, rows=()):
+        metrics.STORE_WRITES.inc(self.name)
+        metrics.STORE_BYTES_WRITTEN.inc(self.name, amount=sum(len(row[-1]) for row in rows))
+        conn.execute('INSERT OR REPLACE INTO store_versions (collection, version) VALUES (?, ?)',
+                     (self.table, current + 1))
+        conn.execute('COMMIT')
+        return current + 1
+
+    def save(self, records, expected_version=None):
+        """Replace the whole collection and return the new version."""
+        with self._lock:
+            conn, current = self._begin(expected_version)
+            try:
+                conn.execute(f'DELETE FROM {self.table}')
+                rows = [_row(r, i) for i, r in enumerate(records) if isinstance(r, dict)]
+                conn.executemany(
+                    f'INSERT OR REPLACE INTO {self.table} ({", ".join(_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    rows)
+                return self._commit(conn, current, rows)
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def write_changes(self, all_records, upserts=(), deletes=(), expected_version=None):
+        """Upsert/delete individual rows; ``all_records`` is not needed here."""
+        with self._lock:
+            conn, current = self._begin(expected_version)
+            try:
+                for record_id in deletes:
+                    conn.execute(f'DELETE FROM {self.table} WHERE id = ?', (record_id,))
+                rows = []
+                for record in upserts:
+                    row = _row(record, 0)
+                    rows.append(row)
+                    existing = conn.execute(
+                        f'SELECT position FROM {self.table} WHERE id = ?', (row[0],)).fetchone()
+                    if existing:
+                        position = existing[0]
+                    else:
+                        position = conn.execute(
+                            f'SELECT COALESCE(MAX(position), -1) + 1 FROM {self.table}').fetchone()[0]
+                    conn.execute(
+                        f'INSERT OR REPLACE INTO {self.table} ({", ".join(_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        (row[0], position) + row[2:])
+                return self._commit(conn, current, rows)
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def update(self, fn):
+        """Load, apply ``fn(records)`` and save under the lock."""
+        with self._lock:
+            records, version = self.load()
+            result = fn(records)
+            return self.save(records if result is None else result, expected_version=version)
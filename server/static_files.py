@@ -0,0 +1,267 @@
+"""Serving of upload files, shared by the Flask routes and the ASGI fast path.
+
+Resolving a path, ``stat``-ing it and guessing its MIME type on every request
+adds up on media-heavy pages, so the result is kept in a bounded LRU keyed by
+``(root, relative path)`` and only re-checked once it is ``METADATA_TTL``
+seconds old. An entry also records which alternative representations sit
+next to the file:
+
+- ``photo.svg.br`` / ``photo.svg.gz``: precompressed copies, sent with
+  ``Content-Encoding`` to clients whose ``Accept-Encoding`` allows it;
+- ``_derived/photo_jpg.webp``: the full-size WebP that images.render writes,
+  sent to clients whose ``Accept`` lists ``image/webp``.
+
+Responses advertise ``Accept-Ranges: bytes``. A single ``Range`` (honoring
+``If-Range``) gets a 206 with just that slice, and an unsatisfiable one a
+416. ``plan`` works out the status, headers and byte span; the callers send
+the body with sendfile where the server offers it.
+"""
+import mimetypes
+import os
+import re
+import stat
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+from flask import Response, abort, request
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+import metrics
+from http_cache import is_fresh, upload_cache_control
+from images import DERIVED_DIR
+
+METADATA_ENTRIES = 4096
+METADATA_TTL = 2.0          # seconds an entry is trusted before the file is stat-ed again
+READ_CHUNK = 256 * 1024
+# precompressed siblings in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# formats a WebP copy is worth offering for (GIFs may be animated)
+WEBP_SOURCES = {'image/jpeg', 'image/png'}
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+LOOKUPS = metrics.counter('sccf_upload_metadata_cache_total',
+                          'Upload file metadata lookups by result (hit/miss).', ('result',))
+
+
+class FileInfo:
+    """What a response needs to know about one file on disk."""
+
+    def __init__(self, path, st, content_type):
+        self.path = path
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        self.content_type = content_type
+
+
+class Plan:
+    """A response to send: status, headers and the byte span of ``path`` (None: no body)."""
+
+    def __init__(self, status, headers, path=None, offset=0, length=0):
+        self.status = status
+        self.headers = headers
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+
+def _stat_file(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st if stat.S_ISREG(st.st_mode) else None
+
+
+def webp_path(path):
+    """Where images.render puts the full-size WebP copy of ``path``."""
+    return os.path.join(os.path.dirname(path), DERIVED_DIR, os.path.basename(path).replace('.', '_') + '.webp')
+
+
+def _accepts(header, token):
+    """Whether an Accept-style header names ``token`` explicitly with a non-zero q."""
+    for part in (header or '').split(','):
+        name, *params = [p.strip() for p in part.split(';')]
+        if name.lower() != token:
+            continue
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def parse_range(header, size):
+    """``(start, end)`` inclusive for a single byte range, ``'unsatisfiable'``, or None to ignore it."""
+    m = _RANGE.match((header or '').strip())
+    if not m or m.group(1) == m.group(2) == '':
+        return None    # absent, malformed or multi-range: send the whole file
+    first, last = m.group(1), m.group(2)
+    if first == '':
+        length = int(last)
+        if length == 0 or size == 0:
+            return 'unsatisfiable'
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return 'unsatisfiable'
+    return start, end
+
+
+def _if_range_matches(header, info):
+    if header.startswith('"') or header.startswith('W/'):
+        return header == info.etag
+    try:
+        return int(info.mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+class StaticFiles:
+    def __init__(self, max_entries=METADATA_ENTRIES, ttl=METADATA_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, root, rel):
+        """``(file, alternates)`` for ``rel`` under ``root``, or None if it is not a file.
+
+        ``alternates`` lists ``(kind, value, FileInfo)`` with kind ``'encoding'``
+        (value ``br``/``gzip``) or ``'type'`` (value ``image/webp``).
+        """
+        key = (root, rel)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                LOOKUPS.inc('hit')
+                return entry[1]
+        LOOKUPS.inc('miss')
+        found = self._load(root, rel)
+        with self._lock:
+            if found is None:
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = (now, found)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return found
+
+    def forget(self, root, rel):
+        with self._lock:
+            self._entries.pop((root, rel), None)
+
+    def _load(self, root, rel):
+        path = safe_join(root, rel)
+        st = _stat_file(path) if path else None
+        if st is None:
+            return None
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        info = FileInfo(path, st, content_type)
+        alternates = []
+        if content_type in WEBP_SOURCES:
+            alt = webp_path(path)
+            alt_st = _stat_file(alt)
+            if alt_st is not None:
+                alternates.append(('type', 'image/webp', FileInfo(alt, alt_st, 'image/webp')))
+        for coding, suffix in ENCODINGS:
+            alt_st = _stat_file(path + suffix)
+            if alt_st is not None:
+                alternates.append(('encoding', coding, FileInfo(path + suffix, alt_st, content_type)))
+        return info, alternates
+
+    def plan(self, root, rel, req_headers):
+        """Decide the response for ``GET rel``; ``req_headers`` is keyed by lower-case names (or a werkzeug ``Headers``)."""
+        found = self.lookup(root, rel)
+        if found is None:
+            return Plan(404, {'Content-Type': 'text/plain'})
+        info, alternates = found
+        encoding = None
+        for kind, value, alt in alternates:
+            if kind == 'type' and _accepts(req_headers.get('accept'), value):
+                info = alt
+                break
+            if kind == 'encoding' and _accepts(req_headers.get('accept-encoding'), value):
+                info, encoding = alt, value
+                break
+        headers = {
+            'ETag': info.etag,
+            'Last-Modified': formatdate(info.mtime, usegmt=True),
+            'Cache-Control': upload_cache_control(rel),
+            'Accept-Ranges': 'bytes',
+        }
+        if alternates:
+            headers['Vary'] = ', '.join(sorted({'Accept' if k == 'type' else 'Accept-Encoding'
+                                                for k, _, _ in alternates}))
+        if is_fresh(req_headers.get('if-none-match'), req_headers.get('if-modified-since'), info.etag, info.mtime):
+            return Plan(304, headers)
+        headers['Content-Type'] = info.content_type
+        if encoding:
+            headers['Content-Encoding'] = encoding
+
+        span = parse_range(req_headers.get('range'), info.size)
+        if_range = req_headers.get('if-range')
+        if span is not None and if_range and not _if_range_matches(if_range.strip(), info):
+            span = None
+        if span == 'unsatisfiable':
+            del headers['Content-Type']
+            headers.pop('Content-Encoding', None)
+            headers['Content-Range'] = f'bytes */{info.size}'
+            headers['Content-Length'] = '0'
+            return Plan(416, headers)
+        if span is not None:
+            start, end = span
+            headers['Content-Range'] = f'bytes {start}-{end}/{info.size}'
+            headers['Content-Length'] = str(end - start + 1)
+            return Plan(206, headers, info.path, start, end - start + 1)
+        headers['Content-Length'] = str(info.size)
+        return Plan(200, headers, info.path, 0, info.size)
+
+
+def read_span(f, offset, length, chunk=READ_CHUNK):
+    """Yield ``length`` bytes of ``f`` from ``offset``, then close it."""
+    try:
+        f.seek(offset)
+        while length > 0:
+            data = f.read(min(chunk, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        f.close()
+
+
+FILES = StaticFiles()
+
+
+def send_upload(root, rel):
+    """Flask response for an upload file, sent through the server's file wrapper (sendfile) when whole."""
+    plan = FILES.plan(root, rel, request.headers)
+    if plan.status == 404:
+        abort(404)
+    if plan.path is None or request.method == 'HEAD':
+        return Response(status=plan.status, headers=plan.headers)
+    try:
+        f = open(plan.path, 'rb')
+    except OSError:
+        FILES.forget(root, rel)
+        abort(404)
+    if plan.status == 200:
+        body = wrap_file(request.environ, f)
+    else:
+        body = read_span(f, plan.offset, plan.length)
+    return Response(body, status=plan.status, headers=plan.headers, direct_passthrough=True)
@@ -0,0 +1,274 @@
+"""Crash-safe JSON persistence shared by the projects and news apps.
+
+Writes go to a temporary file in the target directory, are fsynced and then
+moved into place with ``os.replace``, so readers only ever see a complete
+file. Writers serialize on an OS-level lock file next to the data file, which
+also covers several gunicorn workers sharing the same store. Every save bumps
+a version counter kept in a ``.version`` sidecar; passing ``expected_version``
+turns a save into a compare-and-swap that fails with ``VersionConflict`` if
+someone else wrote in between.
+
+``open_store`` picks the backend: the JSON file by default, or the SQLite
+backend in ``sqlite_store`` when ``SCCF_STORAGE_BACKEND=sqlite``. News can
+instead keep its bodies in a separate segment file (``segment_store``) with
+``SCCF_NEWS_STORAGE=segments``.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class VersionConflict(Exception):
+    """Raised when a compare-and-swap save finds a newer version on disk."""
+
+
+def _ensure_parent(path):
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+
+def _fsync_dir(path):
+    if fcntl is None:
+        return
+    try:
+        fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(path, data: bytes):
+    """Replace ``path`` with ``data`` so that readers never see a partial file.
+
+    Returns the number of bytes written.
+    """
+    _ensure_parent(path)
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp',
+                                    dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates 0600 files; keep the target's mode (or a readable default)
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except OSError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(path)
+    return len(data)
+
+
+def atomic_write_json(path, data, indent=2):
+    return atomic_write_bytes(path, json.dumps(data, ensure_ascii=False, indent=indent).encode('utf-8'))
+
+
+class FileLock:
+    """Exclusive lock held through a ``<path>.lock`` file.
+
+    The OS lock serializes processes; a per-instance RLock serializes threads
+    and makes the lock re-entrant within a thread.
+    """
+
+    def __init__(self, path):
+        self.path = path + '.lock'
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                _ensure_parent(self.path)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    _os_lock(fd)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                self._fd = fd
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd = self._fd, None
+            try:
+                _os_unlock(fd)
+            finally:
+                os.close(fd)
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def _os_lock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(0.01)
+
+
+def _os_unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class JsonStore:
+    """A JSON array on disk with atomic, versioned, lock-protected writes."""
+
+    def __init__(self, path, indent=2):
+        self.path = path
+        self.indent = indent
+        self.version_path = path + '.version'
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self._lock = FileLock(path)
+
+    def lock(self):
+        """Cross-process write lock; re-entrant within a thread."""
+        return self._lock
+
+    def signature(self):
+        """Cheap change marker used by repositories to revalidate their cache."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def version(self):
+        try:
+            with open(self.version_path, 'r', encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def last_modified(self):
+        """Time of the last save as a POSIX timestamp, or None if never saved."""
+        for path in (self.version_path, self.path):
+            try:
+                return os.stat(path).st_mtime
+            except OSError:
+                continue
+        return None
+
+    def load(self):
+        """Return ``(records, version)``; a missing or unreadable file is empty.
+
+        Reads under the lock: ``save`` writes the data before the version
+        file, so an unlocked reader could pair new records with the old
+        version and its next save would fail with ``VersionConflict``.
+        """
+        with self._lock:
+            version = self.version()
+            try:
+                with open(self.path, 'rb') as f:
+                    raw = f.read()
+            except OSError:
+                raw = b''
+        metrics.STORE_READS.inc(self.name)
+        metrics.STORE_BYTES_READ.inc(self.name, amount=len(raw))
+        try:
+            data = json.loads(raw) if raw else []
+        except ValueError:
+            data = []
+        return (data if isinstance(data, list) else []), version
+
+    def save(self, records, expected_version=None):
+        """Write ``records`` and return the new version.
+
+        With ``expected_version`` the write only happens if the version on
+        disk still matches, otherwise ``VersionConflict`` is raised.
+        """
+        with self._lock:
+            current = self.version()
+            if expected_version is not None and current != expected_version:
+                raise VersionConflict(f'{self.path}: expected version {expected_version}, found {current}')
+            with metrics.span('storage.serialize'):
+                data = json.dumps(list(records), ensure_ascii=False, indent=self.indent).encode('utf-8')
+            atomic_write_bytes(self.path, data)
+            atomic_write_bytes(self.version_path, str(current + 1).encode('ascii'))
+            metrics.STORE_WRITES.inc(self.name)
+            metrics.STORE_BYTES_WRITTEN.inc(self.name, amount=len(data))
+            return current + 1
+
+    def write_changes(self, all_records, upserts=(), deletes=(), expected_version=None):
+        """Persist a single-record mutation.
+
+        A JSON array can only be rewritten as a whole, so this saves
+        ``all_records()``; row-based backends write just the changed records.
+        """
+        return self.save(all_records(), expected_version=expected_version)
+
+    def update(self, fn):
+        """Load, apply ``fn(records)`` and save under the lock.
+
+        ``fn`` may mutate the list in place or return a replacement list.
+        Returns the new version.
+        """
+        with self._lock:
+            records, version = self.load()
+            result = fn(records)
+            return self.save(records if result is None else result, expected_version=version)
+
+
+def open_store(json_path, collection):
+    """Return the configured store for ``collection``.
+
+    ``json_path`` is the JSON file used by the default backend; the SQLite
+    database defaults to ``sccf.sqlite3`` next to it unless
+    ``SCCF_SQLITE_PATH`` is set.
+    """
+    backend = os.environ.get('SCCF_STORAGE_BACKEND', 'json').strip().lower()
+    if collection == 'news' and os.environ.get('SCCF_NEWS_STORAGE', '').strip().lower() == 'segments':
+        from segment_store import SegmentStore
+        return SegmentStore(json_path)
+    if backend == 'json':
+        return JsonStore(json_path)
+    if backend == 'sqlite':
+        from sqlite_store import SqliteStore
+        db_path = os.environ.get('SCCF_SQLITE_PATH') or os.path.join(os.path.dirname(json_path), 'sccf.sqlite3')
+        _ensure_parent(db_path)
+        return SqliteStore(db_path, collection)
+    raise ValueError(f'unknown SCCF_STORAGE_BACKEND: {backend!r}')
@@ -0,0 +1,355 @@
+"""Machine translation of the si/ta fields, with a persistent cache.
+
+Projects keep ``title``, ``summary``, ``longDescription`` and the stat labels
+as ``{"en": ..., "si": ..., "ta": ...}``, and admins often leave si/ta empty.
+A ``Translator`` fills those gaps from the English text through a pluggable
+``Provider`` and remembers every result, so the same string is never sent
+upstream twice:
+
+- the cache is a SQLite table keyed by a SHA-256 of (provider, source
+  language, target language, text), shared by all processes and kept to the
+  ``max_entries`` most recently used translations;
+- texts are deduplicated within a call, and ``fill`` makes one call per
+  target language for all the fields of all the records it is given;
+- upstream requests are cut by a character budget as well as a text count,
+  since Sinhala and Tamil output takes several times the tokens of the
+  English input; a batch that comes back short is split in half and retried,
+  down to single texts;
+- a text already being translated by another thread of this process is
+  waited for instead of being requested again.
+
+Providers: ``stub`` (deterministic ``[si] text`` output, for development and
+tests) and ``gemini`` (the model and prompt of api/translate.js, over
+``urllib``). Select one with ``SCCF_TRANSLATION_PROVIDER``; translation is
+off when it is unset.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+
+import metrics
+
+SOURCE_LANG = 'en'
+TARGET_LANGS = ('si', 'ta')
+# language dicts of a project, as dotted paths
+PROJECT_LANG_FIELDS = ('title', 'summary', 'longDescription', 'stat1.label', 'stat2.label')
+# English-only article fields whose translations go under ``translations[lang][field]``
+NEWS_LANG_FIELDS = ('title', 'excerpt')
+CACHE_ENTRIES = 50000
+LOOKUP_CHUNK = 500        # keys per SQL ``IN (...)``
+WAIT_TIMEOUT = 120.0      # seconds to wait for another thread's upstream call
+
+LOOKUPS = metrics.counter('sccf_translation_cache_total',
+                          'Translation lookups by result (hit/miss/coalesced).', ('result',))
+UPSTREAM = metrics.counter('sccf_translation_upstream_texts_total', 'Texts sent to the provider.', ('provider',))
+
+
+class TranslationError(RuntimeError):
+    pass
+
+
+class BatchMismatch(TranslationError):
+    """The provider answered a batch with the wrong number of translations; smaller batches may work."""
+
+
+class Provider:
+    """Translates a batch of texts; subclasses set ``name`` and implement ``translate``."""
+
+    name = None
+    max_batch = 50            # texts per upstream request
+    max_batch_chars = 4000    # source characters per upstream request (a longer text goes alone)
+
+    def translate(self, texts, target, source=SOURCE_LANG):
+        """Return the translations of ``texts`` into ``target``, in order."""
+        raise NotImplementedError
+
+
+class StubProvider(Provider):
+    """Marks texts instead of translating them; ``calls`` records every batch it was given."""
+
+    name = 'stub'
+
+    def __init__(self):
+        self.calls = []
+
+    def translate(self, texts, target, source=SOURCE_LANG):
+        self.calls.append((target, list(texts)))
+        return [f'[{target}] {t}' for t in texts]
+
+
+class GeminiProvider(Provider):
+    """The Gemini model api/translate.js uses, with the same prompt and separator."""
+
+    name = 'gemini'
+    max_batch_chars = 1500    # the translations must fit in MAX_OUTPUT_TOKENS
+    MAX_OUTPUT_TOKENS = 8192
+    URL = 'https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={key}'
+    SEPARATOR = '|||TRANSLATE_SEP|||'
+    LANG_NAMES = {'en': 'English', 'si': 'Sinhala (සිංහල)', 'ta': 'Tamil (தமிழ்)'}
+    PROMPT = (
+        'You are a professional translator for SCCF (Social Community Contribution Foundation), an NGO '
+        'website in Sri Lanka. Translate the following text(s) to {language}.\n\n'
+        'CRITICAL RULES:\n'
+        '1. Return ONLY the translated text(s), nothing else - no explanations, no notes\n'
+        '2. Maintain the exact same tone, formality, and formatting\n'
+        '3. Keep these unchanged: "SCCF", email addresses, phone numbers, URLs, dates, numbers\n'
+        '4. If multiple texts are separated by "{separator}", translate each one and keep them separated '
+        'by the same separator\n'
+        '5. If text is already in {language}, return it unchanged\n'
+        '6. For Sinhala: Use proper සිංහල script, natural and warm tone\n'
+        '7. For Tamil: Use proper தமிழ் script, respectful and clear tone\n'
+        "8. Keep translations concise - don't add words unnecessarily\n\n"
+        'Text(s) to translate:\n{text}'
+    )
+
+    def __init__(self, api_key, model='gemini-1.5-flash', timeout=30.0):
+        if not api_key:
+            raise TranslationError('the gemini provider needs GEMINI_API_KEY')
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+
+    def translate(self, texts, target, source=SOURCE_LANG):
+        prompt = self.PROMPT.format(language=self.LANG_NAMES.get(target, target), separator=self.SEPARATOR,
+                                    text=self.SEPARATOR.join(texts))
+        body = json.dumps({'contents': [{'parts': [{'text': prompt}]}],
+                           'generationConfig': {'temperature': 0.2, 'maxOutputTokens': self.MAX_OUTPUT_TOKENS}}).encode('utf-8')
+        req = urllib.request.Request(self.URL.format(model=self.model, key=self.api_key), data=body,
+                                     headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                data = json.loads(resp.read())
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise TranslationError(f'Gemini API error: {e}') from e
+        try:
+            candidate = data['candidates'][0]
+            text = candidate['content']['parts'][0]['text']
+        except (KeyError, IndexError, TypeError):
+            raise TranslationError('Gemini API returned no text')
+        if candidate.get('finishReason') == 'MAX_TOKENS':
+            raise BatchMismatch(f'Gemini output was cut off after {len(text)} characters')
+        parts = [p.strip() for p in text.split(self.SEPARATOR)]
+        if len(parts) != len(texts):
+            # unlike the browser function, never cache a guess
+            raise BatchMismatch(f'expected {len(texts)} translations, got {len(parts)}')
+        return parts
+
+
+class TranslationCache:
+    """Translations in SQLite, evicting the least recently used beyond ``max_entries``."""
+
+    def __init__(self, db_path, max_entries=CACHE_ENTRIES):
+        self.path = db_path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        self._conn().executescript('''
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                target TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS translations_used ON translations(used);
+        ''')
+
+    def get_many(self, keys):
+        """``{key: translation}`` for the cached ``keys``; marks them as used."""
+        keys = list(keys)
+        found = {}
+        conn = self._conn()
+        for i in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[i:i + LOOKUP_CHUNK]
+            rows = conn.execute(f"SELECT key, translation FROM translations WHERE key IN ({','.join('?' * len(chunk))})",
+                                chunk)
+            found.update((r['key'], r['translation']) for r in rows)
+        if found:
+            now = time.time()
+            conn.executemany('UPDATE translations SET used = ? WHERE key = ?', ((now, k) for k in found))
+        return found
+
+    def put_many(self, items):
+        """Store ``(key, target, translation)`` items, then evict down to ``max_entries``."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT OR REPLACE INTO translations (key, target, translation, used) '
+                             'VALUES (?, ?, ?, ?)', ((k, t, tr, now) for k, t, tr in items))
+            excess = conn.execute('SELECT COUNT(*) FROM translations').fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute('DELETE FROM translations WHERE key IN '
+                             '(SELECT key FROM translations ORDER BY used LIMIT ?)', (excess,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+
+
+class Translator:
+    def __init__(self, provider, cache):
+        self.provider = provider
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._inflight = {}    # cache key -> Future of the translation
+
+    def _key(self, text, target, source):
+        raw = '\0'.join((self.provider.name, source, target, text))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def translate_many(self, texts, target, source=SOURCE_LANG):
+        """``{text: translation}`` for the distinct non-blank ``texts``."""
+        keys = {t: self._key(t, target, source) for t in dict.fromkeys(texts) if t and t.strip()}
+        cached = self.cache.get_many(keys.values())
+        out = {t: cached[k] for t, k in keys.items() if k in cached}
+        LOOKUPS.inc('hit', amount=len(out))
+        mine, waiting = {}, {}
+        with self._lock:
+            pending = {t: k for t, k in keys.items() if t not in out}
+            for t, k in pending.items():
+                if k in self._inflight:
+                    waiting[t] = self._inflight[k]
+            # finished between the first lookup and taking the lock: it is in the cache by now
+            late = self.cache.get_many(k for t, k in pending.items() if t not in waiting)
+            for t, k in pending.items():
+                if t in waiting:
+                    continue
+                if k in late:
+                    out[t] = late[k]
+                else:
+                    mine[t] = self._inflight[k] = Future()
+        LOOKUPS.inc('hit', amount=len(late))
+        LOOKUPS.inc('coalesced', amount=len(waiting))
+        LOOKUPS.inc('miss', amount=len(mine))
+        if mine:
+            try:
+                out.update(self._fetch(list(mine), target, source, keys))
+                for t, future in mine.items():
+                    future.set_result(out[t])
+            except BaseException as e:
+                for future in mine.values():
+                    future.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    for t in mine:
+                        self._inflight.pop(keys[t], None)
+        for t, future in waiting.items():
+            out[t] = future.result(timeout=WAIT_TIMEOUT)
+        return out
+
+    def _batches(self, texts):
+        """``texts`` cut into batches of at most ``max_batch`` texts and ``max_batch_chars`` characters."""
+        batch, size = [], 0
+        for text in texts:
+            if batch and (len(batch) >= self.provider.max_batch or size + len(text) > self.provider.max_batch_chars):
+                yield batch
+                batch, size = [], 0
+            batch.append(text)
+            size += len(text)
+        if batch:
+            yield batch
+
+    def _fetch(self, texts, target, source, keys):
+        translated = {}
+        for batch in self._batches(texts):
+            self._fetch_batch(batch, target, source, keys, translated)
+        return translated
+
+    def _fetch_batch(self, batch, target, source, keys, translated):
+        """Translate ``batch`` into ``translated``, halving it while the provider miscounts."""
+        UPSTREAM.inc(self.provider.name, amount=len(batch))
+        try:
+            with metrics.span(f'translation.{self.provider.name}'):
+                result = self.provider.translate(batch, target, source)
+            if len(result) != len(batch):
+                raise BatchMismatch(f'{self.provider.name}: expected {len(batch)} translations, got {len(result)}')
+        except BatchMismatch:
+            if len(batch) == 1:
+                raise
+            half = len(batch) // 2
+            self._fetch_batch(batch[:half], target, source, keys, translated)
+            self._fetch_batch(batch[half:], target, source, keys, translated)
+            return
+        self.cache.put_many((keys[t], target, tr) for t, tr in zip(batch, result))
+        translated.update(zip(batch, result))
+
+    def fill(self, fields, targets=TARGET_LANGS, source=SOURCE_LANG):
+        """Translations for the empty languages of many language dicts, one provider call per language.
+
+        ``fields`` maps any key to a ``{"en": ..., "si": ..., "ta": ...}``
+        dict. Returns ``{key: {lang: translation}}`` for the keys that had
+        English text and a blank target language.
+        """
+        wanted = {}
+        for key, langs in fields.items():
+            text = (langs or {}).get(source)
+            if not isinstance(text, str) or not text.strip():
+                continue
+            for lang in targets:
+                if not str(langs.get(lang) or '').strip():
+                    wanted.setdefault(lang, []).append((key, text))
+        filled = {}
+        for lang, items in wanted.items():
+            translations = self.translate_many([text for _, text in items], lang, source)
+            for key, text in items:
+                filled.setdefault(key, {})[lang] = translations[text]
+        return filled
+
+
+def open_provider(name, api_key=None):
+    """The provider called ``name``, or None when translation is off (empty name)."""
+    if not name:
+        return None
+    if name == 'stub':
+        return StubProvider()
+    if name == 'gemini':
+        return GeminiProvider(api_key)
+    raise ValueError(f'unknown translation provider {name!r}')
+
+
+def lang_dict(record, path):
+    """The language dict at a dotted ``path`` of ``record`` (``stat1.label``), or None."""
+    value = record
+    for part in path.split('.'):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value if isinstance(value, dict) else None
+
+
+def with_langs(record, path, langs):
+    """``{top-level field: new value}`` that sets ``langs`` in the dict at ``path``.
+
+    Only languages still blank in ``record`` are set, so a value typed in
+    by an admin meanwhile is kept. Returns {} when there is nothing to set.
+    """
+    head, _, rest = path.partition('.')
+    current = record.get(head)
+    if not isinstance(current, dict):
+        return {}
+    if rest:
+        inner = with_langs(current, rest, langs)
+        return {head: {**current, **inner}} if inner else {}
+    missing = {lang: text for lang, text in langs.items() if not str(current.get(lang) or '').strip()}
+    return {head: {**current, **missing}} if missing else {}
@@ -0,0 +1,30 @@
+"""Upload helpers shared by the admin apps.
+
+Uploaded files are stored by ``BlobStore`` (server/blobs.py): each one is
+read in ``CHUNK_SIZE`` chunks while it is hashed and saved once under
+server/uploads/blobs/<aa>/<sha256>.<ext>, so memory use stays bounded
+regardless of file size and identical files share one copy. Batches of
+files are hashed and written concurrently on a small thread pool.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from config import Config
+
+CHUNK_SIZE = 1024 * 1024
+UPLOAD_WORKERS = 4
+
+_POOL = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix='upload')
+
+
+def allowed_file(filename, extensions=Config.ALLOWED_EXTENSIONS):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in extensions
+
+
+@metrics.span('upload.save_files')
+def save_many(jobs, save):
+    """Run ``save(*job)`` for each job concurrently; results keep job order."""
+    jobs = list(jobs)
+    if len(jobs) <= 1:
+        return [save(*job) for job in jobs]
+    return list(_POOL.map(lambda job: save(*job), jobs))
@@ -0,0 +1,70 @@
+"""The project list index must carry every field the cards in assets/main.js render.
+
+Run with ``python -m pytest tests``.
+"""
+import json
+import re
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'server'))
+
+import publisher  # noqa: E402
+
+MAIN_JS = ROOT / 'assets' / 'main.js'
+ASSETS = ROOT / 'assets'
+
+
+def card_fields():
+    """Names of the ``proj.<field>`` properties read by the card template in main.js."""
+    source = MAIN_JS.read_text(encoding='utf-8')
+    start = source.index('list.forEach(proj => {')
+    end = source.index('projectsGrid.appendChild(article)', start)
+    return set(re.findall(r'\bproj\.(\w+)', source[start:end]))
+
+
+def check_entry(project, entry):
+    for field in card_fields():
+        if field not in project:
+            continue
+        if field == 'gallery_images':
+            assert entry.get(field) == project[field][:1], (project.get('id'), field)
+        else:
+            assert entry.get(field) == project[field], (project.get('id'), field)
+
+
+def test_template_reads_the_fields_under_test():
+    assert {'title', 'summary', 'main_image', 'gallery_images', 'stat1', 'stat2'} <= card_fields()
+
+
+def test_index_entries_have_card_fields(tmp_path):
+    project = {
+        'id': 'well', 'title': {'en': 'Well', 'si': '', 'ta': ''}, 'summary': {'en': 'Water'},
+        'category': 'Water', 'status': 'Completed', 'main_image': '', 'image': '',
+        'gallery_images': ['/uploads/a.jpg', '/uploads/b.jpg'], 'longDescription': {'en': 'long'},
+        'stat1': {'number': '120', 'label': {'en': 'Families'}}, 'stat2': {'number': '1', 'label': {'en': 'Well'}},
+    }
+    index = publisher.write_projects_bundle([project], str(tmp_path))
+    check_entry(project, index[0])
+    assert 'longDescription' not in index[0]
+
+
+def test_reused_entries_gain_new_fields(tmp_path):
+    project = {'id': 'well', 'title': {'en': 'Well'}, 'stat1': {'number': '3', 'label': {'en': 'Wells'}}}
+    publisher.write_projects_bundle([project], str(tmp_path))
+    index_path = tmp_path / 'projects' / 'index.json'
+    old = json.loads(index_path.read_text(encoding='utf-8'))
+    del old[0]['stat1']    # as written by an older INDEX_FIELDS
+    index_path.write_text(json.dumps(old), encoding='utf-8')
+    index = publisher.write_projects_bundle([project], str(tmp_path), changed=set())
+    check_entry(project, index[0])
+
+
+def test_committed_bundle_matches_projects_json():
+    projects = json.loads((ASSETS / 'projects.json').read_text(encoding='utf-8'))
+    index = json.loads((ASSETS / 'projects' / 'index.json').read_text(encoding='utf-8'))
+    entries = {str(e.get('id')): e for e in index}
+    assert len(entries) == len(projects)
+    for project in projects:
+        check_entry(project, entries[str(project.get('id'))])